@@ -0,0 +1,162 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Measures the per request latency of NSX API calls with and without the keep-alive connection pool of
+module_utils/nsx_client.py against a local TLS stand-in for NSX Manager.
+
+    python benchmarks/connection_pool.py --requests 200 --concurrency 8
+"""
+
+import argparse
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+from nsx_client import configure_connection_pool
+
+RESPONSE_BODY = b'<edge><id>edge-1</id><name>benchmark</name></edge>'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without TCP_NODELAY delayed ACKs add 40ms to keep-alive requests
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    connections = 0
+
+    def get_request(self):
+        request = HTTPServer.get_request(self)
+        self.connections += 1
+        return request
+
+
+def start_stand_in(cert_dir):
+    """
+    Starts a TLS server on a free local port with a throw-away self signed certificate
+    :return: The server, its base url is https://127.0.0.1:<port>
+    """
+    cert_file = os.path.join(cert_dir, 'cert.pem')
+    key_file = os.path.join(cert_dir, 'key.pem')
+    subprocess.check_call(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-subj', '/CN=localhost',
+                           '-days', '1', '-keyout', key_file, '-out', cert_file],
+                          stdout=open(os.devnull, 'w'), stderr=subprocess.STDOUT)
+    server = StandInServer(('127.0.0.1', 0), StandInHandler)
+    context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+    context.load_cert_chain(cert_file, key_file)
+    # the handshake runs in the handler thread on the first read, not in the accepting thread
+    server.socket = context.wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def new_session(pooled, pool_size):
+    session = requests.Session()
+    session.auth = ('admin', 'default')
+    if pooled:
+        configure_connection_pool(session, pool_size)
+    else:
+        # every request opens its own connection, like a new client per task
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def timed_get(session, url):
+    start = time.time()
+    # verify is passed per request, as a CA bundle from the environment overrides session.verify
+    session.get(url, verify=False).content
+    return time.time() - start
+
+
+def run(server, pooled, request_count, concurrency, pool_size):
+    url = 'https://127.0.0.1:{}/api/4.0/edges/edge-1'.format(server.server_address[1])
+    session = new_session(pooled, pool_size)
+    connections_before = server.connections
+    pool = ThreadPool(concurrency)
+    try:
+        start = time.time()
+        latencies = pool.map(lambda _: timed_get(session, url), range(request_count))
+        total = time.time() - start
+    finally:
+        pool.close()
+        pool.join()
+    return latencies, total, server.connections - connections_before
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))]
+
+
+def report(name, latencies, total, connections):
+    print('{:<10} mean {:7.2f} ms  p50 {:7.2f} ms  p95 {:7.2f} ms  total {:7.2f} s  connections {}'.format(
+        name, 1000 * sum(latencies) / len(latencies), 1000 * percentile(latencies, 50),
+        1000 * percentile(latencies, 95), total, connections))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--pool-size', type=int, default=10)
+    args = parser.parse_args()
+
+    requests.packages.urllib3.disable_warnings()
+    cert_dir = tempfile.mkdtemp()
+    try:
+        server = start_stand_in(cert_dir)
+        for name, pooled in (('no pool', False), ('pooled', True)):
+            report(name, *run(server, pooled, args.requests, args.concurrency, args.pool_size))
+        server.shutdown()
+    finally:
+        shutil.rmtree(cert_dir)
+
+
+if __name__ == '__main__':
+    main()
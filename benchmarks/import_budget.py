@@ -0,0 +1,146 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Measures the import time of every module in library/ with python -X importtime, the part of the startup Ansible
+pays again for every task. A run fails when a module takes longer than --limit-ms, or longer than its saved budget
+plus the tolerance, so heavy top level imports are caught before they ship.
+
+    python benchmarks/import_budget.py --save-budget import_budget.json
+    python benchmarks/import_budget.py --budget import_budget.json --tolerance 0.2
+
+Needs ansible and the libraries imported by the modules. Budgets are only comparable on the same machine.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_DIR = os.path.normpath(os.path.join(BENCHMARKS_DIR, '..', 'library'))
+MODULE_UTILS_DIR = os.path.normpath(os.path.join(BENCHMARKS_DIR, '..', 'module_utils'))
+START_MARKER = 'nsx-import-budget-start'
+
+# loads a module the way AnsiballZ does, without running main(), with module_utils served as ansible.module_utils
+BOOTSTRAP = '''
+import importlib.abc, importlib.util, os, runpy, sys
+
+class ModuleUtilsFinder(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        if name.startswith('ansible.module_utils.nsx_'):
+            location = os.path.join({module_utils!r}, name.rsplit('.', 1)[1] + '.py')
+            if os.path.exists(location):
+                return importlib.util.spec_from_file_location(name, location)
+        return None
+
+sys.meta_path.insert(0, ModuleUtilsFinder())
+sys.stderr.write({marker!r} + '\\n')
+sys.stderr.flush()
+runpy.run_path({module!r}, run_name='nsx_import_budget')
+'''
+
+
+def import_times(module_path):
+    """
+    :return: A tuple with the microseconds spent importing the module and everything it imports, and a list of the
+             (cumulative microseconds, name) of its top level imports
+    """
+    code = BOOTSTRAP.format(module_utils=MODULE_UTILS_DIR, marker=START_MARKER, module=module_path)
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', code], stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(stderr.strip().splitlines()[-1] if stderr.strip() else 'exit code {}'.format(
+            process.returncode))
+
+    total = 0
+    top_level = []
+    started = False
+    for line in stderr.splitlines():
+        if line == START_MARKER:
+            started = True
+        elif started and line.startswith('import time:') and '|' in line:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            if not self_us.strip().isdigit():
+                continue
+            total += int(self_us)
+            if not name[1:].startswith(' '):
+                top_level.append((int(cumulative_us), name.strip()))
+    return total, sorted(top_level, reverse=True)
+
+
+def measure(module_path, runs):
+    """
+    :return: The median import milliseconds out of the runs and the heaviest top level imports of the last run
+    """
+    totals = []
+    for _ in range(runs):
+        total, top_level = import_times(module_path)
+        totals.append(total)
+    totals.sort()
+    return totals[len(totals) // 2] / 1000.0, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('modules', nargs='*', help='module names, all modules of library/ by default')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--limit-ms', type=float, default=0, help='fail any module importing longer than this')
+    parser.add_argument('--budget', help='fail the modules importing longer than this saved budget')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--save-budget', help='write the import times of this run as budget')
+    parser.add_argument('--top', type=int, default=3, help='heaviest top level imports shown per module')
+    args = parser.parse_args()
+
+    names = args.modules or sorted(os.path.basename(path)[:-3] for path in glob.glob(os.path.join(LIBRARY_DIR, '*.py'))
+                                   if not path.endswith('__init__.py'))
+    budget = {}
+    if args.budget:
+        with open(args.budget) as budget_file:
+            budget = json.load(budget_file)
+
+    results = {}
+    failures = []
+    for name in names:
+        try:
+            milliseconds, top_level = measure(os.path.join(LIBRARY_DIR, name + '.py'), args.runs)
+        except RuntimeError as error:
+            print('{:<26} not importable: {}'.format(name, error))
+            continue
+        results[name] = round(milliseconds, 1)
+        heaviest = ', '.join('{} {:.1f}'.format(import_name, cumulative / 1000.0)
+                             for cumulative, import_name in top_level[:args.top])
+        print('{:<26} {:8.1f} ms  {}'.format(name, milliseconds, heaviest))
+        if args.limit_ms and milliseconds > args.limit_ms:
+            failures.append('{} imports in {:.1f} ms, limit {:.1f} ms'.format(name, milliseconds, args.limit_ms))
+        if name in budget and milliseconds > budget[name] * (1 + args.tolerance):
+            failures.append('{} imports in {:.1f} ms, budget {:.1f} ms'.format(name, milliseconds, budget[name]))
+
+    if args.save_budget:
+        with open(args.save_budget, 'w') as budget_file:
+            json.dump(results, budget_file, indent=2, sort_keys=True)
+    for failure in failures:
+        print('over budget ' + failure)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Checks the inventory lookups of module_utils/nsx_inventory.py on a client without a direct transport, like the
+PersistentNsxClient used on an 'httpapi' connection, which read the lists through read_all_pages and verify the ids
+taken from nsx_facts with a read in the 'continue' fail_mode.
+
+    python benchmarks/inventory_fallback.py --switches 2500
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+from nsx_client import PersistentNsxClient
+from nsx_inventory import build_index, fact_record, find_record, inventory_index, iter_records
+
+
+class NsxClientStandIn(object):
+    """
+    Answers read_all_pages with the signature of nsxramlclient's NsxClient
+    """
+    def __init__(self, switch_count):
+        self.switches = [{'objectId': 'virtualwire-{}'.format(index), 'name': 'lswitch-{}'.format(index),
+                          'vdnScopeId': 'vdnscope-1'} for index in range(switch_count)]
+        self.edges = [{'objectId': 'edge-1', 'name': 'dlr', 'edgeType': 'distributedRouter'},
+                      {'objectId': 'edge-2', 'name': 'esg', 'edgeType': 'gatewayServices'}]
+
+    def read_all_pages(self, searched_resource, uri_parameters=None, request_body_dict=None,
+                       query_parameters_dict=None, additional_headers=None):
+        if searched_resource == 'nsxEdges':
+            return self.edges
+        return self.switches
+
+    def read(self, searched_resource, uri_parameters=None, query_parameters_dict=None, additional_headers=None):
+        edge = [edge for edge in self.edges if edge['objectId'] == uri_parameters.get('edgeId')]
+        if not edge:
+            raise LookupError(uri_parameters)
+        return {'status': 200, 'body': {'edge': edge[0]}}
+
+
+class ConnectionStandIn(object):
+    """
+    Executes the calls of a PersistentNsxClient like the nsx httpapi plugin does
+    """
+    def __init__(self, client):
+        self.client = client
+
+    def nsx_request(self, nsxmanager_spec, method, args, kwargs):
+        try:
+            return {'result': getattr(self.client, method)(*args, **kwargs)}
+        except LookupError as error:
+            return {'error': {'status': 404, 'msg': str(error)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--switches', type=int, default=2500)
+    args = parser.parse_args()
+
+    client = PersistentNsxClient(ConnectionStandIn(NsxClientStandIn(args.switches)), {}, fail_mode='raise')
+    last = 'lswitch-{}'.format(args.switches - 1)
+    checks = [
+        ('iter_records', len(list(iter_records(client, 'logicalSwitchesGlobal', ('objectId', 'name')))) ==
+         args.switches),
+        ('iter_records uri_parameters', len(list(iter_records(client, 'logicalSwitches', ('objectId',),
+                                                              uri_parameters={'scopeId': 'vdnscope-1'}))) ==
+         args.switches),
+        ('find_record', find_record(client, 'logicalSwitchesGlobal', 'name', last)['objectId'] ==
+         'virtualwire-{}'.format(args.switches - 1)),
+        ('find_record missing', find_record(client, 'nsxEdges', 'name', 'missing') is None),
+        ('build_index', build_index(client, 'nsxEdges', fields=('edgeType',)).by_name('esg').get('edgeType') ==
+         'gatewayServices'),
+        ('inventory_index', inventory_index(client, 'logicalSwitchesGlobal').by_name(last).object_id ==
+         'virtualwire-{}'.format(args.switches - 1)),
+    ]
+    nsx_facts = {'edges': {'esg': {'id': 'edge-2'}, 'recreated': {'id': 'edge-9'}}}
+    checks.extend([
+        ('fact_record', fact_record(client, nsx_facts, 'edges', 'esg') == {'id': 'edge-2'}),
+        ('fact_record stale id', fact_record(client, nsx_facts, 'edges', 'recreated') is None),
+        ('fact_record fail_mode kept', client.fail_mode == 'raise'),
+    ])
+
+    for name, passed in checks:
+        print('{:30} {}'.format(name, 'ok' if passed else 'FAILED'))
+    if not all(passed for _, passed in checks):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
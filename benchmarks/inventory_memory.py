@@ -0,0 +1,92 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Compares the memory held by a logical switch inventory kept as the full dictionaries returned by the NSX API, as the
+modules did with their all_lswitches lists, and kept as the compact InventoryRecords of module_utils/nsx_inventory.py.
+
+    python benchmarks/inventory_memory.py --switches 20000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+try:
+    from lxml import etree as et
+except ImportError:
+    from xml.etree import ElementTree as et
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+from nsx_client import fast_xml_to_dict
+from nsx_inventory import InventoryIndex, InventoryRecord
+
+
+def virtual_wire(index):
+    return '<virtualWire><objectId>virtualwire-{0}</objectId><objectTypeName>VirtualWire</objectTypeName>' \
+           '<vsmUuid>4237C4E5-62B4-9B7C-1B2A-2B0C0B0E1F1A</vsmUuid><nodeId>1f2b3c4d-5e6f-4a7b-8c9d-0e1f2a3b4c5d' \
+           '</nodeId><revision>2</revision><type><typeName>VirtualWire</typeName></type>' \
+           '<name>lswitch-{0}</name><description>logical switch {0}</description>' \
+           '<clientHandle/><extendedAttributes/><isUniversal>false</isUniversal>' \
+           '<universalRevision>0</universalRevision><tenantId>virtual wire tenant</tenantId>' \
+           '<vdnScopeId>vdnscope-1</vdnScopeId><vdsContextWithBacking><switch><objectId>dvs-21</objectId>' \
+           '<objectTypeName>VmwareDistributedVirtualSwitch</objectTypeName><name>dvs-compute</name>' \
+           '<scope><id>datacenter-2</id><objectTypeName>Datacenter</objectTypeName><name>dc</name></scope>' \
+           '</switch><mtu>1600</mtu><promiscuousMode>false</promiscuousMode><backingType>portgroup' \
+           '</backingType><backingValue>dvportgroup-{0}</backingValue><missingOnVc>false</missingOnVc>' \
+           '</vdsContextWithBacking><vdnId>{1}</vdnId><guestVlanAllowed>false</guestVlanAllowed>' \
+           '<controlPlaneMode>UNICAST_MODE</controlPlaneMode><ctrlLsUuid>{0:08x}-0000-4000-8000-000000000000' \
+           '</ctrlLsUuid><macLearningEnabled>false</macLearningEnabled></virtualWire>'.format(index, 5000 + index)
+
+
+def parsed_switches(switch_count):
+    for index in range(switch_count):
+        yield fast_xml_to_dict(et.fromstring(virtual_wire(index)))['virtualWire']
+
+
+def held_bytes(build):
+    gc.collect()
+    tracemalloc.start()
+    inventory = build()
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return current, inventory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--switches', type=int, default=20000)
+    args = parser.parse_args()
+
+    full_bytes, all_lswitches = held_bytes(lambda: list(parsed_switches(args.switches)))
+    del all_lswitches
+    compact_bytes, index = held_bytes(lambda: InventoryIndex(
+        InventoryRecord(lswitch['objectId'], lswitch['name']) for lswitch in parsed_switches(args.switches)))
+
+    print('switches {}'.format(len(index)))
+    print('full dictionaries   {:10.1f} KiB  {:6.0f} bytes per switch'.format(
+        full_bytes / 1024.0, float(full_bytes) / args.switches))
+    print('inventory records   {:10.1f} KiB  {:6.0f} bytes per switch'.format(
+        compact_bytes / 1024.0, float(compact_bytes) / args.switches))
+    print('reduction           {:10.1f}x'.format(float(full_bytes) / compact_bytes))
+
+
+if __name__ == '__main__':
+    main()
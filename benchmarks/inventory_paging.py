@@ -0,0 +1,147 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Checks that the streamed paged list reads of module_utils/nsx_inventory.py return every object when NSX caps the page
+size below the requested one, against a local HTTP stand-in serving the logical switch and edge lists.
+
+    python benchmarks/inventory_paging.py --switches 2500 --server-page-size 256
+"""
+
+import argparse
+import os
+import sys
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+from nsx_inventory import PAGED_LISTS, build_index, find_record, iter_records
+
+RESOURCE_PATHS = {'logicalSwitchesGlobal': '/api/2.0/vdn/virtualwires',
+                  'nsxEdges': '/api/4.0/edges'}
+
+
+class PagedListHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        resource = [name for name, path in RESOURCE_PATHS.items() if path == url.path][0]
+        start_index = int(query.get('startindex', ['0'])[0])
+        page_size = min(int(query.get('pagesize', ['20'])[0]), self.server.page_size)
+        objects = self.server.objects[resource][start_index:start_index + page_size]
+        self.server.requests.append((resource, start_index))
+
+        list_tag, page_tag, object_tag = PAGED_LISTS[resource]
+        paging_info = '<pageSize>{}</pageSize><startIndex>{}</startIndex>'.format(page_size, start_index)
+        if self.server.total_count:
+            paging_info += '<totalCount>{}</totalCount>'.format(len(self.server.objects[resource]))
+        body = '<{0}><{1}><pagingInfo>{2}</pagingInfo>{3}</{1}></{0}>'.format(
+            list_tag, page_tag, paging_info, ''.join('<{0}><objectId>{1}</objectId><name>{2}</name></{0}>'.format(
+                object_tag, object_id, name) for object_id, name in objects)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class PagedListServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, objects, page_size):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), PagedListHandler)
+        self.objects = objects
+        self.page_size = page_size
+        self.total_count = True
+        self.requests = []
+
+
+class Obj(object):
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class NsxClientStandIn(object):
+    """
+    Has the direct transport of nsxramlclient's NsxClient that iter_records streams the pages with
+    """
+    def __init__(self, base_url):
+        self.fail_mode = 'raise'
+        self._httpsession = Obj(_session=requests.Session())
+        self._nsxraml = Obj(contruct_resource_url=lambda resource, uri_parameters=None:
+                            base_url + RESOURCE_PATHS[resource])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--switches', type=int, default=2500)
+    parser.add_argument('--edges', type=int, default=600)
+    parser.add_argument('--server-page-size', type=int, default=256)
+    args = parser.parse_args()
+
+    objects = {'logicalSwitchesGlobal': [('virtualwire-{}'.format(index), 'lswitch-{}'.format(index))
+                                         for index in range(args.switches)],
+               'nsxEdges': [('edge-{}'.format(index), 'edge-name-{}'.format(index)) for index in range(args.edges)]}
+    server = PagedListServer(objects, args.server_page_size)
+    threading.Thread(target=server.serve_forever).start()
+    try:
+        client = NsxClientStandIn('http://127.0.0.1:{}'.format(server.server_address[1]))
+        last_switch = 'lswitch-{}'.format(args.switches - 1)
+        checks = [
+            ('iter_records switches', len(list(iter_records(client, 'logicalSwitchesGlobal', ('objectId',)))) ==
+             args.switches),
+            ('iter_records edges', len(list(iter_records(client, 'nsxEdges', ('objectId',)))) == args.edges),
+            ('find_record last switch', (find_record(client, 'logicalSwitchesGlobal', 'name', last_switch) or
+                                         {}).get('objectId') == 'virtualwire-{}'.format(args.switches - 1)),
+            ('build_index edges', len(build_index(client, 'nsxEdges')) == args.edges),
+        ]
+        del server.requests[:]
+        list(iter_records(client, 'logicalSwitchesGlobal', ('objectId',)))
+        checks.append(('pages requested', len(server.requests) ==
+                       -(-args.switches // args.server_page_size)))
+
+        server.total_count = False
+        checks.append(('without totalCount', len(list(iter_records(client, 'logicalSwitchesGlobal', ('objectId',))))
+                       == args.switches))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for name, passed in checks:
+        print('{:30} {}'.format(name, 'ok' if passed else 'FAILED'))
+    if not all(passed for _, passed in checks):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Replays the modules of library/ against recorded cassettes and reports the NSX API calls and wall time of every run.
+With a baseline the run fails when a module makes more calls than recorded in the baseline, so call count
+regressions are caught without an NSX Manager.
+
+Record cassettes by running playbooks with the cassette environment set, one cassette per module run:
+
+    mkdir -p cassettes
+    NSX_CASSETTE=cassettes NSX_CASSETTE_MODE=record ansible-playbook test_dlr.yml
+
+Replay them, optionally with a simulated latency per call:
+
+    python benchmarks/module_replay.py cassettes --raml /raml/nsxvapi.raml --save-baseline baseline.json
+    python benchmarks/module_replay.py cassettes --raml /raml/nsxvapi.raml --latency 0.02 --baseline baseline.json
+
+Needs ansible and nsxramlclient, like the modules.
+"""
+
+import argparse
+import glob
+import io
+import json
+import os
+import runpy
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+LIBRARY_DIR = os.path.join(BENCHMARKS_DIR, '..', 'library')
+MODULE_UTILS_DIR = os.path.join(BENCHMARKS_DIR, '..', 'module_utils')
+MODULE_UTILS = ('nsx_governor', 'nsx_cassette', 'nsx_client', 'nsx_inventory', 'nsx_profile', 'nsx_dag',
+                'nsx_ipam')
+
+sys.path.insert(0, MODULE_UTILS_DIR)
+
+
+def load_module_utils():
+    """
+    Makes module_utils importable as ansible.module_utils, the way Ansible ships it with the modules
+    """
+    import importlib
+    import ansible.module_utils
+
+    for name in MODULE_UTILS:
+        module = importlib.import_module(name)
+        sys.modules['ansible.module_utils.' + name] = module
+        setattr(ansible.module_utils, name, module)
+    return sys.modules['nsx_cassette']
+
+
+def replay_args(header, raml_file):
+    args = dict(header['args'])
+    args['nsxmanager_spec'] = dict(args['nsxmanager_spec'], raml_file=raml_file, password='replay')
+    return args
+
+
+def replay(nsx_cassette, cassette_path, raml_file, latency):
+    """
+    Runs the main function of the recorded module with the recorded arguments against the cassette
+    :return: A dictionary with the calls per HTTP method, the total calls, the requests missing in the cassette, the
+             wall time and whether the module failed
+    """
+    from ansible.module_utils import basic
+
+    header = nsx_cassette.Cassette(cassette_path).header
+    basic._ANSIBLE_ARGS = json.dumps({'ANSIBLE_MODULE_ARGS': replay_args(header, raml_file)}).encode('utf-8')
+    os.environ[nsx_cassette.CASSETTE_ENV] = cassette_path
+    os.environ[nsx_cassette.CASSETTE_MODE_ENV] = 'replay'
+    os.environ[nsx_cassette.CASSETTE_LATENCY_ENV] = str(latency or '')
+    del nsx_cassette.ACTIVE_CASSETTES[:]
+
+    module_main = runpy.run_path(os.path.join(LIBRARY_DIR, header['module'] + '.py'))['main']
+    stdout = sys.stdout
+    sys.stdout = output = io.StringIO() if sys.version_info[0] > 2 else io.BytesIO()
+    start = time.time()
+    error = None
+    try:
+        module_main()
+    except SystemExit:
+        pass
+    except Exception as exception:
+        error = '{}: {}'.format(type(exception).__name__, exception)
+    finally:
+        seconds = time.time() - start
+        sys.stdout = stdout
+
+    try:
+        failed = bool(json.loads(output.getvalue().strip().splitlines()[-1]).get('failed'))
+    except (ValueError, IndexError):
+        failed = True
+    calls = {}
+    misses = []
+    for cassette in nsx_cassette.ACTIVE_CASSETTES:
+        for method, count in cassette.calls.items():
+            calls[method] = calls.get(method, 0) + count
+        misses.extend(cassette.misses)
+    return {'module': header['module'], 'calls': calls, 'total': sum(calls.values()), 'misses': len(misses),
+            'seconds': round(seconds, 3), 'failed': failed or error is not None, 'error': error}
+
+
+def cassette_paths(paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(glob.glob(os.path.join(path, '*.json.gz'))))
+        else:
+            found.append(path)
+    return found
+
+
+def regressions(results, baseline):
+    """
+    :return: A message for every cassette with more calls or missing responses compared to the baseline
+    """
+    messages = []
+    for name, result in sorted(results.items()):
+        if result['misses']:
+            messages.append('{}: {} requests not in the cassette'.format(name, result['misses']))
+        if name in baseline and result['total'] > baseline[name]['total']:
+            messages.append('{}: {} calls, baseline {}'.format(name, result['total'], baseline[name]['total']))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('cassettes', nargs='+', help='cassette files or directories of cassettes')
+    parser.add_argument('--raml', required=True, help='the NSX RAML file the modules load')
+    parser.add_argument('--latency', default=None, help="seconds added to every call, or 'recorded'")
+    parser.add_argument('--baseline', help='fail on call count regressions against this baseline')
+    parser.add_argument('--save-baseline', help='write the call counts of this run as baseline')
+    args = parser.parse_args()
+
+    nsx_cassette = load_module_utils()
+    results = {}
+    print('{:<32} {:<26} {:>6} {:>6} {:>9}  {}'.format('cassette', 'module', 'calls', 'misses', 'wall ms', 'methods'))
+    for path in cassette_paths(args.cassettes):
+        name = os.path.basename(path)
+        results[name] = result = replay(nsx_cassette, path, args.raml, args.latency)
+        methods = ' '.join('{}={}'.format(method, count) for method, count in sorted(result['calls'].items()))
+        print('{:<32} {:<26} {:>6} {:>6} {:>9.1f}  {}{}'.format(
+            name, result['module'], result['total'], result['misses'], 1000 * result['seconds'], methods,
+            '  FAILED' + (' ' + result['error'] if result['error'] else '') if result['failed'] else ''))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(dict((name, {'module': result['module'], 'calls': result['calls'], 'total': result['total']})
+                           for name, result in results.items()), baseline_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            messages = regressions(results, json.load(baseline_file))
+        for message in messages:
+            print('regression ' + message)
+        if messages:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Checks and times the disk upload of the 'pyvmomi' deploy engine of nsx_deploy_ova against a local HTTP stand-in for
+the NFC device urls of a HttpNfcLease. A synthetic OVA is streamed to the stand-in, which verifies the bytes of every
+disk, while the lease progress reports are recorded. A second run lets one disk fail and checks the lease is aborted.
+
+    python benchmarks/nfc_upload.py --disks 3 --disk-mb 16 --threads 2
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import runpy
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from pyVmomi import vim
+
+from module_replay import LIBRARY_DIR, load_module_utils
+
+OVF_DESCRIPTOR = b'''<?xml version="1.0" encoding="UTF-8"?>
+<Envelope xmlns="http://schemas.dmtf.org/ovf/envelope/1" xmlns:ovf="http://schemas.dmtf.org/ovf/envelope/1">
+  <NetworkSection><Network ovf:name="VSMgmt"/></NetworkSection>
+</Envelope>
+'''
+
+
+class NfcHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        disk_name = self.path.rsplit('/', 1)[-1]
+        remaining = int(self.headers['Content-Length'])
+        digest = hashlib.sha1()
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 64 * 1024))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+            # throttled like a busy ESXi host, so the upload spans several lease progress reports
+            time.sleep(self.server.chunk_delay)
+        self.server.received[disk_name] = {'sha1': digest.hexdigest(), 'missing': remaining,
+                                           'content_type': self.headers['Content-Type']}
+        status = 500 if disk_name == self.server.failing_disk else 200
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class NfcServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, chunk_delay):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), NfcHandler)
+        self.chunk_delay = chunk_delay
+        self.received = {}
+        self.failing_disk = None
+
+
+def build_ova(directory, disk_count, disk_bytes):
+    """
+    Writes an OVA holding the OVF descriptor and disk_count disks of random bytes
+    :return: The OVA path and a dictionary with the SHA1 of every disk
+    """
+    ova_file = os.path.join(directory, 'nsx-manager.ova')
+    disks = {}
+    with tarfile.open(ova_file, 'w') as ova:
+        descriptor = tarfile.TarInfo('nsx-manager.ovf')
+        descriptor.size = len(OVF_DESCRIPTOR)
+        ova.addfile(descriptor, io.BytesIO(OVF_DESCRIPTOR))
+        for index in range(disk_count):
+            disk_content = os.urandom(disk_bytes)
+            disk = tarfile.TarInfo('nsx-manager-disk{}.vmdk'.format(index + 1))
+            disk.size = disk_bytes
+            ova.addfile(disk, io.BytesIO(disk_content))
+            disks[disk.name] = hashlib.sha1(disk_content).hexdigest()
+    return ova_file, disks
+
+
+class Obj(object):
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class LeaseStandIn(object):
+    """
+    HttpNfcLease handing out one device url per disk on the stand-in server, recording the progress reports
+    """
+    def __init__(self, port, disk_names):
+        self.state = vim.HttpNfcLease.State.ready
+        self.error = None
+        self.info = Obj(deviceUrl=[Obj(importKey='key-{}'.format(name), url='http://*:{}/nfc/{}'.format(port, name))
+                                   for name in disk_names])
+        self.progress = []
+        self.completed = False
+        self.aborted = False
+
+    def HttpNfcLeaseProgress(self, percent):
+        self.progress.append(percent)
+
+    def HttpNfcLeaseComplete(self):
+        self.completed = True
+
+    def HttpNfcLeaseAbort(self, fault=None):
+        self.aborted = True
+
+
+class ModuleFailed(Exception):
+    pass
+
+
+class ModuleStandIn(object):
+    def __init__(self, params):
+        self.params = params
+
+    def fail_json(self, **kwargs):
+        raise ModuleFailed(kwargs)
+
+
+def content_stand_in(lease, disk_names):
+    import_spec = Obj(error=[], importSpec=None,
+                      fileItem=[Obj(deviceId='key-{}'.format(name), path=name) for name in disk_names])
+    ovf_manager = Obj(CreateImportSpec=lambda descriptor, resource_pool, datastore, params: import_spec)
+    return Obj(ovfManager=ovf_manager)
+
+
+def patch_inventory(deploy_globals, lease, report_lease_progress, progress_interval):
+    """
+    Replaces the vCenter inventory lookups of the module with stand-ins, and shortens the lease progress interval
+    """
+    resource_pool = Obj(ImportVApp=lambda spec, folder: lease)
+    deploy_globals.update({
+        'get_cluster_resource_pool': lambda content, datacenter, cluster: (Obj(vmFolder=None), resource_pool),
+        'find_datastore': lambda content, name: vim.Datastore('datastore-1'),
+        'find_network': lambda content, name: vim.Network('network-1'),
+        'find_virtual_machine': lambda content, name: Obj(PowerOnVM_Task=lambda: None),
+        'report_lease_progress': lambda lease, progress, done_event: report_lease_progress(lease, progress,
+                                                                                           done_event,
+                                                                                           progress_interval)})
+
+
+def run_deploy(deploy_globals, server, ova_file, disk_names, threads, progress_interval):
+    lease = LeaseStandIn(server.server_address[1], disk_names)
+    deploy_ova_native = deploy_globals['deploy_ova_native']
+    patch_inventory(deploy_ova_native.__globals__, lease, deploy_globals['report_lease_progress'], progress_interval)
+    server.received.clear()
+    module = ModuleStandIn({'datacenter': 'dc', 'cluster': 'cluster', 'datastore': 'ds', 'portgroup': 'pg',
+                            'vmname': 'nsx-manager', 'disk_mode': 'thin', 'vcenter': '127.0.0.1',
+                            'upload_threads': threads, 'hostname': 'nsxmanager', 'dns_server': '10.0.0.2',
+                            'dns_domain': 'example.com', 'ntp_server': '10.0.0.3', 'gateway': '10.0.0.1',
+                            'ip_address': '10.0.0.10', 'netmask': '255.255.255.0', 'admin_password': 'secret',
+                            'enable_password': 'secret'})
+    start = time.time()
+    try:
+        result = deploy_ova_native(module, content_stand_in(lease, disk_names), ova_file)
+    except ModuleFailed as failure:
+        result = failure.args[0]
+    return result, lease, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--disks', type=int, default=3)
+    parser.add_argument('--disk-mb', type=int, default=16)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--chunk-delay', type=float, default=0.002, help='seconds the stand-in waits per 64KB')
+    parser.add_argument('--progress-interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    load_module_utils()
+    # run_path returns a copy of the module globals, the functions in it keep the originals the stand-ins replace
+    deploy_globals = runpy.run_path(os.path.join(LIBRARY_DIR, 'nsx_deploy_ova.py'))
+
+    work_dir = tempfile.mkdtemp(prefix='nfc-upload-')
+    server = NfcServer(args.chunk_delay)
+    threading.Thread(target=server.serve_forever).start()
+    try:
+        ova_file, disks = build_ova(work_dir, args.disks, args.disk_mb * 1024 * 1024)
+        disk_names = sorted(disks)
+        total_bytes = args.disks * args.disk_mb * 1024 * 1024
+
+        result, lease, seconds = run_deploy(deploy_globals, server, ova_file, disk_names, args.threads,
+                                            args.progress_interval)
+        print('uploaded {} disks, {:.1f} MB in {:.2f}s ({:.1f} MB/s), {} progress reports'.format(
+            args.disks, total_bytes / 1048576.0, seconds, total_bytes / 1048576.0 / seconds, len(lease.progress)))
+        received = dict(server.received)
+        checks = [
+            ('upload results', sorted(result.get('upload_results', [])) == [(name, 200) for name in disk_names]),
+            ('disk contents', all(received.get(name, {}).get('sha1') == disks[name] and
+                                  not received[name]['missing'] for name in disk_names)),
+            ('content type', all(received.get(name, {}).get('content_type') == 'application/x-vnd.vmware-streamVmdk'
+                                 for name in disk_names)),
+            ('uploaded bytes', result.get('uploaded_bytes') == total_bytes),
+            ('progress increasing', lease.progress == sorted(lease.progress)),
+            ('progress during upload', any(0 < percent < 100 for percent in lease.progress)),
+            ('progress completed', lease.progress[-1:] == [100] and result.get('lease_progress') == 100),
+            ('lease completed', lease.completed and not lease.aborted),
+        ]
+
+        server.failing_disk = disk_names[-1]
+        result, lease, _ = run_deploy(deploy_globals, server, ova_file, disk_names, args.threads,
+                                      args.progress_interval)
+        checks.extend([
+            ('failed upload reported', disk_names[-1] in result.get('msg', '') and
+             (disk_names[-1], 500) in result.get('upload_results', [])),
+            ('failed upload aborts lease', lease.aborted and not lease.completed),
+        ])
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(work_dir)
+
+    for name, passed in checks:
+        print('{:30} {}'.format(name, 'ok' if passed else 'FAILED'))
+    if not all(passed for _, passed in checks):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Times the pure normalize and diff functions of nsx_ospf, nsx_redistribution, nsx_dlr and nsx_edge_router on synthetic
+configurations of several sizes. A saved baseline flags every function that got slower than the threshold.
+
+    python benchmarks/pure_functions.py --scales 10 100 1000 --save-baseline pure_baseline.json
+    python benchmarks/pure_functions.py --scales 10 100 1000 --baseline pure_baseline.json --threshold 0.25
+
+Needs ansible, like the modules. Baselines are only comparable on the same machine.
+"""
+
+import argparse
+import copy
+import json
+import os
+import runpy
+import sys
+import time
+
+from module_replay import LIBRARY_DIR, load_module_utils
+
+timer = getattr(time, 'perf_counter', time.time)
+
+
+class ListClient(object):
+    """
+    Stands in for the NsxClient, the diff functions only use it to normalize lists and to write changed routes
+    """
+    def __init__(self):
+        from nsx_client import PersistentNsxClient
+        self.normalize_list_return = PersistentNsxClient.normalize_list_return
+
+    @staticmethod
+    def read(*args, **kwargs):
+        return {'body': {'staticRouting': {'staticRoutes': None}}}
+
+    @staticmethod
+    def update(*args, **kwargs):
+        return {'status': 204}
+
+
+class RoutesModule(object):
+    def __init__(self, routes):
+        self.params = {'routes': routes}
+
+    def fail_json(self, **kwargs):
+        raise ValueError(kwargs.get('msg'))
+
+
+def desired_areas(count):
+    return [{'area_id': index, 'type': 'nssa' if index % 2 else 'normal',
+             'authentication': 'md5' if index % 3 == 0 else 'none', 'password': 'secret'} for index in range(count)]
+
+
+def ospf_config(count):
+    """
+    NSX has half of the desired areas and interfaces, every other one with different settings, and as many others
+    """
+    areas = [{'areaId': str(index), 'type': 'normal', 'authentication': {'type': 'none', 'value': None}}
+             for index in range(count // 2, count + count // 2)]
+    interfaces = [{'vnic': str(index), 'areaId': str(index), 'helloInterval': '10', 'deadInterval': '40',
+                   'cost': str(1 + index % 2), 'priority': '128', 'mtuIgnore': 'false'}
+                  for index in range(count // 2, count + count // 2)]
+    return {'routing': {'ospf': {'ospfAreas': {'ospfArea': areas}, 'ospfInterfaces': {'ospfInterface': interfaces}}}}
+
+
+def desired_area_map(count):
+    return [{'area_id': index, 'vnic': index, 'cost': 1} for index in range(count)]
+
+
+def desired_rules(count):
+    return [{'learner': 'ospf' if index % 2 else 'bgp', 'priority': index, 'static': index % 2 == 0,
+             'connected': True, 'bgp': 'false', 'ospf': 'true', 'prefix': 'prefix-{}'.format(index),
+             'action': 'deny' if index % 5 == 0 else 'permit'} for index in range(count)]
+
+
+def redistribution_config(count):
+    rules = [{'id': str(index), 'prefixName': 'prefix-{}'.format(index), 'action': 'permit',
+              'from': {'ospf': 'true', 'bgp': 'false', 'connected': 'true', 'static': 'false'}}
+             for index in range(count // 2, count + count // 2)]
+    prefixes = [{'name': 'prefix-{}'.format(index), 'ipAddress': '10.{}.{}.0/24'.format(index // 256, index % 256)}
+                for index in range(count // 2, count + count // 2)]
+    return {'routing': {'routingGlobalConfig': {'ipPrefixes': {'ipPrefix': prefixes}},
+                        'ospf': {'redistribution': {'enabled': 'true', 'rules': {'rule': rules}}}}}
+
+
+def desired_prefixes(count):
+    return [{'name': 'prefix-{}'.format(index), 'network': '10.{}.{}.0/24'.format(index // 256, (index + 1) % 256)}
+            for index in range(count)]
+
+
+def desired_interfaces(count):
+    return [{'name': 'iface-{}'.format(index), 'ip': '10.0.{}.1'.format(index % 256), 'prefix_len': 24,
+             'iftype': 'internal', 'logical_switch': 'lswitch-{}'.format(index)} for index in range(count)]
+
+
+def desired_routes(count):
+    return [{'network': '10.{}.{}.0/24'.format(index // 256, index % 256), 'next_hop': '172.16.0.1',
+             'admin_distance': '1', 'mtu': '1500' if index % 2 else '9000'} for index in range(count)]
+
+
+def current_routes(count):
+    return [{'network': '10.{}.{}.0/24'.format(index // 256, index % 256), 'nextHop': '172.16.0.1',
+             'adminDistance': '1', 'mtu': '1500', 'description': None}
+            for index in range(count // 2, count + count // 2)]
+
+
+def normalized(normalize, items):
+    return normalize(items)[2]
+
+
+# name, module, the function called with the arguments built for a scale by the lambda
+CASES = (
+    ('normalize_areas', 'nsx_ospf', lambda m, n: (desired_areas(n),)),
+    ('normalize_area_mapping', 'nsx_ospf', lambda m, n: (desired_area_map(n),)),
+    ('check_areas', 'nsx_ospf',
+     lambda m, n: (ListClient(), ospf_config(n), normalized(m['normalize_areas'], desired_areas(n)))),
+    ('check_area_mapping', 'nsx_ospf',
+     lambda m, n: (ListClient(), ospf_config(n), normalized(m['normalize_area_mapping'], desired_area_map(n)))),
+    ('normalize_rules', 'nsx_redistribution', lambda m, n: (desired_rules(n),)),
+    ('check_rules', 'nsx_redistribution',
+     lambda m, n: (ListClient(), redistribution_config(n), normalized(m['normalize_rules'], desired_rules(n)),
+                   'ospf')),
+    ('check_prefixes', 'nsx_redistribution',
+     lambda m, n: (ListClient(), redistribution_config(n), desired_prefixes(n))),
+    ('construct_ifaces_dict', 'nsx_dlr', lambda m, n: (desired_interfaces(n),)),
+    ('check_routes', 'nsx_dlr',
+     lambda m, n: (ListClient(), 'edge-1', current_routes(n), RoutesModule(desired_routes(n)))),
+    ('check_routes', 'nsx_edge_router',
+     lambda m, n: (ListClient(), 'edge-1', current_routes(n), RoutesModule(desired_routes(n)))),
+)
+
+
+def time_function(function, args, repeat, number):
+    """
+    :return: The median seconds of one call out of repeat rounds of number calls. The functions change their
+             arguments, so every call gets a fresh copy, made outside the measured time
+    """
+    rounds = []
+    for _ in range(repeat):
+        calls = [copy.deepcopy(args) for _ in range(number)]
+        start = timer()
+        for call_args in calls:
+            function(*call_args)
+        rounds.append((timer() - start) / number)
+    rounds.sort()
+    return rounds[len(rounds) // 2]
+
+
+def regressions(results, baseline, threshold):
+    messages = []
+    for key, seconds in sorted(results.items()):
+        if key in baseline and seconds > baseline[key] * (1 + threshold):
+            messages.append('{} {:.1f} us, baseline {:.1f} us (+{:.0%})'.format(
+                key, 1e6 * seconds, 1e6 * baseline[key], seconds / baseline[key] - 1))
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=0, help='calls per round, by default about 1000 items a round')
+    parser.add_argument('--only', help='only the functions with this text in the name')
+    parser.add_argument('--baseline', help='flag the functions slower than this baseline by more than the threshold')
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--save-baseline', help='write the timings of this run as baseline')
+    args = parser.parse_args()
+
+    load_module_utils()
+    modules = {}
+    results = {}
+    for name, module, build_args in CASES:
+        if args.only and args.only not in name:
+            continue
+        if module not in modules:
+            modules[module] = runpy.run_path(os.path.join(LIBRARY_DIR, module + '.py'))
+        for scale in args.scales:
+            key = '{}.{}[{}]'.format(module, name, scale)
+            number = args.number or max(1, 1000 // scale)
+            results[key] = time_function(modules[module][name], build_args(modules[module], scale), args.repeat,
+                                         number)
+            print('{:<52} {:>12.1f} us'.format(key, 1e6 * results[key]))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            messages = regressions(results, json.load(baseline_file), args.threshold)
+        for message in messages:
+            print('regression ' + message)
+        if messages:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
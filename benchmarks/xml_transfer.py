@@ -0,0 +1,104 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+"""
+Measures the transferred bytes with and without gzip, and the XML to dictionary conversion time of nsxramlclient
+and of the fast parser in module_utils/nsx_client.py, on synthetic full size NSX documents.
+
+    python benchmarks/xml_transfer.py --edges 2000 --rounds 5
+"""
+
+import argparse
+import gzip
+import io
+import os
+import sys
+import time
+
+try:
+    from lxml import etree as et
+except ImportError:
+    from xml.etree import ElementTree as et
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+from nsx_client import fast_xml_to_dict
+
+
+def edges_page(edge_count):
+    summaries = ''.join(
+        '<edgeSummary><objectId>edge-{0}</objectId><id>edge-{0}</id><name>edge-{0}</name>'
+        '<edgeType>gatewayServices</edgeType><edgeStatus>GREEN</edgeStatus><tenantId>default</tenantId>'
+        '<appliancesSummary><vmSize>large</vmSize><enableFips>false</enableFips>'
+        '<numberOfDeployedVms>2</numberOfDeployedVms></appliancesSummary></edgeSummary>'.format(index)
+        for index in range(edge_count))
+    return '<pagedEdgeList><edgePage><pagingInfo><pageSize>{0}</pageSize><totalCount>{0}</totalCount>' \
+           '</pagingInfo>{1}</edgePage></pagedEdgeList>'.format(edge_count, summaries)
+
+
+def routing_config(route_count):
+    routes = ''.join(
+        '<staticRoute><description>route {0}</description><vnic>0</vnic><network>10.{1}.{2}.0/24</network>'
+        '<nextHop>172.16.0.1</nextHop><mtu>1500</mtu><adminDistance>1</adminDistance></staticRoute>'.format(
+            index, index // 256, index % 256)
+        for index in range(route_count))
+    return '<routing><routingGlobalConfig><routerId>172.16.0.2</routerId><ecmp>false</ecmp>' \
+           '</routingGlobalConfig><staticRouting><staticRoutes>{}</staticRoutes></staticRouting>' \
+           '<ospf><enabled>false</enabled></ospf></routing>'.format(routes)
+
+
+def gzip_size(document):
+    buffer_ = io.BytesIO()
+    gzip_file = gzip.GzipFile(fileobj=buffer_, mode='wb')
+    gzip_file.write(document)
+    gzip_file.close()
+    return len(buffer_.getvalue())
+
+
+def time_conversion(convert, element, rounds):
+    start = time.time()
+    for _ in range(rounds):
+        result = convert(element)
+    return (time.time() - start) / rounds, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--edges', type=int, default=2000)
+    parser.add_argument('--routes', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        from nsxramlclient.xmloperations import xml_to_dict
+    except ImportError:
+        xml_to_dict = None
+        print('nsxramlclient is not installed, only the fast parser is measured')
+
+    for name, document in (('nsxEdges', edges_page(args.edges)), ('routingConfig', routing_config(args.routes))):
+        document = document.encode('utf-8')
+        element = et.fromstring(document)
+        fast_seconds, fast_result = time_conversion(fast_xml_to_dict, element, args.rounds)
+        print('{:<14} bytes {:>9}  gzip {:>8}  fast parser {:8.2f} ms'.format(
+            name, len(document), gzip_size(document), 1000 * fast_seconds))
+        if xml_to_dict:
+            seconds, result = time_conversion(xml_to_dict, element, args.rounds)
+            print('{:<14} nsxramlclient parser {:8.2f} ms  same result {}'.format(
+                '', 1000 * seconds, result == fast_result))
+
+
+if __name__ == '__main__':
+    main()
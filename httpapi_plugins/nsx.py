@@ -0,0 +1,72 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+DOCUMENTATION = """
+---
+author: nsxansible
+httpapi: nsx
+short_description: Keeps NsxClient sessions to NSX Manager open for the whole play
+description:
+  - This httpapi plugin holds one NsxClient per NSX Manager and RAML file in the persistent connection process.
+    Modules using get_nsx_client() send their calls through it, so the RAML file is parsed and the HTTPS
+    keep-alive session is established only once per play.
+version_added: "2.6"
+"""
+
+import os
+import sys
+
+from ansible.plugins.httpapi import HttpApiBase
+
+# the NsxClient setup is shared with the modules, module_utils sits next to httpapi_plugins
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'module_utils'))
+from nsx_client import NSX_CLIENT_METHODS, new_nsx_client
+from nsx_governor import throttle_stats_since
+
+
+class HttpApi(HttpApiBase):
+    def __init__(self, connection):
+        super(HttpApi, self).__init__(connection)
+        self._nsx_clients = {}
+
+    def nsx_client(self, nsxmanager_spec):
+        """
+        :return: The cached NsxClient for the NSX Manager, RAML file and user of the nsxmanager_spec
+        """
+        client_key = (nsxmanager_spec['raml_file'], nsxmanager_spec['host'], nsxmanager_spec['user'])
+        if client_key not in self._nsx_clients:
+            self._nsx_clients[client_key] = new_nsx_client(nsxmanager_spec, fail_mode='raise')
+        return self._nsx_clients[client_key]
+
+    def nsx_request(self, nsxmanager_spec, method, args, kwargs):
+        """
+        Runs one NsxClient call for a module. NSX errors are returned instead of raised, so the module can apply
+        its own fail_mode. The throttle statistics of the call are returned as 'throttle'
+        """
+        from nsxramlclient.exceptions import NsxError
+
+        if method not in NSX_CLIENT_METHODS:
+            raise ValueError('{} is not a supported NsxClient call'.format(method))
+        client = self.nsx_client(nsxmanager_spec)
+        before = client.nsx_governor.stats()
+        try:
+            response = {'result': getattr(client, method)(*args, **kwargs)}
+        except NsxError as error:
+            response = {'error': {'status': error.status, 'msg': error.msg}}
+        response['throttle'] = throttle_stats_since(before, client.nsx_governor.stats())
+        return response
@@ -18,21 +18,23 @@
 # IN THE SOFTWARE.
 
 
-def get_logical_switch(client_session, logical_switch_name):
+def get_logical_switch(client_session, logical_switch_name, nsx_facts=None):
     """
     :param client_session: An instance of an NsxClient Session
     :param logical_switch_name: The name of the logical switch searched
+    :param nsx_facts: Optional facts gathered by the nsx_facts module, used to resolve the name without API calls
     :return: A tuple, with the first item being the logical switch id as string of the first Scope found with the
              right name and the second item being a dictionary of the logical parameters as return by the NSX API
     """
-    all_lswitches = client_session.read_all_pages('logicalSwitchesGlobal', 'read')
-    try:
-        logical_switch_params = [scope for scope in all_lswitches if scope['name'] == logical_switch_name][0]
-        logical_switch_id = logical_switch_params['objectId']
-    except IndexError:
+    lswitch_facts = fact_record(client_session, nsx_facts, 'logical_switches', logical_switch_name)
+    if lswitch_facts:
+        return lswitch_facts['id']
+
+    logical_switch = find_record(client_session, 'logicalSwitchesGlobal', 'name', logical_switch_name)
+    if not logical_switch:
         return None
 
-    return logical_switch_id
+    return logical_switch['objectId']
 
 
 def attach_vm_to_portgroup(client_session, object_moid, portgroup_id):
@@ -47,6 +49,7 @@ def main():
         argument_spec=dict(
             state=dict(default='present', choices=['present', 'absent']),
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            nsx_facts=dict(type='dict'),
             portgroup_id=dict(default=None),
             logicalswitch=dict(default=None),
             object_moid=dict(required=True),
@@ -60,12 +63,11 @@ def main():
     if portgroup_id and logicalswitch:
         module.fail_json(msg='Only set portgroup_id OR logicalswitch, not both!')
 
-    from nsxramlclient.client import NsxClient
-    client_session = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                               module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    client_session = get_nsx_client(module)
 
     if logicalswitch:
-        lswitch_id = get_logical_switch(client_session, logicalswitch)
+        lswitch_id = get_logical_switch(client_session, logicalswitch, module.params['nsx_facts'])
         portgroup_id = lswitch_id
 
     changed = False
@@ -82,6 +84,8 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import fact_record, find_record
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
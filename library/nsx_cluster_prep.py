@@ -18,10 +18,13 @@
 # IN THE SOFTWARE.
 
 
+HOST_PREP_FEATURE = 'com.vmware.vshield.vsm.nwfabric.hostPrep'
+
+
 def get_cluster_status(session, cluster_moid):
     cluster_status = session.read('nwfabricStatus', query_parameters_dict={'resource': cluster_moid})['body']
     for feature_status in cluster_status['resourceStatuses']['resourceStatus']['nwFabricFeatureStatus']:
-        if feature_status['featureId'] == 'com.vmware.vshield.vsm.nwfabric.hostPrep':
+        if feature_status['featureId'] == HOST_PREP_FEATURE:
             return feature_status['status']
     else:
         return 'UNKNOWN'
@@ -57,15 +60,15 @@ def main():
         argument_spec=dict(
             state=dict(default='present', choices=['present', 'absent']),
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
-            cluster_moid=dict(required=True)
+            cluster_moid=dict(required=True),
+            async_job=dict(default=False, type='bool')
         ),
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
+    from ansible.module_utils.nsx_client import get_nsx_client
 
-    s = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                  module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    s = get_nsx_client(module)
 
     cluster_status = get_cluster_status(s, module.params['cluster_moid'])
 
@@ -79,6 +82,10 @@ def main():
 
     if cluster_status != 'GREEN' and module.params['state'] == 'present':
         prep_response = cluster_prep(s, module.params['cluster_moid'])
+        if module.params['async_job']:
+            module.exit_json(changed=True, prep_response=prep_response,
+                             jobs=[{'type': 'fabric_feature', 'id': module.params['cluster_moid'],
+                                    'feature': HOST_PREP_FEATURE, 'status': 'GREEN'}])
         prep_status = wait_for_status(s, module.params['cluster_moid'], completion_status='GREEN')
         if not prep_status:
             module.fail_json(msg='Timeout waiting for Cluster Prep to go GREEN', prep_response=prep_response)
@@ -88,6 +95,7 @@ def main():
     module.exit_json(changed=False, cluster_status=cluster_status)
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -22,7 +22,7 @@ def get_controller_cluster_info(session):
     return session.read('nsxControllers')['body']
 
 
-def create_controllers(session, controller_count, module):
+def build_controller_spec(session, module):
     controller_spec = session.extract_resource_body_example('nsxControllers', 'create')
     controller_spec['controllerSpec']['name'] = module.params['name']
     controller_spec['controllerSpec']['datastoreId'] = module.params['datastore_moid']
@@ -32,6 +32,20 @@ def create_controllers(session, controller_count, module):
     controller_spec['controllerSpec']['password'] = module.params['password']
     controller_spec['controllerSpec']['hostId'] = module.params['host_moid']
     controller_spec['controllerSpec']['deployType'] = module.params['deploysize']
+    return controller_spec
+
+
+def start_controller_deployment(session, module):
+    """
+    Starts the deployment of one controller without waiting for it
+    :return: The job for the nsx_job_status module
+    """
+    job_id = session.create('nsxControllers', request_body_dict=build_controller_spec(session, module))['body']
+    return {'type': 'controller_deployment', 'id': job_id}
+
+
+def create_controllers(session, controller_count, module):
+    controller_spec = build_controller_spec(session, module)
 
     for controller_nr in range(controller_count):
         job_id = session.create('nsxControllers', request_body_dict=controller_spec)['body']
@@ -134,15 +148,15 @@ def main():
             datastore_moid=dict(required=True),
             host_moid=dict(),
             network_moid=dict(required=True),
-            password=dict(required=True)
+            password=dict(required=True),
+            async_job=dict(default=False, type='bool')
         ),
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
+    from ansible.module_utils.nsx_client import get_nsx_client
 
-    s = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                  module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    s = get_nsx_client(module)
 
     new_controllers_deployed = False
     controller_cluster = get_controller_cluster_info(s)
@@ -161,10 +175,19 @@ def main():
         elif module.params['deploytype'] == 'full':
             if len(controller_id_list) == 0:
                 controller_to_deploy = 3
+            elif module.params['async_job'] and len(controller_id_list) < 3:
+                # NSX deploys one controller at a time, so async runs complete a full cluster one node per run
+                controller_to_deploy = 3 - len(controller_id_list)
         elif module.params['deploytype'] == 'lab':
             if len(controller_id_list) == 0:
                 controller_to_deploy = 1
-        if controller_to_deploy != 0:
+        if controller_to_deploy != 0 and module.params['async_job']:
+            if 'DEPLOYING' in get_controller_status_list(controller_cluster):
+                module.exit_json(changed=False, jobs=[], pending_controllers=controller_to_deploy,
+                                 msg='A controller deployment is still running')
+            job = start_controller_deployment(s, module)
+            module.exit_json(changed=True, jobs=[job], pending_controllers=controller_to_deploy - 1)
+        elif controller_to_deploy != 0:
             if not create_controllers(s, controller_to_deploy, module):
                 module.fail_json(msg='failed to deploy controllers')
             else:
@@ -190,6 +213,7 @@ def main():
         module.exit_json(changed=False, argument_spec=module.params)
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -21,39 +21,111 @@ __author__ = 'yfauser'
 
 
 from pyVim import connect
-from pyVmomi import vim
+from pyVmomi import vim, vmodl
 import requests
 import ssl
 import atexit
+import socket
+import time
+import tarfile
+import threading
+import xml.etree.ElementTree as ElementTree
 
+OVF_NS = '{http://schemas.dmtf.org/ovf/envelope/1}'
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
-def check_nsx_api(module):
+
+API_READINESS_PHASES = ['tcp_connect', 'tls_handshake', 'http_ok', 'api_ready']
+
+
+def check_nsx_api(module, timeout=None):
     appliance_check_url = 'https://{}//api/2.0/services/vcconfig'.format(module.params['ip_address'])
     try:
         response = requests.request('GET', appliance_check_url,
-                                    auth=('admin', module.params['admin_password']), verify=False)
-    except requests.exceptions.ConnectionError:
+                                    auth=('admin', module.params['admin_password']), verify=False, timeout=timeout)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
         return False
 
     return response.status_code, response.content
 
 
-def wait_for_api(module, sleep_time=24):
-    status_poll_count = 0
-    while status_poll_count < 30:
-        api_status = check_nsx_api(module)
-        if api_status:
-            if api_status[0] == 200:
-                return True
-            else:
-                status_poll_count += 1
-                time.sleep(sleep_time)
+def probe_nsx_api(module, timeout=5):
+    """
+    Runs the readiness pipeline against NSX Manager: TCP connect, TLS handshake, HTTP 200 on the web server and an
+    authenticated API call. Every step needs the previous one to succeed
+    :return: A tuple, with the first item being the number of phases passed and the second item being the error
+             that stopped the pipeline, or None if the API is ready
+    """
+    try:
+        sock = socket.create_connection((module.params['ip_address'], 443), timeout)
+    except (socket.error, socket.timeout) as tcp_error:
+        return 0, str(tcp_error)
+
+    try:
+        context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+        context.verify_mode = ssl.CERT_NONE
+        context.wrap_socket(sock).close()
+    except (ssl.SSLError, socket.error, socket.timeout) as tls_error:
+        sock.close()
+        return 1, str(tls_error)
+
+    try:
+        response = requests.get('https://{}/'.format(module.params['ip_address']), verify=False, timeout=timeout)
+    except requests.exceptions.RequestException as http_error:
+        return 2, str(http_error)
+    if response.status_code != 200:
+        return 2, 'web server returned status code {}'.format(response.status_code)
+
+    api_status = check_nsx_api(module, timeout=timeout)
+    if not api_status:
+        return 3, 'API connection failed'
+    elif api_status[0] != 200:
+        return 3, 'API returned status code {}'.format(api_status[0])
+
+    return 4, None
+
+
+def wait_for_api(module, max_wait=720, min_interval=0.5, max_interval=5):
+    """
+    Polls the readiness pipeline with an adaptive interval. The interval starts sub-second, doubles while no
+    progress is made and drops back to the minimum whenever a new phase is reached
+    :return: A tuple, with the first item being True if the API became ready, and the second item being a dictionary
+             with the seconds spent in each phase, the last phase reached and the last error seen
+    """
+    start_time = time.time()
+    phase_start = start_time
+    phases_passed = 0
+    interval = min_interval
+    readiness = {'phase_durations': {}, 'phase_reached': None, 'error': None}
+
+    while True:
+        passed, error = probe_nsx_api(module)
+        now = time.time()
+        if passed > phases_passed:
+            for phase in API_READINESS_PHASES[phases_passed:passed]:
+                readiness['phase_durations'][phase] = round(now - phase_start, 2)
+                phase_start = now
+            phases_passed = passed
+            interval = min_interval
         else:
-            status_poll_count += 1
-            time.sleep(sleep_time)
+            interval = min(interval * 2, max_interval)
 
-        if status_poll_count == 30:
-            return False
+        readiness['phase_reached'] = API_READINESS_PHASES[phases_passed - 1] if phases_passed else None
+        readiness['error'] = error
+        readiness['total_wait'] = round(now - start_time, 2)
+
+        if phases_passed == len(API_READINESS_PHASES):
+            return True, readiness
+        if now - start_time + interval > max_wait:
+            return False, readiness
+        time.sleep(interval)
+
+
+def api_timeout_msg(readiness):
+    if readiness['phase_reached'] == 'http_ok':
+        return 'Failed to deploy OVA, NSX Manager is up but the API is not working: {}'.format(readiness['error'])
+    return 'Failed to deploy OVA, timed out waiting for the API to become available, last phase reached was {}: ' \
+           '{}'.format(readiness['phase_reached'], readiness['error'])
 
 
 def find_virtual_machine(content, searched_vm_name):
@@ -88,6 +160,255 @@ def connect_to_api(vchost, vc_user, vc_pwd):
     return service_instance.RetrieveContent()
 
 
+def get_cluster_resource_pool(content, datacenter_name, cluster_name):
+    datacenter = None
+    for dc in get_all_objs(content, [vim.Datacenter]):
+        if dc.name == datacenter_name:
+            datacenter = dc
+            break
+    if not datacenter:
+        return None, None
+    for cluster in get_all_objs(content, [vim.ClusterComputeResource]):
+        if cluster.name == cluster_name:
+            return datacenter, cluster.resourcePool
+    return datacenter, None
+
+
+def find_datastore(content, datastore_name):
+    for datastore in get_all_objs(content, [vim.Datastore]):
+        if datastore.name == datastore_name:
+            return datastore
+    return None
+
+
+def find_network(content, network_name):
+    for network in get_all_objs(content, [vim.Network]):
+        if network.name == network_name:
+            return network
+    return None
+
+
+def read_ova_descriptor(ova_file):
+    with tarfile.open(ova_file) as ova:
+        for member in ova.getmembers():
+            if member.name.endswith('.ovf'):
+                return ova.extractfile(member).read()
+    return None
+
+
+def get_ova_mgmt_net_name(ovf_descriptor):
+    network_section = ElementTree.fromstring(ovf_descriptor).find('{}NetworkSection'.format(OVF_NS))
+    if network_section is None:
+        return None
+    for network in network_section.findall('{}Network'.format(OVF_NS)):
+        return network.get('{}name'.format(OVF_NS))
+
+
+def get_ova_disk_members(ova_file):
+    with tarfile.open(ova_file) as ova:
+        return dict((member.name, member.size) for member in ova.getmembers() if member.name.endswith('.vmdk'))
+
+
+class OvaMemberReader(object):
+    """
+    File like object streaming a single member out of the OVA tar. The member is never read into memory as a whole,
+    and the bytes handed out are added to the shared progress counter
+    """
+    def __init__(self, ova_file, member_name, progress):
+        self._ova = tarfile.open(ova_file)
+        self._member = self._ova.extractfile(member_name)
+        self._size = self._ova.getmember(member_name).size
+        self._progress = progress
+
+    def __len__(self):
+        return self._size
+
+    def read(self, size=UPLOAD_CHUNK_SIZE):
+        chunk = self._member.read(min(size, UPLOAD_CHUNK_SIZE))
+        self._progress.add(len(chunk))
+        return chunk
+
+    def close(self):
+        self._member.close()
+        self._ova.close()
+
+
+class UploadProgress(object):
+    def __init__(self, total_bytes):
+        self.total_bytes = total_bytes
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, sent):
+        with self._lock:
+            self.sent_bytes += sent
+
+    def percent(self):
+        if not self.total_bytes:
+            return 100
+        return min(int(self.sent_bytes * 100 / self.total_bytes), 100)
+
+
+def upload_disk(upload_url, ova_file, member_name, progress):
+    """
+    Streams one disk of the OVA to an NFC device url. This only needs an URL accepting a POST of the raw stream
+    optimized vmdk, so it can be pointed at a local HTTP server as well as at an ESXi host
+    :return: A tuple of the member name and the HTTP status code returned by the NFC endpoint
+    """
+    disk_stream = OvaMemberReader(ova_file, member_name, progress)
+    try:
+        response = requests.post(upload_url, data=disk_stream, verify=False,
+                                 headers={'Content-Type': 'application/x-vnd.vmware-streamVmdk',
+                                          'Content-Length': str(len(disk_stream))})
+    finally:
+        disk_stream.close()
+    return member_name, response.status_code
+
+
+def upload_disks(uploads, ova_file, progress, upload_threads):
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(min(upload_threads, len(uploads)) or 1)
+    try:
+        return pool.map(lambda upload: upload_disk(upload[0], ova_file, upload[1], progress), uploads)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def wait_for_lease(lease, sleep_time=2, max_polls=300):
+    status_poll_count = 0
+    while status_poll_count < max_polls:
+        if lease.state == vim.HttpNfcLease.State.ready:
+            return True
+        elif lease.state == vim.HttpNfcLease.State.error:
+            return False
+        status_poll_count += 1
+        time.sleep(sleep_time)
+    return False
+
+
+def report_lease_progress(lease, progress, done_event, interval=5):
+    # Reporting progress also keeps the lease from timing out during long uploads
+    while not done_event.wait(interval):
+        try:
+            lease.HttpNfcLeaseProgress(progress.percent())
+        except vmodl.MethodFault:
+            return
+
+
+def deploy_ova_native(module, content, ova_file):
+    """
+    Deploys the OVA through ImportVApp and a HttpNfcLease using the existing pyVmomi connection instead of ovftool
+    :return: A dictionary with the upload results and lease progress information
+    """
+    datacenter, resource_pool = get_cluster_resource_pool(content, module.params['datacenter'],
+                                                          module.params['cluster'])
+    if not resource_pool:
+        module.fail_json(msg='Could not find the cluster {} in datacenter {}'.format(module.params['cluster'],
+                                                                                   module.params['datacenter']))
+    datastore = find_datastore(content, module.params['datastore'])
+    if not datastore:
+        module.fail_json(msg='Could not find the datastore {}'.format(module.params['datastore']))
+    network = find_network(content, module.params['portgroup'])
+    if not network:
+        module.fail_json(msg='Could not find the portgroup {}'.format(module.params['portgroup']))
+
+    ovf_descriptor = read_ova_descriptor(ova_file)
+    if not ovf_descriptor:
+        module.fail_json(msg='Failed to read the OVF descriptor from {}'.format(ova_file))
+
+    ova_properties = {'vsm_hostname': module.params['hostname'],
+                      'vsm_dns1_0': module.params['dns_server'],
+                      'vsm_domain_0': module.params['dns_domain'],
+                      'vsm_ntp_0': module.params['ntp_server'],
+                      'vsm_gateway_0': module.params['gateway'],
+                      'vsm_ip_0': module.params['ip_address'],
+                      'vsm_netmask_0': module.params['netmask'],
+                      'vsm_cli_passwd_0': module.params['admin_password'],
+                      'vsm_cli_en_passwd_0': module.params['enable_password']}
+
+    import_spec_params = vim.OvfManager.CreateImportSpecParams()
+    import_spec_params.entityName = module.params['vmname']
+    import_spec_params.diskProvisioning = module.params['disk_mode']
+    import_spec_params.propertyMapping = [vim.KeyValue(key=key, value=value) for key, value in ova_properties.items()]
+    import_spec_params.networkMapping = [vim.OvfManager.NetworkMapping(name=get_ova_mgmt_net_name(ovf_descriptor),
+                                                                       network=network)]
+
+    import_spec = content.ovfManager.CreateImportSpec(ovf_descriptor, resource_pool, datastore, import_spec_params)
+    if import_spec.error:
+        module.fail_json(msg='Failed to create the import spec: {}'.format(
+            ', '.join([error.msg for error in import_spec.error])))
+
+    lease = resource_pool.ImportVApp(import_spec.importSpec, datacenter.vmFolder)
+    if not wait_for_lease(lease):
+        module.fail_json(msg='Failed to deploy OVA, the import lease did not become ready: {}'.format(lease.error))
+
+    disk_members = get_ova_disk_members(ova_file)
+    file_items = dict((file_item.deviceId, file_item.path) for file_item in import_spec.fileItem)
+    uploads = []
+    for device_url in lease.info.deviceUrl:
+        member_name = file_items.get(device_url.importKey)
+        if member_name not in disk_members:
+            continue
+        uploads.append((device_url.url.replace('*', module.params['vcenter']), member_name))
+
+    progress = UploadProgress(sum([disk_members[member_name] for _, member_name in uploads]))
+    upload_done = threading.Event()
+    progress_reporter = threading.Thread(target=report_lease_progress, args=(lease, progress, upload_done))
+    progress_reporter.daemon = True
+    progress_reporter.start()
+
+    try:
+        upload_results = upload_disks(uploads, ova_file, progress, module.params['upload_threads'])
+    except Exception as upload_error:
+        upload_done.set()
+        lease.HttpNfcLeaseAbort()
+        module.fail_json(msg='Failed to deploy OVA, disk upload failed: {}'.format(upload_error))
+    upload_done.set()
+
+    failed_uploads = [member_name for member_name, status in upload_results if status not in [200, 201]]
+    if failed_uploads:
+        lease.HttpNfcLeaseAbort()
+        module.fail_json(msg='Failed to deploy OVA, the upload of {} failed'.format(', '.join(failed_uploads)),
+                         upload_results=upload_results)
+
+    lease.HttpNfcLeaseProgress(100)
+    lease.HttpNfcLeaseComplete()
+
+    nsx_manager_vm = find_virtual_machine(content, module.params['vmname'])
+    nsx_manager_vm.PowerOnVM_Task()
+
+    return {'upload_results': upload_results, 'uploaded_bytes': progress.sent_bytes,
+            'lease_progress': progress.percent()}
+
+
+def start_ovftool(module, command):
+    """
+    Starts ovftool in its own session, so it keeps running after the module returned. Its output goes to a log file,
+    and its exit code to the same file name with '.rc' appended
+    :return: The job for the nsx_job_status module
+    """
+    import os
+    import subprocess
+    import tempfile
+
+    job_dir = module.params['job_dir'] or os.path.join(tempfile.gettempdir(), 'nsx-jobs')
+    if not os.path.isdir(job_dir):
+        os.makedirs(job_dir)
+    log_fd, log_file = tempfile.mkstemp(prefix='ovftool-{}-'.format(module.params['vmname']), suffix='.log',
+                                        dir=job_dir)
+    os.close(log_fd)
+    devnull = open(os.devnull, 'r+')
+    try:
+        process = subprocess.Popen(['/bin/sh', '-c', '"$@" > "$0" 2>&1; echo $? > "$0.rc"', log_file] + command,
+                                   stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True,
+                                   preexec_fn=os.setsid)
+    finally:
+        devnull.close()
+    return {'type': 'ovftool', 'id': process.pid, 'log': log_file, 'ip_address': module.params['ip_address']}
+
+
 def check_ova_mgmt_net_name(ova_details):
     _,_,rest = ova_details.partition('Networks:\n')
     result,_,_ = rest.partition('Virtual Machines:\n')
@@ -101,7 +422,11 @@ def check_ova_mgmt_net_name(ova_details):
 def main():
     module = AnsibleModule(
         argument_spec=dict(
-            ovftool_path=dict(required=True, type='str'),
+            ovftool_path=dict(type='str'),
+            deploy_engine=dict(default='ovftool', choices=['ovftool', 'pyvmomi']),
+            upload_threads=dict(default=4, type='int'),
+            async_job=dict(default=False, type='bool'),
+            job_dir=dict(type='str'),
             datacenter=dict(required=True, type='str'),
             datastore=dict(required=True, type='str'),
             portgroup=dict(required=True, type='str'),
@@ -150,6 +475,19 @@ def main():
     if module.check_mode:
         module.exit_json(changed=True)
 
+    if module.params['deploy_engine'] == 'pyvmomi':
+        if module.params['async_job']:
+            module.fail_json(msg='async_job is only supported with the ovftool deploy engine')
+        ova_file = '{}/{}'.format(module.params['path_to_ova'], module.params['ova_file'])
+        deploy_result = deploy_ova_native(module, content, ova_file)
+        api_ready, api_readiness = wait_for_api(module)
+        if not api_ready:
+            module.fail_json(msg=api_timeout_msg(api_readiness), api_readiness=api_readiness)
+        module.exit_json(changed=True, deploy_result=deploy_result, api_readiness=api_readiness)
+
+    if not module.params['ovftool_path']:
+        module.fail_json(msg='ovftool_path is required when using the ovftool deploy engine')
+
     ovftool_exec = '{}/ovftool'.format(module.params['ovftool_path'])
     ova_file = '{}/{}'.format(module.params['path_to_ova'], module.params['ova_file'])
     vi_string = 'vi://{}:{}@{}/{}/host/{}/'.format(module.params['vcenter_user'],
@@ -161,31 +499,37 @@ def main():
         module.fail_json(msg='Failed to read OVA properties, error message from ovftool is: {}'.format(ova_tool_result[1]))
     mgmt_net_name = check_ova_mgmt_net_name(ova_tool_result[1])
 
-    ova_tool_result = module.run_command([ovftool_exec, '--acceptAllEulas', '--skipManifestCheck',
-                                          '--powerOn', '--noSSLVerify', '--allowExtraConfig',
-                                          '--diskMode={}'.format(module.params['disk_mode']),
-                                          '--datastore={}'.format(module.params['datastore']),
-                                          '--net:{}={}'.format(mgmt_net_name, module.params['portgroup']),
-                                          '--name={}'.format(module.params['vmname']),
-                                          '--prop:vsm_hostname={}'.format(module.params['hostname']),
-                                          '--prop:vsm_dns1_0={}'.format(module.params['dns_server']),
-                                          '--prop:vsm_domain_0={}'.format(module.params['dns_domain']),
-                                          '--prop:vsm_ntp_0={}'.format(module.params['ntp_server']),
-                                          '--prop:vsm_gateway_0={}'.format(module.params['gateway']),
-                                          '--prop:vsm_ip_0={}'.format(module.params['ip_address']),
-                                          '--prop:vsm_netmask_0={}'.format(module.params['netmask']),
-                                          '--prop:vsm_cli_passwd_0={}'.format(module.params['admin_password']),
-                                          '--prop:vsm_cli_en_passwd_0={}'.format(module.params['enable_password']),
-                                          ova_file, vi_string])
-
+    ovftool_command = [ovftool_exec, '--acceptAllEulas', '--skipManifestCheck',
+                       '--powerOn', '--noSSLVerify', '--allowExtraConfig',
+                       '--diskMode={}'.format(module.params['disk_mode']),
+                       '--datastore={}'.format(module.params['datastore']),
+                       '--net:{}={}'.format(mgmt_net_name, module.params['portgroup']),
+                       '--name={}'.format(module.params['vmname']),
+                       '--prop:vsm_hostname={}'.format(module.params['hostname']),
+                       '--prop:vsm_dns1_0={}'.format(module.params['dns_server']),
+                       '--prop:vsm_domain_0={}'.format(module.params['dns_domain']),
+                       '--prop:vsm_ntp_0={}'.format(module.params['ntp_server']),
+                       '--prop:vsm_gateway_0={}'.format(module.params['gateway']),
+                       '--prop:vsm_ip_0={}'.format(module.params['ip_address']),
+                       '--prop:vsm_netmask_0={}'.format(module.params['netmask']),
+                       '--prop:vsm_cli_passwd_0={}'.format(module.params['admin_password']),
+                       '--prop:vsm_cli_en_passwd_0={}'.format(module.params['enable_password']),
+                       ova_file, vi_string]
+
+    if module.params['async_job']:
+        module.exit_json(changed=True, jobs=[start_ovftool(module, ovftool_command)])
+
+    ova_tool_result = module.run_command(ovftool_command)
     if ova_tool_result[0] != 0:
         module.fail_json(msg='Failed to deploy OVA, error message from ovftool is: {}'.format(ova_tool_result[1]))
-    if not wait_for_api(module):
-        module.fail_json(msg='Failed to deploy OVA, timed out waiting for the API to become available')
+    api_ready, api_readiness = wait_for_api(module)
+    if not api_ready:
+        module.fail_json(msg=api_timeout_msg(api_readiness), api_readiness=api_readiness)
 
-    module.exit_json(changed=True, ova_tool_result=ova_tool_result)
+    module.exit_json(changed=True, ova_tool_result=ova_tool_result, api_readiness=api_readiness)
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -17,39 +17,42 @@
 # CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
-def get_logical_switch(client_session, logical_switch_name):
+def get_logical_switch(client_session, logical_switch_name, nsx_facts=None):
     """
     :param client_session: An instance of an NsxClient Session
     :param logical_switch_name: The name of the logical switch searched
+    :param nsx_facts: Optional facts gathered by the nsx_facts module, used to resolve the name without API calls
     :return: A tuple, with the first item being the logical switch id as string of the first Scope found with the
              right name and the second item being a dictionary of the logical parameters as return by the NSX API
     """
-    all_lswitches = client_session.read_all_pages('logicalSwitchesGlobal', 'read')
-    try:
-        logical_switch_params = [scope for scope in all_lswitches if scope['name'] == logical_switch_name][0]
-        logical_switch_id = logical_switch_params['objectId']
-    except IndexError:
+    lswitch_facts = fact_record(client_session, nsx_facts, 'logical_switches', logical_switch_name)
+    if lswitch_facts:
+        return lswitch_facts['id']
+
+    logical_switch = inventory_index(client_session, 'logicalSwitchesGlobal').by_name(logical_switch_name)
+    if not logical_switch:
         return None
 
-    return logical_switch_id
+    return logical_switch.object_id
 
 
-def get_dlr(client_session, dlr_name):
+def get_dlr(client_session, dlr_name, nsx_facts=None):
     """
     :param client_session: An instance of an NsxClient Session
     :param dlr_name: The name of the edge searched
+    :param nsx_facts: Optional facts gathered by the nsx_facts module, used to resolve the name without API calls
     :return: A tuple, with the first item being the edge or dlr id as string of the first Scope found with the
-             right name and the second item being a dictionary of the logical parameters as return by the NSX API
+             right name and the second item being a dictionary with the objectId and name of the edge
     """
-    all_edge = client_session.read_all_pages('nsxEdges', 'read')
+    edge_facts = fact_record(client_session, nsx_facts, 'edges', dlr_name)
+    if edge_facts:
+        return edge_facts['id'], edge_facts
 
-    try:
-        edge_params = [scope for scope in all_edge if scope['name'] == dlr_name][0]
-        edge_id = edge_params['objectId']
-    except IndexError:
+    edge_params = find_record(client_session, 'nsxEdges', 'name', dlr_name)
+    if not edge_params:
         return None, None
 
-    return edge_id, edge_params
+    return edge_params['objectId'], edge_params
 
 
 def delete_dlr(client_session, dlr_id, module):
@@ -80,7 +83,7 @@ def create_dlr(client_session, module):
         if 'portgroup_id' in iface:
             connected_to = iface['portgroup_id']
         elif 'logical_switch' in iface:
-            lswitch_id = get_logical_switch(client_session, iface['logical_switch'])
+            lswitch_id = get_logical_switch(client_session, iface['logical_switch'], module.params['nsx_facts'])
             connected_to = lswitch_id
         initial_intf.append({'name': iface_key, 'type': iface['iftype'], 'isConnected': "True",
                              'connectedToId': connected_to,
@@ -307,7 +310,7 @@ def check_interfaces(client_session, dlr_id, module):
                     intf['connectedToId'] = ifaces[idx]['portgroup_id']
                     intf_changed = True
         elif 'logical_switch' in ifaces[idx]:
-            lswitch_id = get_logical_switch(client_session, ifaces[idx]['logical_switch'])
+            lswitch_id = get_logical_switch(client_session, ifaces[idx]['logical_switch'], module.params['nsx_facts'])
             if not 'connectedToId' in intf:
                 intf['connectedToId'] = lswitch_id
                 intf_changed = True
@@ -343,7 +346,7 @@ def check_interfaces(client_session, dlr_id, module):
             if 'portgroup_id' in iface:
                 connected_to = iface['portgroup_id']
             elif 'logical_switch' in iface:
-                lswitch_id = get_logical_switch(client_session, iface['logical_switch'])
+                lswitch_id = get_logical_switch(client_session, iface['logical_switch'], module.params['nsx_facts'])
                 connected_to = lswitch_id
             add_if = {'name': iface_key, 'type': iface['iftype'], 'isConnected': "True",
                       'connectedToId': connected_to,
@@ -374,6 +377,7 @@ def main():
         argument_spec=dict(
             state=dict(default='present', choices=['present', 'absent']),
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            nsx_facts=dict(type='dict'),
             name=dict(required=True),
             description=dict(),
             resourcepool_moid=dict(required=True),
@@ -393,11 +397,8 @@ def main():
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
-    client_session=NsxClient(module.params['nsxmanager_spec']['raml_file'],
-                             module.params['nsxmanager_spec']['host'],
-                             module.params['nsxmanager_spec']['user'],
-                             module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    client_session=get_nsx_client(module)
 
     if module.params['remote_access'] == 'true' and not (module.params['password'] and module.params['username']):
         module.fail_json(msg='if remote access is enabled, username and password must be set')
@@ -408,12 +409,12 @@ def main():
     dlr_id = None
 
     if module.params['state'] == 'present':
-        dlr_id, dlr_params = get_dlr(client_session, module.params['name'])
+        dlr_id, dlr_params = get_dlr(client_session, module.params['name'], module.params['nsx_facts'])
         if not dlr_id:
             dlr_id, dlr_params = create_dlr(client_session, module)
             changed = True
     elif module.params['state'] == 'absent':
-        dlr_id, dlr_params = get_dlr(client_session, module.params['name'])
+        dlr_id, dlr_params = get_dlr(client_session, module.params['name'], module.params['nsx_facts'])
         if dlr_id:
             dlr_delete_response = delete_dlr(client_session, dlr_id, module)
             module.exit_json(changed=True, dlr_create_response=dlr_create_response,
@@ -456,5 +457,7 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import fact_record, find_record, inventory_index
+from ansible.module_utils.nsx_profile import profiled
 if __name__ == '__main__':
-    main()
+    profiled(main)()
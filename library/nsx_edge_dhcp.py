@@ -29,26 +29,27 @@
 
 __author__ = 'virtualelephant'
 
-def get_edge(client_session, edge_name):
+def get_edge(client_session, edge_name, nsx_facts=None):
     """
     :param client session: An instance of an NsxClient Session
     :param edge_name: The name of the edge searched
+    :param nsx_facts: Optional facts gathered by the nsx_facts module, used to resolve the name without API calls
     :return: A tuple, with the first item being the edge or dlr id as string of the first Scope found with the
-             right name and the second item being a dictionary of the logical parameters as return by the NSX API
+             right name and the second item being a dictionary with the objectId and name of the edge
     """
-    all_edge = client_session.read_all_pages('nsxEdges', 'read')
+    edge_facts = fact_record(client_session, nsx_facts, 'edges', edge_name)
+    if edge_facts:
+        return edge_facts['id'], edge_facts
 
-    try:
-        edge_params = [scope for scope in all_edge if scope['name'] == edge_name][0]
-        edge_id = edge_params['objectId']
-    except IndexError:
+    edge_params = find_record(client_session, 'nsxEdges', 'name', edge_name)
+    if not edge_params:
         return None, None
 
-    return edge_id, edge_params
+    return edge_params['objectId'], edge_params
 
 
 def add_dhcp_pool(client_session, edge_name, ip_range, default_gateway, subnet, domain_name,
-                  dns_server_1, dns_server_2, lease_time, auto_dns, next_server, bootfile):
+                  dns_server_1, dns_server_2, lease_time, auto_dns, next_server, bootfile, nsx_facts=None):
     """
     :param client_session: An instance of an NsxClient session
     :param edge_name: The name of the edge searched
@@ -64,7 +65,7 @@ def add_dhcp_pool(client_session, edge_name, ip_range, default_gateway, subnet,
     :param bootfile: File to be downloaded from TFTP server (option 67)
     :return: Returns true or false
     """
-    edge_id, edge_params = get_edge(client_session, edge_name)
+    edge_id, edge_params = get_edge(client_session, edge_name, nsx_facts)
 
     if not edge_id:
         return None
@@ -89,7 +90,7 @@ def add_dhcp_pool(client_session, edge_name, ip_range, default_gateway, subnet,
         return False
 
 
-def dhcp_server(client_session, edge_name, dhcp_enabled, syslog_enabled, syslog_level):
+def dhcp_server(client_session, edge_name, dhcp_enabled, syslog_enabled, syslog_level, nsx_facts=None):
     """
     :param client_session: An instance of an NsxClient session
     :param edge_name: The name of the edge searched
@@ -97,7 +98,7 @@ def dhcp_server(client_session, edge_name, dhcp_enabled, syslog_enabled, syslog_
     :param syslog_level: The verbosity level of syslog, if enabled.
     :return: Returns true or false
     """
-    edge_id, edge_params = get_edge(client_session, edge_name)
+    edge_id, edge_params = get_edge(client_session, edge_name, nsx_facts)
 
     if not edge_id:
         return None
@@ -136,6 +137,7 @@ def main():
     module = AnsibleModule(
             argument_spec=dict(
                 nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+                nsx_facts=dict(type='dict'),
                 name=dict(required=True),
                 mode=dict(required=True, choices=['create_pool','enable_service']),
                 ip_range=dict(),
@@ -155,19 +157,16 @@ def main():
             supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
-    client_session = NsxClient(module.params['nsxmanager_spec']['raml_file'],
-                               module.params['nsxmanager_spec']['host'],
-                               module.params['nsxmanager_spec']['user'],
-                               module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    client_session = get_nsx_client(module)
 
     changed = False
-    edge_id, edge_params = get_edge(client_session, module.params['name'])
+    edge_id, edge_params = get_edge(client_session, module.params['name'], module.params['nsx_facts'])
 
     if module.params['mode'] == 'create_pool':
-        changed =  add_dhcp_pool(client_session, module.params['name'], module.params['ip_range'], module.params['default_gateway'], module.params['subnet'], module.params['domain_name'], module.params['dns_server_1'], module.params['dns_server_2'], module.params['lease_time'], module.params['auto_dns'], module.params['next_server'], module.params['bootfile'])
+        changed =  add_dhcp_pool(client_session, module.params['name'], module.params['ip_range'], module.params['default_gateway'], module.params['subnet'], module.params['domain_name'], module.params['dns_server_1'], module.params['dns_server_2'], module.params['lease_time'], module.params['auto_dns'], module.params['next_server'], module.params['bootfile'], module.params['nsx_facts'])
     elif module.params['mode'] == 'enable_service':
-        changed = dhcp_service(client_session, module.params['name'], module.params['dhcp_enabled'], module.params['syslog_enabled'], module.params['syslog_level'])
+        changed = dhcp_service(client_session, module.params['name'], module.params['dhcp_enabled'], module.params['syslog_enabled'], module.params['syslog_level'], module.params['nsx_facts'])
     
     if changed:
         module.exit_json(changed=True)
@@ -176,5 +175,7 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import fact_record, find_record
+from ansible.module_utils.nsx_profile import profiled
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -4,22 +4,23 @@
 __author__ = 'virtualelephant'
 
 # From the vmware/nsxansible/nsx_edge_router.py Ansible library
-def get_edge(client_session, edge_name):
+def get_edge(client_session, edge_name, nsx_facts=None):
     """
     :param client session: An instance of an NsxClient Session
     :param edge_name: The name of the edge searched
+    :param nsx_facts: Optional facts gathered by the nsx_facts module, used to resolve the name without API calls
     :return: A tuple, with the first item being the edge or dlr id as string of the first Scope found with the
-             right name and the second item being a dictionary of the logical parameters as return by the NSX API
+             right name and the second item being a dictionary with the objectId and name of the edge
     """
-    all_edge = client_session.read_all_pages('nsxEdges', 'read')
+    edge_facts = fact_record(client_session, nsx_facts, 'edges', edge_name)
+    if edge_facts:
+        return edge_facts['id'], edge_facts
 
-    try:
-        edge_params = [scope for scope in all_edge if scope['name'] == edge_name][0]
-        edge_id = edge_params['objectId']
-    except IndexError:
+    edge_params = find_record(client_session, 'nsxEdges', 'name', edge_name)
+    if not edge_params:
         return None, None
 
-    return edge_id, edge_params
+    return edge_params['objectId'], edge_params
 
 
 def create_nat_rule(client_session, module):
@@ -40,7 +41,7 @@ def create_nat_rule(client_session, module):
     :param description: user-generated description field
     :return: Returns true or false.
     """
-    edge_id, edge_params = get_edge(client_session, module.params['name'])
+    edge_id, edge_params = get_edge(client_session, module.params['name'], module.params['nsx_facts'])
 
     nat_rule_dict = {}
     nat_rule_dict['natRules'] = create_init_nat_rules(client_session, module)
@@ -102,7 +103,7 @@ def params_check_nat_rules(module):
         rule_type = nat_rule.get('rule_type', None)
 
 def append_nat_rules(client_session, edge_name, nat_enabled, loggingEnabled, rule_type, vnic, originalAddress, translatedAddress,
-                    matchAddress, protocol, icmpType, originalPort, translatedPort, matchPort, ruleTag, description):
+                    matchAddress, protocol, icmpType, originalPort, translatedPort, matchPort, ruleTag, description, nsx_facts=None):
     """
     :param enabled: Enable rule. Boolean. Default is true.
     :param loggingEnabled: Enable logging. Default is false.
@@ -120,7 +121,7 @@ def append_nat_rules(client_session, edge_name, nat_enabled, loggingEnabled, rul
     :param description: user-generated description field
     :return: Returns true or false.
     """
-    edge_id, edge_params = get_edge(client_session, edge_name)
+    edge_id, edge_params = get_edge(client_session, edge_name, nsx_facts)
 
     if rule_type == 'snat':
         nat_rule_dict = { 'natRule':
@@ -154,14 +155,14 @@ def append_nat_rules(client_session, edge_name, nat_enabled, loggingEnabled, rul
     else:
         return False
 
-def delete_nat_rule(client_session, edge_name, ruleId):
+def delete_nat_rule(client_session, edge_name, ruleId, nsx_facts=None):
     """
     :param client_session:
     :param edge_name: Name of the Edge to modify
     :param ruleId: Specific ruleId to delete
     :return: Returns true or false
     """
-    edge_id, edge_params = get_edge(client_session, edge_name)
+    edge_id, edge_params = get_edge(client_session, edge_name, nsx_facts)
 
     cfg_result = client_session.delete('edgeNatRule', uri_parameters={'edgeId': edge_id, 'ruleID': ruleId})
 
@@ -175,6 +176,7 @@ def main():
             argument_spec=dict(
                 state=dict(default='present', choices=['present', 'absent']),
                 nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+                nsx_facts=dict(type='dict'),
                 name=dict(required=True),
                 mode=dict(required=True, choices=['create', 'delete', 'append']),
                 nat_enabled=dict(default='true'),
@@ -199,14 +201,11 @@ def main():
             supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
-    client_session = NsxClient(module.params['nsxmanager_spec']['raml_file'],
-                               module.params['nsxmanager_spec']['host'],
-                               module.params['nsxmanager_spec']['user'],
-                               module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    client_session = get_nsx_client(module)
 
     changed = False
-    edge_id, edge_params = get_edge(client_session, module.params['name'])
+    edge_id, edge_params = get_edge(client_session, module.params['name'], module.params['nsx_facts'])
 
     if module.params['mode'] == 'create':
         if module.params['rules'] is not None:
@@ -214,7 +213,8 @@ def main():
         else:
                 changed = False
     elif module.params['mode'] == 'delete':
-        changed = delete_nat_rule(client_session, module.params['name'], module.params['ruleId'])
+        changed = delete_nat_rule(client_session, module.params['name'], module.params['ruleId'],
+                                  module.params['nsx_facts'])
     elif module.params['mode'] == 'append':
         if module.params['rule_type'] == 'snat':
             changed = append_nat_rules(client_session, module.params['name'], module.params['nat_enabled'],
@@ -223,7 +223,7 @@ def main():
                                    module.params['snatMatchDestinationAddress'], module.params['protocol'],
                                    module.params['icmpType'], module.params['originalPort'], module.params['translatedPort'],
                                    module.params['snatMatchDestinationPort'], module.params['ruleTag'],
-                                   module.params['description']
+                                   module.params['description'], module.params['nsx_facts']
                                   )
         if module.params['rule_type'] == 'dnat':
             changed = append_nat_rules(client_session, module.params['name'], module.params['nat_enabled'],
@@ -232,7 +232,7 @@ def main():
                                    module.params['dnatMatchSourceAddress'], module.params['protocol'],
                                    module.params['icmpType'], module.params['originalPort'], module.params['translatedPort'],
                                    module.params['dnatMatchSourcePort'], module.params['ruleTag'],
-                                   module.params['description']
+                                   module.params['description'], module.params['nsx_facts']
                                   )
     else:
         changed = False
@@ -244,5 +244,7 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import fact_record, find_record
+from ansible.module_utils.nsx_profile import profiled
 if __name__ == '__main__':
-    main()
+    profiled(main)()
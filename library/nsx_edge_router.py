@@ -18,39 +18,42 @@
 # IN THE SOFTWARE.
 
 
-def get_logical_switch(client_session, logical_switch_name):
+def get_logical_switch(client_session, logical_switch_name, nsx_facts=None):
     """
     :param client_session: An instance of an NsxClient Session
     :param logical_switch_name: The name of the logical switch searched
+    :param nsx_facts: Optional facts gathered by the nsx_facts module, used to resolve the name without API calls
     :return: A tuple, with the first item being the logical switch id as string of the first Scope found with the
              right name and the second item being a dictionary of the logical parameters as return by the NSX API
     """
-    all_lswitches = client_session.read_all_pages('logicalSwitchesGlobal', 'read')
-    try:
-        logical_switch_params = [scope for scope in all_lswitches if scope['name'] == logical_switch_name][0]
-        logical_switch_id = logical_switch_params['objectId']
-    except IndexError:
+    lswitch_facts = fact_record(client_session, nsx_facts, 'logical_switches', logical_switch_name)
+    if lswitch_facts:
+        return lswitch_facts['id']
+
+    logical_switch = inventory_index(client_session, 'logicalSwitchesGlobal').by_name(logical_switch_name)
+    if not logical_switch:
         return None
 
-    return logical_switch_id
+    return logical_switch.object_id
 
 
-def get_edge(client_session, edge_name):
+def get_edge(client_session, edge_name, nsx_facts=None):
     """
     :param client_session: An instance of an NsxClient Session
     :param edge_name: The name of the edge searched
+    :param nsx_facts: Optional facts gathered by the nsx_facts module, used to resolve the name without API calls
     :return: A tuple, with the first item being the edge or dlr id as string of the first Scope found with the
-             right name and the second item being a dictionary of the logical parameters as return by the NSX API
+             right name and the second item being a dictionary with the objectId and name of the edge
     """
-    all_edge = client_session.read_all_pages('nsxEdges', 'read')
+    edge_facts = fact_record(client_session, nsx_facts, 'edges', edge_name)
+    if edge_facts:
+        return edge_facts['id'], edge_facts
 
-    try:
-        edge_params = [scope for scope in all_edge if scope['name'] == edge_name][0]
-        edge_id = edge_params['objectId']
-    except IndexError:
+    edge_params = find_record(client_session, 'nsxEdges', 'name', edge_name)
+    if not edge_params:
         return None, None
 
-    return edge_id, edge_params
+    return edge_params['objectId'], edge_params
 
 
 def create_edge_service_gateway(client_session, module):
@@ -107,7 +110,7 @@ def create_init_ifaces(client_session, module):
         if 'portgroup_id' in iface:
             portgroup_id = iface['portgroup_id']
         elif 'logical_switch' in iface:
-            lswitch_id = get_logical_switch(client_session, iface['logical_switch'])
+            lswitch_id = get_logical_switch(client_session, iface['logical_switch'], module.params['nsx_facts'])
             portgroup_id = lswitch_id
 
         fence_param = None
@@ -263,7 +266,7 @@ def check_interfaces(client_session, esg_id, module):
                     vnic['portgroupId'] = ifaces[idx]['portgroup_id']
                     vnic_changed = True
         elif 'logical_switch' in ifaces[idx]:
-            lswitch_id = get_logical_switch(client_session, ifaces[idx]['logical_switch'])
+            lswitch_id = get_logical_switch(client_session, ifaces[idx]['logical_switch'], module.params['nsx_facts'])
             if not 'portgroupId' in vnic:
                 vnic['portgroupId'] = lswitch_id
                 vnic_changed = True
@@ -372,6 +375,7 @@ def main():
         argument_spec=dict(
             state=dict(default='present', choices=['present', 'absent']),
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            nsx_facts=dict(type='dict'),
             name=dict(required=True),
             description=dict(),
             appliance_size=dict(default='large', choices=['compact', 'large', 'xlarge', 'quadlarge']),
@@ -395,15 +399,12 @@ def main():
     if module.params['remote_access'] == 'true' and not (module.params['password'] and module.params['username']):
         module.fail_json(msg='if remote access is enabled, username and password must be set')
 
-    from nsxramlclient.client import NsxClient
-    client_session = NsxClient(module.params['nsxmanager_spec']['raml_file'],
-                               module.params['nsxmanager_spec']['host'],
-                               module.params['nsxmanager_spec']['user'],
-                               module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    client_session = get_nsx_client(module)
     changed = False
     esg_create_response = {}
     esg_delete_response = {}
-    edge_id, edge_params = get_edge(client_session, module.params['name'])
+    edge_id, edge_params = get_edge(client_session, module.params['name'], module.params['nsx_facts'])
 
     if module.params['state'] == 'present':
         if not edge_id:
@@ -460,5 +461,7 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import fact_record, find_record, inventory_index
+from ansible.module_utils.nsx_profile import profiled
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright © 2015 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import time
+from multiprocessing.pool import ThreadPool
+
+
+def index_by_name(items, record):
+    """
+    :param items: A list of NSX objects as returned by the NSX API
+    :param record: A function returning the compact fact record of an object
+    :return: A dictionary of the compact records indexed by name. Like the lookups in the modules, the first object
+             found with a name wins
+    """
+    facts = {}
+    for item in items:
+        facts.setdefault(item['name'], record(item))
+    return facts
+
+
+def collect_edges(session):
+    return index_by_name(iter_records(session, 'nsxEdges', ('objectId', 'name', 'edgeType', 'edgeStatus')),
+                         lambda edge: {'id': edge['objectId'], 'type': edge.get('edgeType'),
+                                       'status': edge.get('edgeStatus')})
+
+
+def collect_logical_switches(session):
+    return index_by_name(iter_records(session, 'logicalSwitchesGlobal',
+                                      ('objectId', 'name', 'vdnId', 'vdnScopeId', 'controlPlaneMode')),
+                         lambda lswitch: {'id': lswitch['objectId'], 'vdn_id': lswitch.get('vdnId'),
+                                          'scope_id': lswitch.get('vdnScopeId'),
+                                          'control_plane_mode': lswitch.get('controlPlaneMode')})
+
+
+def collect_transport_zones(session):
+    vdn_scopes = session.read('vdnScopes', 'read')['body']
+    if not vdn_scopes or not vdn_scopes.get('vdnScopes'):
+        return {}
+    return index_by_name(session.normalize_list_return(vdn_scopes['vdnScopes'].get('vdnScope')),
+                         lambda scope: {'id': scope['objectId'],
+                                        'control_plane_mode': scope.get('controlPlaneMode')})
+
+
+def collect_ip_pools(session):
+    ip_pools = session.read('ipPools', uri_parameters={'scopeId': 'globalroot-0'})['body']
+    if not ip_pools or not ip_pools.get('ipamAddressPools'):
+        return {}
+    return index_by_name(session.normalize_list_return(ip_pools['ipamAddressPools'].get('ipamAddressPool')),
+                         lambda ip_pool: {'id': ip_pool['objectId']})
+
+
+def collect_controllers(session):
+    """
+    Controllers don't have unique names, so they are indexed by id
+    """
+    controllers = session.read('nsxControllers')['body']
+    if not controllers or not controllers.get('controllers'):
+        return {}
+    return dict((controller['id'], {'name': controller.get('name'), 'ip': controller.get('ipAddress'),
+                                    'status': controller.get('status')})
+                for controller in session.normalize_list_return(controllers['controllers'].get('controller')))
+
+
+FACT_COLLECTORS = {'edges': collect_edges,
+                   'logical_switches': collect_logical_switches,
+                   'transport_zones': collect_transport_zones,
+                   'ip_pools': collect_ip_pools,
+                   'controllers': collect_controllers}
+
+
+def collect_inventory(session, inventory):
+    start = time.time()
+    facts = FACT_COLLECTORS[inventory](session)
+    return inventory, facts, round(time.time() - start, 3)
+
+
+def collect_facts(session, inventories):
+    """
+    Collects all requested inventories concurrently, one thread per inventory
+    :return: A tuple with the facts dictionary and the collection duration in seconds of every inventory
+    """
+    if not inventories:
+        return {}, {}
+
+    pool = ThreadPool(max(1, len(inventories)))
+    try:
+        results = pool.map(lambda inventory: collect_inventory(session, inventory), inventories)
+    finally:
+        pool.close()
+        pool.join()
+
+    facts = dict((inventory, inventory_facts) for inventory, inventory_facts, _ in results)
+    timings = dict((inventory, seconds) for inventory, _, seconds in results)
+    return facts, timings
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            inventories=dict(default=sorted(FACT_COLLECTORS.keys()), type='list')
+        ),
+        supports_check_mode=True
+    )
+
+    from ansible.module_utils.nsx_client import get_nsx_client
+    from nsxramlclient.exceptions import NsxError
+
+    invalid_inventories = set(module.params['inventories']) - set(FACT_COLLECTORS.keys())
+    if invalid_inventories:
+        module.fail_json(msg='Invalid inventories {}, valid inventories are {}'.format(
+            sorted(invalid_inventories), sorted(FACT_COLLECTORS.keys())))
+
+    # errors are raised instead of exiting, as the inventories are collected in worker threads
+    s = get_nsx_client(module, fail_mode='raise')
+
+    try:
+        facts, timings = collect_facts(s, module.params['inventories'])
+    except NsxError as error:
+        module.fail_json(msg='Failed to collect the NSX facts: {}'.format(error))
+
+    module.exit_json(changed=False, ansible_facts={'nsx_facts': facts}, collection_seconds=timings)
+
+
+from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import iter_records
+from ansible.module_utils.nsx_profile import profiled
+
+if __name__ == '__main__':
+    profiled(main)()
@@ -17,6 +17,8 @@
 # CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
+import copy
+
 
 def get_ippool_id(session, searched_pool_name):
     try:
@@ -52,26 +54,167 @@ def update_ippool(session, pool_object_id, body_dict):
     return session.update('ipPool', uri_parameters={'poolId': pool_object_id}, request_body_dict=body_dict)
 
 
+def check_ippool_details(ippool_config, desired):
+    """
+    Compares an IP pool as returned by the NSX API with the desired pool parameters, and changes the pool
+    configuration where needed
+    :param desired: A dictionary with the name, start_ip, end_ip, prefix_length, gateway, dns_server_1 and dns_server_2
+    :return: True if the pool configuration was changed
+    """
+    change_required = False
+    for ippool_detail_key, ippool_detail_value in ippool_config['ipamAddressPool'].items():
+        if ippool_detail_key == 'ipRanges':
+            for range_detail_key, range_detail_value in \
+                    ippool_config['ipamAddressPool']['ipRanges']['ipRangeDto'].items():
+                if range_detail_key == 'startAddress' and range_detail_value != desired['start_ip']:
+                    ippool_config['ipamAddressPool']['ipRanges']['ipRangeDto']['startAddress'] = \
+                        desired['start_ip']
+                    change_required = True
+                elif range_detail_key == 'endAddress' and range_detail_value != desired['end_ip']:
+                    ippool_config['ipamAddressPool']['ipRanges']['ipRangeDto']['endAddress'] = \
+                        desired['end_ip']
+                    change_required = True
+        elif ippool_detail_key == 'gateway' and ippool_detail_value != desired['gateway']:
+            ippool_config['ipamAddressPool']['gateway'] = desired['gateway']
+            change_required = True
+        elif ippool_detail_key == 'prefixLength' and ippool_detail_value != desired['prefix_length']:
+            ippool_config['ipamAddressPool']['prefixLength'] = desired['prefix_length']
+            change_required = True
+        elif ippool_detail_key == 'name' and ippool_detail_value != desired['name']:
+            ippool_config['ipamAddressPool']['name'] = desired['name']
+            change_required = True
+        elif ippool_detail_key == 'dnsServer1' and ippool_detail_value != desired['dns_server_1']:
+            ippool_config['ipamAddressPool']['dnsServer1'] = desired['dns_server_1']
+            change_required = True
+        elif ippool_detail_key == 'dnsServer2' and ippool_detail_value != desired['dns_server_2']:
+            ippool_config['ipamAddressPool']['dnsServer2'] = desired['dns_server_2']
+            change_required = True
+    return change_required
+
+
+def ippool_spec(ippool):
+    spec = dict((key, ippool.get(key)) for key in ['name', 'start_ip', 'end_ip', 'prefix_length', 'gateway',
+                                                   'dns_server_1', 'dns_server_2'])
+    return dict((key, str(value) if value is not None else None) for key, value in spec.items())
+
+
+def new_ippool_body(session, spec):
+    new_ip_pool = session.extract_resource_body_example('ipPools', 'create')
+    new_ip_pool['ipamAddressPool']['ipRanges']['ipRangeDto']['startAddress'] = spec['start_ip']
+    new_ip_pool['ipamAddressPool']['ipRanges']['ipRangeDto']['endAddress'] = spec['end_ip']
+    new_ip_pool['ipamAddressPool']['gateway'] = spec['gateway']
+    new_ip_pool['ipamAddressPool']['prefixLength'] = spec['prefix_length']
+    new_ip_pool['ipamAddressPool']['dnsServer1'] = spec['dns_server_1']
+    new_ip_pool['ipamAddressPool']['dnsServer2'] = spec['dns_server_2']
+    new_ip_pool['ipamAddressPool']['name'] = spec['name']
+    return new_ip_pool
+
+
+def reconcile_ippool(session, inventory, ippool, default_state='present'):
+    """
+    Brings a single IP pool to the desired state. The pool details are only read if the inventory summary shows
+    that the pool might differ from the desired state
+    :param default_state: The state of IP pools without their own 'state', the state passed to the module
+    :return: A dictionary with the pool name, id and the action taken, or the NSX error that occurred
+    """
+    from nsxramlclient.exceptions import NsxError
+
+    spec = ippool_spec(ippool)
+    try:
+        current = inventory.get(spec['name'])
+
+        if ippool.get('state', default_state) == 'absent':
+            if not current:
+                return {'name': spec['name'], 'action': None, 'ippool_id': None}
+            delete_ip_pool(session, current['objectId'])
+            return {'name': spec['name'], 'action': 'delete', 'ippool_id': None}
+
+        if not current:
+            create_response = create_ip_pool(session, new_ippool_body(session, spec))
+            return {'name': spec['name'], 'action': 'create', 'ippool_id': create_response['objectId']}
+
+        summary = {'ipamAddressPool': copy.deepcopy(current)}
+        if isinstance(current.get('ipRanges'), dict) and isinstance(current['ipRanges'].get('ipRangeDto'), dict) and \
+                not check_ippool_details(summary, spec):
+            return {'name': spec['name'], 'action': None, 'ippool_id': current['objectId']}
+
+        ippool_config = get_ippool_details(session, current['objectId'])
+        if not check_ippool_details(ippool_config, spec):
+            return {'name': spec['name'], 'action': None, 'ippool_id': current['objectId']}
+
+        revision = int(ippool_config['ipamAddressPool']['revision'])
+        ippool_config['ipamAddressPool']['revision'] = str(revision + 1)
+        update_ippool(session, current['objectId'], ippool_config)
+        return {'name': spec['name'], 'action': 'update', 'ippool_id': current['objectId']}
+    except NsxError as error:
+        return {'name': spec['name'], 'action': None, 'ippool_id': None, 'error': str(error)}
+
+
+def reconcile_ippools(session, ippools, concurrency, default_state='present'):
+    """
+    Reconciles a list of IP pools against a single read of the pool inventory. Detail reads, creates, updates and
+    deletes are issued concurrently with at most 'concurrency' calls in flight
+    """
+    from multiprocessing.pool import ThreadPool
+
+    inventory = get_ippool_inventory(session)
+    pool = ThreadPool(concurrency)
+    try:
+        return pool.map(lambda ippool: reconcile_ippool(session, inventory, ippool, default_state), ippools)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
             state=dict(default='present', choices=['present', 'absent']),
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
-            name=dict(required=True),
-            start_ip=dict(required=True),
-            end_ip=dict(required=True),
-            prefix_length=dict(required=True),
+            name=dict(),
+            start_ip=dict(),
+            end_ip=dict(),
+            prefix_length=dict(),
             gateway=dict(),
             dns_server_1=dict(),
-            dns_server_2=dict()
+            dns_server_2=dict(),
+            ippools=dict(type='list'),
+            concurrency=dict(default=5, type='int')
         ),
+        required_one_of=[['name', 'ippools']],
+        mutually_exclusive=[['name', 'ippools']],
+        required_together=[['name', 'start_ip', 'end_ip', 'prefix_length']],
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
+    from ansible.module_utils.nsx_client import get_nsx_client
+    from nsxramlclient.exceptions import NsxError
 
-    s = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                  module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    if module.params['ippools'] is not None:
+        for ippool in module.params['ippools']:
+            if not isinstance(ippool, dict) or not ippool.get('name'):
+                module.fail_json(msg='Malformed IP Pool Dictionary: every IP pool needs at least a name: '
+                                     '{}'.format(ippool))
+            if ippool.get('state', module.params['state']) == 'present' and not \
+                    (ippool.get('start_ip') and ippool.get('end_ip') and ippool.get('prefix_length')):
+                module.fail_json(msg='The IP pool {} is missing one of the following parameters: start_ip, end_ip or '
+                                     'prefix_length'.format(ippool['name']))
+        # errors are raised instead of exiting, as the IP pools are reconciled in worker threads
+        s = get_nsx_client(module, fail_mode='raise')
+        try:
+            ippool_results = reconcile_ippools(s, module.params['ippools'], module.params['concurrency'],
+                                               module.params['state'])
+        except NsxError as error:
+            module.fail_json(msg='Failed to read the IP pools: {}'.format(error))
+        changed = any(result['action'] for result in ippool_results)
+        failed = [result['name'] for result in ippool_results if result.get('error')]
+        if failed:
+            module.fail_json(msg='Failed to reconcile the IP pools {}'.format(', '.join(failed)), changed=changed,
+                             ippool_results=ippool_results)
+        module.exit_json(changed=changed, ippool_results=ippool_results,
+                         ippool_ids=dict((result['name'], result['ippool_id']) for result in ippool_results))
+
+    s = get_nsx_client(module)
 
     ip_pool_objectid = get_ippool_id(s, module.params['name'])
 
@@ -97,35 +240,8 @@ def main():
             module.exit_json(changed=False, argument_spec=module.params)
 
     ippool_config = get_ippool_details(s, ip_pool_objectid)
-    change_required = False
+    change_required = check_ippool_details(ippool_config, module.params)
 
-    for ippool_detail_key, ippool_detail_value in ippool_config['ipamAddressPool'].iteritems():
-        if ippool_detail_key == 'ipRanges':
-            for range_detail_key, range_detail_value in \
-                    ippool_config['ipamAddressPool']['ipRanges']['ipRangeDto'].iteritems():
-                if range_detail_key == 'startAddress' and range_detail_value != module.params['start_ip']:
-                    ippool_config['ipamAddressPool']['ipRanges']['ipRangeDto']['startAddress'] = \
-                        module.params['start_ip']
-                    change_required = True
-                elif range_detail_key == 'endAddress' and range_detail_value != module.params['end_ip']:
-                    ippool_config['ipamAddressPool']['ipRanges']['ipRangeDto']['endAddress'] = \
-                        module.params['end_ip']
-                    change_required = True
-        elif ippool_detail_key == 'gateway' and ippool_detail_value != module.params['gateway']:
-            ippool_config['ipamAddressPool']['gateway'] = module.params['gateway']
-            change_required = True
-        elif ippool_detail_key == 'prefixLength' and ippool_detail_value != module.params['prefix_length']:
-            ippool_config['ipamAddressPool']['prefixLength'] = module.params['prefix_length']
-            change_required = True
-        elif ippool_detail_key == 'name' and ippool_detail_value != module.params['name']:
-            ippool_config['ipamAddressPool']['name'] = module.params['name']
-            change_required = True
-        elif ippool_detail_key == 'dnsServer1' and ippool_detail_value != module.params['dns_server_1']:
-            ippool_config['ipamAddressPool']['dnsServer1'] = module.params['dns_server_1']
-            change_required = True
-        elif ippool_detail_key == 'dnsServer2' and ippool_detail_value != module.params['dns_server_2']:
-            ippool_config['ipamAddressPool']['dnsServer2'] = module.params['dns_server_2']
-            change_required = True
     if change_required:
         revision = int(ippool_config['ipamAddressPool']['revision'])
         revision += 1
@@ -138,6 +254,8 @@ def main():
                          ippool_id=ip_pool_objectid)
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_ipam import get_ippool_inventory
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
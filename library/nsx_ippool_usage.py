@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright © 2015 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import bisect
+
+ALLOCATION_PAGE_SIZE = 1024
+
+
+def get_ippool_ranges(session, ip_pool):
+    """
+    :return: A sorted list of (start, end) tuples, with the addresses of the pool ranges as integers
+    """
+    if not ip_pool.get('ipRanges'):
+        return []
+    return sorted((ip_to_int(ip_range['startAddress']), ip_to_int(ip_range['endAddress'])) for ip_range in
+                  session.normalize_list_return(ip_pool['ipRanges'].get('ipRangeDto')))
+
+
+def read_allocated_addresses(session, pool_object_id, page_size=ALLOCATION_PAGE_SIZE):
+    """
+    Generator yielding the allocated addresses of a pool page by page, so only one page is held in memory.
+    Paging stops when a page is not full, or when the API ignores the paging parameters and repeats an address
+    """
+    start_index = 0
+    first_address = None
+    while True:
+        allocations = session.read('ipPoolAllocate', uri_parameters={'poolId': pool_object_id},
+                                   query_parameters_dict={'startIndex': start_index, 'pageSize': page_size})['body']
+        if not allocations or not allocations.get('allocatedIpAddresses'):
+            return
+        page = session.normalize_list_return(allocations['allocatedIpAddresses'].get('allocatedIpAddress'))
+        if not page or page[0]['ipAddress'] == first_address:
+            return
+        if first_address is None:
+            first_address = page[0]['ipAddress']
+        for allocation in page:
+            yield allocation['ipAddress']
+        if len(page) < page_size:
+            return
+        start_index += page_size
+
+
+def count_allocations(ranges, addresses):
+    """
+    Counts the allocated addresses per range. The ranges must be sorted and not overlapping, so every address
+    can be placed with a binary search over the range starts
+    :param ranges: A sorted list of (start, end) tuples
+    :param addresses: An iterable of IP addresses as strings
+    :return: A list with the number of allocated addresses in each range, and the number of addresses outside all ranges
+    """
+    range_starts = [start for start, _ in ranges]
+    allocated = [0] * len(ranges)
+    outside = 0
+    for address in addresses:
+        address_int = ip_to_int(address)
+        range_index = bisect.bisect_right(range_starts, address_int) - 1
+        if range_index >= 0 and address_int <= ranges[range_index][1]:
+            allocated[range_index] += 1
+        else:
+            outside += 1
+    return allocated, outside
+
+
+def ippool_usage(session, ip_pool, min_free=None):
+    """
+    :return: A compact usage summary of the pool, with the total, allocated and free counts of the pool and per range
+    """
+    ranges = get_ippool_ranges(session, ip_pool)
+    allocated, outside = count_allocations(ranges, read_allocated_addresses(session, ip_pool['objectId']))
+
+    range_usage = []
+    for (start, end), range_allocated in zip(ranges, allocated):
+        range_total = end - start + 1
+        range_usage.append({'start': int_to_ip(start), 'end': int_to_ip(end), 'total': range_total,
+                            'allocated': range_allocated, 'free': range_total - range_allocated})
+
+    total = sum([usage['total'] for usage in range_usage])
+    total_allocated = sum(allocated)
+    summary = {'name': ip_pool['name'], 'ippool_id': ip_pool['objectId'], 'total': total,
+               'allocated': total_allocated, 'free': total - total_allocated,
+               'utilization': round(total_allocated * 100.0 / total, 1) if total else 0.0,
+               'allocated_outside_ranges': outside, 'ranges': range_usage}
+    if min_free is not None:
+        summary['sufficient'] = summary['free'] >= min_free
+    return summary
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            ippools=dict(required=True, type='list'),
+            min_free=dict(type='int'),
+            fail_on_insufficient=dict(default=False, type='bool')
+        ),
+        supports_check_mode=True
+    )
+
+    from ansible.module_utils.nsx_client import get_nsx_client
+
+    s = get_nsx_client(module)
+
+    inventory = get_ippool_inventory(s)
+    missing_pools = [pool_name for pool_name in module.params['ippools'] if pool_name not in inventory]
+    if missing_pools:
+        module.fail_json(msg='NSX IP pool not found - {}'.format(', '.join(missing_pools)))
+
+    usage = [ippool_usage(s, inventory[pool_name], module.params['min_free'])
+             for pool_name in module.params['ippools']]
+
+    insufficient = [pool['name'] for pool in usage if pool.get('sufficient') is False]
+    if insufficient and module.params['fail_on_insufficient']:
+        module.fail_json(msg='IP pools with less than {} free addresses: {}'.format(module.params['min_free'],
+                                                                                 ', '.join(insufficient)),
+                         ippool_usage=usage)
+
+    module.exit_json(changed=False, ippool_usage=usage, insufficient_ippools=insufficient)
+
+from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_ipam import get_ippool_inventory, int_to_ip, ip_to_int
+from ansible.module_utils.nsx_profile import profiled
+
+if __name__ == '__main__':
+    profiled(main)()
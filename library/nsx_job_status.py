@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright © 2015 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import errno
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+
+# controller states seen while the controller cluster is still converging
+UNSTABLE_CONTROLLER_STATES = set(['DEPLOYING', 'REMOVING', 'UNKNOWN'])
+FAILED_TASK_STATES = ['FAILED', 'CANCELED', 'TIMEOUT']
+
+
+def poll_controller_deployment(session, job):
+    """
+    A controller deployment is done once the job succeeded and the controller cluster is stable again
+    """
+    status = session.read('nsxControllerJob', uri_parameters={'jobId': job['id']})['body']
+    status = status['controllerDeploymentInfo']['status']
+    if status == 'Failure':
+        return 'failed', status
+    elif status != 'Success':
+        return 'running', status
+
+    controllers = session.read('nsxControllers')['body']['controllers']
+    controllers = session.normalize_list_return(controllers['controller'] if controllers else None)
+    if UNSTABLE_CONTROLLER_STATES & set([controller['status'] for controller in controllers]):
+        return 'running', 'Success, waiting for the controller cluster to become stable'
+    return 'succeeded', status
+
+
+def poll_task_framework(session, job):
+    response = session.read('taskFrameworkJobs', uri_parameters={'jobId': job['id']})['body']
+    status = session.normalize_list_return(response['jobInstances']['jobInstance'])[-1]['status']
+    if status == job.get('status', 'COMPLETED'):
+        return 'succeeded', status
+    elif status in FAILED_TASK_STATES:
+        return 'failed', status
+    return 'running', status
+
+
+def poll_fabric_feature(session, job):
+    cluster_status = session.read('nwfabricStatus', query_parameters_dict={'resource': job['id']})['body']
+    for feature_status in session.normalize_list_return(
+            cluster_status['resourceStatuses']['resourceStatus']['nwFabricFeatureStatus']):
+        if feature_status['featureId'] == job['feature']:
+            status = feature_status['status']
+            break
+    else:
+        status = 'UNKNOWN'
+    if status == job.get('status', 'GREEN'):
+        return 'succeeded', status
+    return 'running', status
+
+
+def log_tail(log_file, lines=5):
+    try:
+        with open(log_file) as log:
+            return ' '.join(log.read().strip().splitlines()[-lines:])
+    except IOError:
+        return ''
+
+
+def process_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as error:
+        # the process exists, but belongs to another user
+        return error.errno == errno.EPERM
+    return True
+
+
+def poll_ovftool(session, job):
+    """
+    An ovftool deployment is done once ovftool exited with 0 and the NSX Manager web server answers
+    """
+    import requests
+
+    rc_file = job['log'] + '.rc'
+    if os.path.exists(rc_file):
+        with open(rc_file) as rc:
+            exit_code = rc.read().strip()
+        if exit_code != '0':
+            return 'failed', 'ovftool exited with {}: {}'.format(exit_code, log_tail(job['log']))
+        try:
+            response = requests.get('https://{}/'.format(job['ip_address']), verify=False, timeout=5)
+        except requests.exceptions.RequestException as error:
+            return 'running', 'ovftool finished, waiting for NSX Manager: {}'.format(error)
+        if response.status_code != 200:
+            return 'running', 'ovftool finished, NSX Manager returned status code {}'.format(response.status_code)
+        return 'succeeded', 'NSX Manager is up'
+    elif process_running(int(job['id'])):
+        return 'running', log_tail(job['log'], lines=1)
+    return 'failed', 'ovftool is no longer running and left no exit code: {}'.format(log_tail(job['log']))
+
+
+JOB_POLLERS = {'controller_deployment': poll_controller_deployment,
+               'task_framework': poll_task_framework,
+               'fabric_feature': poll_fabric_feature,
+               'ovftool': poll_ovftool}
+
+# job types that can be polled without an NSX Manager session
+LOCAL_JOBS = ['ovftool']
+
+
+def poll_job(session, job):
+    """
+    :return: The job dictionary with its 'state', 'running', 'succeeded' or 'failed', and the 'detail' reported
+    """
+    from nsxramlclient.exceptions import NsxError
+
+    result = dict(job)
+    try:
+        result['state'], result['detail'] = JOB_POLLERS[job['type']](session, job)
+    except NsxError as error:
+        # NSX Manager doesn't know the job (anymore), any other error is retried on the next poll
+        result['state'] = 'failed' if error.status == 404 else 'running'
+        result['detail'] = str(error)
+    except (TypeError, KeyError) as error:
+        result['state'], result['detail'] = 'running', 'unexpected status response: {}'.format(error)
+    return result
+
+
+def poll_jobs(session, jobs, concurrency):
+    pool = ThreadPool(min(concurrency, len(jobs)) or 1)
+    try:
+        return pool.map(lambda job: poll_job(session, job), jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            nsxmanager_spec=dict(no_log=True, type='dict'),
+            jobs=dict(required=True, type='list'),
+            wait=dict(default=False, type='bool'),
+            timeout=dict(default=1800, type='int'),
+            poll_interval=dict(default=15, type='int'),
+            concurrency=dict(default=10, type='int')
+        ),
+        supports_check_mode=True
+    )
+
+    jobs = module.params['jobs']
+    for job in jobs:
+        if not isinstance(job, dict) or job.get('type') not in JOB_POLLERS or 'id' not in job:
+            module.fail_json(msg='Invalid job {}, jobs need an id and a type out of {}'.format(
+                job, sorted(JOB_POLLERS)))
+
+    session = None
+    if [job for job in jobs if job['type'] not in LOCAL_JOBS]:
+        if not module.params['nsxmanager_spec']:
+            module.fail_json(msg='nsxmanager_spec is required to poll NSX Manager jobs')
+        from ansible.module_utils.nsx_client import get_nsx_client
+
+        # errors are raised instead of exiting, so a failing poll doesn't end the other worker threads
+        session = get_nsx_client(module, fail_mode='raise')
+
+    start = time.time()
+    results = [None] * len(jobs)
+    while True:
+        pending = [index for index, result in enumerate(results) if not result or result['state'] == 'running']
+        for index, result in zip(pending, poll_jobs(session, [jobs[index] for index in pending],
+                                                     module.params['concurrency'])):
+            results[index] = result
+        running = [result for result in results if result['state'] == 'running']
+        if not module.params['wait'] or not running or \
+                time.time() - start + module.params['poll_interval'] > module.params['timeout']:
+            break
+        time.sleep(module.params['poll_interval'])
+
+    wait_seconds = round(time.time() - start, 1)
+    failed = [result for result in results if result['state'] == 'failed']
+    if failed:
+        module.fail_json(msg='{} of {} jobs failed'.format(len(failed), len(jobs)), jobs=results,
+                         wait_seconds=wait_seconds)
+    if module.params['wait'] and running:
+        module.fail_json(msg='Timed out waiting for {} of {} jobs'.format(len(running), len(jobs)), jobs=results,
+                         wait_seconds=wait_seconds)
+
+    module.exit_json(changed=False, jobs=results, finished=not running, running=len(running),
+                     wait_seconds=wait_seconds)
+
+
+from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
+
+if __name__ == '__main__':
+    profiled(main)()
@@ -19,6 +19,10 @@
 
 
 def retrieve_scope(module, session, tz_name):
+    scope_facts = fact_record(session, module.params['nsx_facts'], 'transport_zones', tz_name)
+    if scope_facts:
+        return scope_facts['id']
+
     vdn_scopes = session.read('vdnScopes', 'read')['body']
     vdn_scope_dict_list = vdn_scopes['vdnScopes']['vdnScope']
     vdn_scope_id = None
@@ -36,7 +40,11 @@ def retrieve_scope(module, session, tz_name):
     else:
         module.fail_json(msg='The transport zone with the name {} could not be found in NSX'.format(tz_name))
 
-def get_lswitch_id(session, lswitchname, scope):
+def get_lswitch_id(session, lswitchname, scope, nsx_facts=None):
+    lswitch_facts = fact_record(session, nsx_facts, 'logical_switches', lswitchname)
+    if lswitch_facts and lswitch_facts.get('scope_id') == scope:
+        return [lswitch_facts['id']]
+
     lswitches_api = session.read_all_pages('logicalSwitches', uri_parameters={'scopeId': scope})
     all_lswitches = session.normalize_list_return(lswitches_api)
 
@@ -74,6 +82,7 @@ def main():
         argument_spec=dict(
             state=dict(default='present', choices=['present', 'absent']),
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            nsx_facts=dict(type='dict'),
             name=dict(required=True),
             description=dict(),
             transportzone=dict(required=True),
@@ -82,12 +91,11 @@ def main():
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
-    client_session=NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                             module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    client_session=get_nsx_client(module)
 
     vdn_scope=retrieve_scope(module, client_session, module.params['transportzone'])
-    lswitch_id=get_lswitch_id(client_session, module.params['name'], vdn_scope)
+    lswitch_id=get_lswitch_id(client_session, module.params['name'], vdn_scope, module.params['nsx_facts'])
 
     if len(lswitch_id) is 0 and 'present' in module.params['state']:
         ls_ops_response=create_lswitch(client_session, module.params['name'], module.params['description'],
@@ -121,5 +129,7 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import fact_record
+from ansible.module_utils.nsx_profile import profiled
 if __name__ == '__main__':
-    main()
+    profiled(main)()
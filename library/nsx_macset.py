@@ -17,11 +17,41 @@
 # CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
+MACSET_PAGE_SIZE = 1024
+
+
+def read_macset_pages(session, scope, page_size=MACSET_PAGE_SIZE):
+    """
+    Generator reading all pages of the MACsets on a scope. Paging stops when a page is not full, or when the API
+    ignores the paging parameters and returns an already seen MACset
+    """
+    start_index = 0
+    seen_ids = set()
+    while True:
+        macsets = session.read('macsetScopeRead', uri_parameters={'scopeId': scope},
+                               query_parameters_dict={'startIndex': start_index, 'pageSize': page_size})['body']
+        if not macsets or not macsets.get('list'):
+            return
+        page = session.normalize_list_return(macsets['list'].get('macset'))
+        new_macsets = [macset for macset in page if macset['objectId'] not in seen_ids]
+        for macset in new_macsets:
+            seen_ids.add(macset['objectId'])
+            yield macset
+        if len(page) < page_size or len(new_macsets) < len(page):
+            return
+        start_index += page_size
+
+
+def get_macset_inventory(session, scope):
+    """
+    :return: A dictionary of all MACsets on the scope, indexed by their exact name
+    """
+    return dict((macset['name'], macset) for macset in read_macset_pages(session, scope))
+
 
 def get_macset_id(session, ms_name, scope):
-    macsets = session.read('macsetScopeRead', uri_parameters={'scopeId': scope})['body']
-    first_page = macsets['list']['macset']
-    return [macset['objectId'] for macset in first_page if ms_name in macset['name']]
+    macset = get_macset_inventory(session, scope).get(ms_name)
+    return [macset['objectId']] if macset else []
 
 
 # Lookup macset information by ID
@@ -45,22 +75,110 @@ def delete_macset(session, macset_id):
     return session.delete('macset', uri_parameters={'macsetId': macset_id})
 
 
+def macset_changes(macset, description, value):
+    change_required = False
+    if macset.get('description') != description:
+        macset['description'] = description
+        change_required = True
+    if macset.get('value') != value:
+        macset['value'] = value
+        change_required = True
+    return change_required
+
+
+def reconcile_macset(session, inventory, scope, desired, default_state='present'):
+    """
+    Brings a single MACset to the desired state, using the MACset details from the inventory read
+    :param default_state: The state of MACsets without their own 'state', the state passed to the module
+    :return: A dictionary with the MACset name and the action taken, or the NSX error that occurred
+    """
+    from nsxramlclient.exceptions import NsxError
+
+    try:
+        current = inventory.get(desired['name'])
+        state = desired.get('state', default_state)
+        if state == 'absent':
+            if not current:
+                return {'name': desired['name'], 'action': None}
+            delete_macset(session, current['objectId'])
+            return {'name': desired['name'], 'action': 'delete', 'objectId': current['objectId']}
+
+        if not current:
+            new_macset = session.extract_resource_body_example('macsetScopeCreate', 'create')
+            new_macset['macset']['name'] = desired['name']
+            new_macset['macset']['description'] = desired.get('description')
+            new_macset['macset']['value'] = desired.get('value')
+            create_response = create_macset(session, new_macset, scope)
+            return {'name': desired['name'], 'action': 'create', 'objectId': create_response['objectId']}
+
+        macset_details = {'macset': dict(current)}
+        if not macset_changes(macset_details['macset'], desired.get('description'), desired.get('value')):
+            return {'name': desired['name'], 'action': None, 'objectId': current['objectId']}
+        change_macset_details(session, current['objectId'], macset_details)
+        return {'name': desired['name'], 'action': 'update', 'objectId': current['objectId']}
+    except NsxError as error:
+        return {'name': desired['name'], 'action': None, 'error': str(error)}
+
+
+def reconcile_macsets(session, scope, desired_macsets, concurrency, default_state='present'):
+    """
+    Reconciles a list of MACsets in one pass over a single inventory read. Creates, updates and deletes are
+    issued concurrently with at most 'concurrency' calls in flight
+    """
+    from multiprocessing.pool import ThreadPool
+
+    inventory = get_macset_inventory(session, scope)
+    pool = ThreadPool(concurrency)
+    try:
+        return pool.map(lambda desired: reconcile_macset(session, inventory, scope, desired, default_state),
+                        desired_macsets)
+    finally:
+        pool.close()
+        pool.join()
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
             state=dict(default='present', choices=['present', 'absent']),
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
-            name=dict(required=True),
+            name=dict(),
             transportzone=dict(required=True),
             description=dict(),
-            value=dict()
+            value=dict(),
+            macsets=dict(type='list'),
+            concurrency=dict(default=5, type='int')
         ),
+        required_one_of=[['name', 'macsets']],
+        mutually_exclusive=[['name', 'macsets']],
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
-    client_session = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                             module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    from nsxramlclient.exceptions import NsxError
+
+    if module.params['macsets'] is not None:
+        for macset in module.params['macsets']:
+            if not isinstance(macset, dict) or not macset.get('name'):
+                module.fail_json(msg='Malformed MACset Dictionary: every MACset needs at least a name: '
+                                     '{}'.format(macset))
+        # errors are raised instead of exiting, as the MACsets are reconciled in worker threads
+        client_session = get_nsx_client(module, fail_mode='raise')
+        try:
+            macset_results = reconcile_macsets(client_session, module.params['transportzone'],
+                                               module.params['macsets'], module.params['concurrency'],
+                                               module.params['state'])
+        except NsxError as error:
+            module.fail_json(msg='Failed to read the MACsets: {}'.format(error))
+        changed = any(result['action'] for result in macset_results)
+        failed = [result['name'] for result in macset_results if result.get('error')]
+        if failed:
+            module.fail_json(msg='Failed to reconcile the MACsets {}'.format(', '.join(failed)), changed=changed,
+                             macset_results=macset_results)
+        module.exit_json(changed=changed, macset_results=macset_results)
+
+    client_session = get_nsx_client(module)
+
     macset_id_lst = get_macset_id(client_session, module.params['name'], module.params['transportzone'])
 
     if len(macset_id_lst) is 0 and 'present' in module.params['state']:
@@ -96,5 +214,6 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -19,20 +19,13 @@
 
 __author__ = 'virtualelephant'
 
-try:
-    from pyVmomi import vim, vmodl
-    from pyVmomi.connect import SmartConnect
-    HAS_PYVMOMI = True
-
-except ImportError:
-    HAS_PYVMOMI = False
-
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 
 def get_user_role(client_session, user_id):
     """
     :param client_session: An instance of an NsxClient session
-    :param user_id: The userId. To specify a domain user, use user@domain not domain\user
+    :param user_id: The userId. To specify a domain user, use user@domain not domain\\user
     """
 
     cfg_result = client_session.read('userRoleMgmt', uri_parameters={'userId': user_id})
@@ -42,7 +35,7 @@ def get_user_role(client_session, user_id):
 def update_user_role(client_session, user_id, role_type):
     """
     :param client_session: An instance of an NsxClient session
-    :param user_id: The userId. To specify a domain user, use user@domain not domain\user
+    :param user_id: The userId. To specify a domain user, use user@domain not domain\\user
     :param role_type: Users assigned role. Possible roles are super_user, vshield_admin, enterprise_admin, security_admin, auditor
     """
 
@@ -59,7 +52,7 @@ def update_user_role(client_session, user_id, role_type):
 def create_user_role(client_session, user_id, role_type, is_group):
     """
     :param client_session: An instance of an NsxClient session
-    :param user_id: The userId. To specify a domain user, use user@domain not domain\user
+    :param user_id: The userId. To specify a domain user, use user@domain not domain\\user
     :param role_type: Users assigned role. Possible roles are super_user, vshield_admin, enterprise_admin, security_admin, auditor
     :param is_group: Query parameter. True to apply to a group, false to apply to a user. Default is false.
     """
@@ -78,7 +71,7 @@ def create_user_role(client_session, user_id, role_type, is_group):
 def delete_user_role(client_session, user_id):
     """
     :param client_session: An instance of an NsxClient session
-    :param user_id: The userID. To specify a domain user, use user@domain not domain\user
+    :param user_id: The userID. To specify a domain user, use user@domain not domain\\user
     """
 
     cfg_result = client_session.delete('userRoleMgmt', uri_parameters={'userId': user_id})
@@ -88,24 +81,129 @@ def delete_user_role(client_session, user_id):
     else:
         return False
 
+def get_role_assignments(client_session):
+    """
+    :param client_session: An instance of an NsxClient session
+    :return: A dictionary of the assigned roles keyed by userId, read with a single call for all principals
+    """
+
+    cfg_result = client_session.read('userNSXManagerInfo')['body']
+    if not cfg_result or not cfg_result.get('users'):
+        return {}
+
+    assignments = {}
+    for user_info in client_session.normalize_list_return(cfg_result['users'].get('userInfo')):
+        user_id = user_info.get('userId') or user_info.get('name')
+        access_control_entry = user_info.get('accessControlEntry') or {}
+        assignments[user_id] = access_control_entry.get('role')
+
+    return assignments
+
+def principal_change(assignments, principal, default_state='present'):
+    """
+    :param assignments: The dictionary of the assigned roles returned by get_role_assignments
+    :param principal: The desired principal dictionary with name, role_type and state
+    :param default_state: The state of principals without their own 'state', the state passed to the module
+    :return: The action needed to reach the desired role (create, update or delete), or None if it is in place
+    """
+
+    current_role = assignments.get(principal['name'])
+    if principal.get('state', default_state) == 'absent':
+        return 'delete' if principal['name'] in assignments else None
+    if principal['name'] not in assignments:
+        return 'create'
+    if current_role != principal['role_type']:
+        return 'update'
+    return None
+
+def apply_principal_change(client_session, principal, action):
+    from nsxramlclient.exceptions import NsxError
+
+    try:
+        if action == 'create':
+            is_group = str(principal.get('is_group', False)).lower()
+            success = create_user_role(client_session, principal['name'], principal['role_type'], is_group)
+        elif action == 'update':
+            success = update_user_role(client_session, principal['name'], principal['role_type'])
+        else:
+            success = delete_user_role(client_session, principal['name'])
+    except NsxError as error:
+        return {'name': principal['name'], 'action': action, 'success': False, 'error': str(error)}
+
+    return {'name': principal['name'], 'action': action, 'success': success}
+
+def sync_principals(client_session, principals, concurrency, default_state='present'):
+    """
+    :param client_session: An instance of an NsxClient session
+    :param principals: A list of principal dictionaries with name, role_type, is_group and state
+    :param concurrency: The maximum number of role changes in flight
+    :param default_state: The state of principals without their own 'state', the state passed to the module
+    :return: A list with the result of each role change, principals already in place are left out
+    """
+
+    assignments = get_role_assignments(client_session)
+    changes = [(principal, principal_change(assignments, principal, default_state)) for principal in principals]
+    changes = [(principal, action) for principal, action in changes if action]
+    if not changes:
+        return []
+
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(concurrency)
+    try:
+        return pool.map(lambda change: apply_principal_change(client_session, change[0], change[1]), changes)
+    finally:
+        pool.close()
+        pool.join()
+
 def main():
     module = AnsibleModule(
             argument_spec=dict(
                 state=dict(default='present', choices=['present', 'update', 'absent']),
                 nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
-                name=dict(required=True),
+                name=dict(),
                 is_group=dict(default='false', choices=['true', 'false']),
-                role_type=dict(choices=['super_user', 'vshield_admin', 'security_admin', 'auditor', 'enterprise_admin'])
+                role_type=dict(choices=['super_user', 'vshield_admin', 'security_admin', 'auditor', 'enterprise_admin']),
+                principals=dict(type='list'),
+                concurrency=dict(default=5, type='int')
             ),
+            required_one_of=[['name', 'principals']],
+            mutually_exclusive=[['name', 'principals']],
             supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
-
-    client_session = NsxClient(module.params['nsxmanager_spec']['raml_file'],
-                               module.params['nsxmanager_spec']['host'],
-                               module.params['nsxmanager_spec']['user'],
-                               module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    from nsxramlclient.exceptions import NsxError
+
+    if module.params['principals'] is not None:
+        # 'update' assigns the role like 'present' does in principals mode
+        default_state = 'absent' if module.params['state'] == 'absent' else 'present'
+        for principal in module.params['principals']:
+            if not isinstance(principal, dict) or 'name' not in principal:
+                module.fail_json(msg='Malformed Principal Dictionary: every principal needs a name: '
+                                     '{}'.format(principal))
+            if principal.get('state', default_state) not in ['present', 'absent']:
+                module.fail_json(msg='Principal {} has an invalid state: '
+                                     '{}'.format(principal['name'], principal['state']))
+            if principal.get('state', default_state) == 'present' and principal.get('role_type') not in \
+                    ['super_user', 'vshield_admin', 'security_admin', 'auditor', 'enterprise_admin']:
+                module.fail_json(msg='Principal {} needs a valid role_type'.format(principal['name']))
+
+        # errors are raised instead of exiting, as the role changes are sent from worker threads
+        client_session = get_nsx_client(module, fail_mode='raise')
+        try:
+            principal_changes = sync_principals(client_session, module.params['principals'],
+                                                module.params['concurrency'], default_state)
+        except NsxError as error:
+            module.fail_json(msg='Failed to read the role assignments: {}'.format(error))
+        failed_principals = [change['name'] for change in principal_changes if not change['success']]
+        if failed_principals:
+            module.fail_json(msg='Failed to change the role of: {}'.format(', '.join(failed_principals)),
+                             principal_changes=principal_changes)
+
+        module.exit_json(changed=len(principal_changes) > 0, principal_changes=principal_changes,
+                         changed_principals=[change['name'] for change in principal_changes])
+
+    client_session = get_nsx_client(module)
 
     changed = False
     
@@ -123,4 +221,4 @@ def main():
     #    module.exit_json(changed=False)
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -19,14 +19,6 @@
 
 __author__ = 'virtualelephant'
 
-try:
-    from pyVmomi import vim, vmodl
-    from pyVmomi.connect import SmartConnect
-    HAS_PYVMOMI = True
-
-except ImportError:
-    HAS_PYVMOMI = False
-
 def get_syslog_server(client_session, user_id):
     """
     Pre-NSX 6.4 functionality
@@ -88,12 +80,9 @@ def main():
             supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
+    from ansible.module_utils.nsx_client import get_nsx_client
 
-    client_session = NsxClient(module.params['nsxmanager_spec']['raml_file'],
-                               module.params['nsxmanager_spec']['host'],
-                               module.params['nsxmanager_spec']['user'],
-                               module.params['nsxmanager_spec']['password'])
+    client_session = get_nsx_client(module)
 
     changed = False
 
@@ -109,6 +98,7 @@ def main():
         module.exit_json(changed=False)
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
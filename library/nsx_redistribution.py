@@ -25,22 +25,23 @@
 __author__ = 'yfauser'
 
 
-def get_edge(client_session, edge_name):
+def get_edge(client_session, edge_name, nsx_facts=None):
     """
     :param client_session: An instance of an NsxClient Session
     :param edge_name: The name of the edge searched
+    :param nsx_facts: Optional facts gathered by the nsx_facts module, used to resolve the name without API calls
     :return: A tuple, with the first item being the edge or dlr id as string of the first Scope found with the
-             right name and the second item being a dictionary of the logical parameters as return by the NSX API
+             right name and the second item being a dictionary with the objectId and name of the edge
     """
-    all_edge = client_session.read_all_pages('nsxEdges', 'read')
+    edge_facts = fact_record(client_session, nsx_facts, 'edges', edge_name)
+    if edge_facts:
+        return edge_facts['id'], edge_facts
 
-    try:
-        edge_params = [scope for scope in all_edge if scope['name'] == edge_name][0]
-        edge_id = edge_params['objectId']
-    except IndexError:
+    edge_params = find_record(client_session, 'nsxEdges', 'name', edge_name)
+    if not edge_params:
         return None, None
 
-    return edge_id, edge_params
+    return edge_params['objectId'], edge_params
 
 
 def validate_prefixes(prefix_list):
@@ -272,6 +273,7 @@ def main():
     module = AnsibleModule(
         argument_spec=dict(
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            nsx_facts=dict(type='dict'),
             edge_name=dict(required=True, type='str'),
             ospf_state=dict(required=True, choices=['present', 'absent'], type='str'),
             bgp_state=dict(required=True, choices=['present', 'absent'], type='str'),
@@ -281,12 +283,11 @@ def main():
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
+    from ansible.module_utils.nsx_client import get_nsx_client
 
-    client_session = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                               module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    client_session = get_nsx_client(module)
 
-    edge_id, edge_params = get_edge(client_session, module.params['edge_name'])
+    edge_id, edge_params = get_edge(client_session, module.params['edge_name'], module.params['nsx_facts'])
     if not edge_id:
         module.fail_json(msg='could not find Edge with name {}'.format(module.params['edge_name']))
 
@@ -326,5 +327,7 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import fact_record, find_record
+from ansible.module_utils.nsx_profile import profiled
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    profiled(main)()
\ No newline at end of file
@@ -17,6 +17,8 @@
 # CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
 # IN THE SOFTWARE.
 
+import bisect
+
 
 def get_segment_id_pools(session):
     id_pools = session.read('vdnSegmentPools')['body']
@@ -69,6 +71,177 @@ def delete_mcast_pool(session, mcast_pool_id):
     return session.delete('vdnMulticastPool', uri_parameters={'multicastAddresssRangeId': mcast_pool_id})['status']
 
 
+def normalize_ranges(ranges, to_int=int):
+    """
+    Sorts the ranges by their start and merges overlapping or adjacent ranges
+    :param ranges: A list of dictionaries with 'start' and 'end'
+    :param to_int: The function converting the range boundaries to integers
+    :return: A sorted list of non overlapping (start, end) tuples
+    """
+    merged = []
+    boundaries = sorted((to_int(str(range_spec['start'])), to_int(str(range_spec['end']))) for range_spec in ranges)
+    for start, end in boundaries:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def find_overlaps(current_ranges, desired_ranges):
+    """
+    Finds the current ranges overlapping a desired range with a different start, which can't be extended in place
+    and have to be deleted. Both lists must be sorted, so the overlaps are found with a single sweep over both lists
+    :param current_ranges: A sorted list of (start, end, id) tuples
+    :param desired_ranges: A sorted list of (start, end) tuples
+    :return: A list of (current range id, desired range) tuples
+    """
+    overlaps = []
+    current_index = 0
+    desired_index = 0
+    while current_index < len(current_ranges) and desired_index < len(desired_ranges):
+        c_start, c_end, c_id = current_ranges[current_index]
+        d_start, d_end = desired_ranges[desired_index]
+        if c_start <= d_end and d_start <= c_end and c_start != d_start:
+            overlaps.append((c_id, (d_start, d_end)))
+        if c_end < d_end:
+            current_index += 1
+        else:
+            desired_index += 1
+    return overlaps
+
+
+def plan_range_changes(current_ranges, desired_ranges):
+    """
+    Computes the minimal operations to get from the current ranges to the desired ranges. A current range starting
+    at the same id as a desired range is kept or extended, as NSX only allows to change the end of a range. All
+    other current ranges are deleted, and the remaining desired ranges are created
+    :param current_ranges: A list of (start, end, id) tuples
+    :param desired_ranges: A sorted list of non overlapping (start, end) tuples
+    :return: A dictionary with the list of ranges to create, the (id, new end) to extend and the ids to delete
+    """
+    current_by_start = dict((start, (end, range_id)) for start, end, range_id in current_ranges)
+    plan = {'create': [], 'extend': [], 'delete': []}
+    for start, end in desired_ranges:
+        if start not in current_by_start:
+            plan['create'].append((start, end))
+            continue
+        current_end, range_id = current_by_start.pop(start)
+        if current_end < end:
+            plan['extend'].append((range_id, end))
+        elif current_end > end:
+            plan['delete'].append(range_id)
+            plan['create'].append((start, end))
+    plan['delete'].extend(sorted(range_id for _, range_id in current_by_start.values()))
+    return plan
+
+
+def read_current_ranges(session, ranges, range_key, to_int=int):
+    if not ranges:
+        return []
+    return sorted((to_int(current['begin']), to_int(current['end']), current['id'])
+                  for current in session.normalize_list_return(ranges.get(range_key)))
+
+
+def apply_segment_plan(session, plan):
+    for range_id in plan['delete']:
+        delete_segment_id_pool(session, range_id)
+    for range_id, end in plan['extend']:
+        update_segment_id_pool(session, range_id, end)
+    for start, end in plan['create']:
+        create_segment_id_pool(session, start, end)
+
+
+def apply_mcast_plan(session, plan):
+    for range_id in plan['delete']:
+        delete_mcast_pool(session, range_id)
+    for range_id, end in plan['extend']:
+        update_mcast_pool(session, range_id, int_to_ip(end))
+    for start, end in plan['create']:
+        create_mcast_pool(session, int_to_ip(start), int_to_ip(end))
+
+
+def count_used_per_range(session, ranges, field, to_int=int):
+    """
+    :param ranges: A sorted list of non overlapping (start, end) tuples
+    :param field: The logical switch field holding the allocated value, 'vdnId' or 'multicastAddr'
+    :return: A list with the number of logical switches with a value inside each range
+    """
+    range_starts = [start for start, _ in ranges]
+    used = [0] * len(ranges)
+    for lswitch in iter_records(session, 'logicalSwitchesGlobal', (field,)):
+        if not lswitch.get(field):
+            continue
+        value = to_int(lswitch[field])
+        range_index = bisect.bisect_right(range_starts, value) - 1
+        if range_index >= 0 and value <= ranges[range_index][1]:
+            used[range_index] += 1
+    return used
+
+
+def count_used_vnis(session, ranges):
+    """
+    :return: The number of logical switches with a VNI inside the given sorted ranges
+    """
+    return sum(count_used_per_range(session, ranges, 'vdnId'))
+
+
+def ranges_in_use(session, current_ranges, plan, field, to_int=int, to_str=str):
+    """
+    Deleting a range, also to shrink it, releases the values allocated from it
+    :return: A list of the ranges the plan deletes that have values allocated to logical switches, as dictionaries
+             with the range 'id', 'start', 'end' and the number of logical switches 'in_use'
+    """
+    deleted = [(start, end, range_id) for start, end, range_id in current_ranges if range_id in plan['delete']]
+    if not deleted:
+        return []
+    used = count_used_per_range(session, [(start, end) for start, end, _ in deleted], field, to_int)
+    return [{'id': range_id, 'start': to_str(start), 'end': to_str(end), 'in_use': in_use}
+            for (start, end, range_id), in_use in zip(deleted, used) if in_use]
+
+
+def plan_ranges(module, session):
+    """
+    Plans and applies the id pool ranges and multicast ranges given as lists
+    :return: A tuple with a boolean indicating a change, and a dictionary with the plans, overlaps and capacity
+    """
+    desired_ids = normalize_ranges(module.params['idpools'])
+    current_ids = read_current_ranges(session, get_segment_id_pools(session), 'segmentRange')
+    id_plan = plan_range_changes(current_ids, desired_ids)
+
+    mcast_plan = {'create': [], 'extend': [], 'delete': []}
+    if module.params['mcastpools'] is not None:
+        desired_mcast = normalize_ranges(module.params['mcastpools'], ip_to_int)
+        current_mcast = read_current_ranges(session, get_mcast_pool(session), 'multicastRange', ip_to_int)
+        mcast_plan = plan_range_changes(current_mcast, desired_mcast)
+
+    if not module.params['force']:
+        in_use = ranges_in_use(session, current_ids, id_plan, 'vdnId')
+        if module.params['mcastpools'] is not None:
+            in_use.extend(ranges_in_use(session, current_mcast, mcast_plan, 'multicastAddr', ip_to_int, int_to_ip))
+        if in_use:
+            module.fail_json(msg='The desired ranges delete or shrink ranges with values allocated to logical '
+                                 'switches, set force to true to change them anyway', ranges_in_use=in_use,
+                             segment_plan=id_plan)
+
+    result = {'segment_plan': id_plan,
+              'segment_overlaps': find_overlaps(current_ids, desired_ids),
+              'mcast_plan': {'create': [(int_to_ip(start), int_to_ip(end)) for start, end in mcast_plan['create']],
+                             'extend': [(range_id, int_to_ip(end)) for range_id, end in mcast_plan['extend']],
+                             'delete': mcast_plan['delete']},
+              'vni_capacity': {'total': sum([end - start + 1 for start, end in desired_ids])}}
+
+    apply_segment_plan(session, id_plan)
+    apply_mcast_plan(session, mcast_plan)
+
+    if module.params['report_capacity']:
+        used = count_used_vnis(session, desired_ids)
+        result['vni_capacity'].update({'used': used, 'free': result['vni_capacity']['total'] - used})
+
+    changed = any(id_plan.values()) or any(mcast_plan.values())
+    return changed, result
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -78,15 +251,34 @@ def main():
             idpoolend=dict(default=15000),
             mcast_enabled=dict(type='bool', default=False),
             mcastpoolstart=dict(default='239.0.0.0'),
-            mcastpoolend=dict(default='239.255.255.255')
+            mcastpoolend=dict(default='239.255.255.255'),
+            idpools=dict(type='list'),
+            mcastpools=dict(type='list'),
+            report_capacity=dict(default=False, type='bool'),
+            force=dict(default=False, type='bool')
         ),
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
+    if module.params['state'] == 'absent' and \
+            (module.params['idpools'] is not None or module.params['mcastpools'] is not None):
+        module.fail_json(msg='idpools and mcastpools are only supported with state present')
+    if module.params['mcastpools'] is not None and module.params['idpools'] is None:
+        module.fail_json(msg='mcastpools is only supported together with idpools')
+    if module.params['mcast_enabled'] and module.params['idpools'] is not None:
+        module.fail_json(msg='mcast_enabled is not used with idpools, pass the Multicast ranges as mcastpools')
+
+    from ansible.module_utils.nsx_client import get_nsx_client
+
+    s = get_nsx_client(module)
 
-    s = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                  module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    if module.params['idpools'] is not None:
+        for range_spec in module.params['idpools'] + (module.params['mcastpools'] or []):
+            if not isinstance(range_spec, dict) or 'start' not in range_spec or 'end' not in range_spec:
+                module.fail_json(msg='Malformed Range Dictionary: every range needs start and end: '
+                                     '{}'.format(range_spec))
+        changed, plan_result = plan_ranges(module, s)
+        module.exit_json(changed=changed, **plan_result)
 
     id_pool_changed = False
     mcast_pool_changed = False
@@ -133,6 +325,9 @@ def main():
         module.exit_json(changed=False)
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import iter_records
+from ansible.module_utils.nsx_ipam import int_to_ip, ip_to_int
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -56,11 +56,10 @@ def main():
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
+    from ansible.module_utils.nsx_client import get_nsx_client
     import OpenSSL, ssl
 
-    s = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                  module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    s = get_nsx_client(module)
 
     lookup_service_full_url = 'https://{}:{}/{}'.format(module.params['sso_lookupservice_server'],
                                                         module.params['sso_lookupservice_port'],
@@ -112,6 +111,7 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright © 2015 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import time
+from multiprocessing.pool import ThreadPool
+
+
+SYSLOG_TARGETS = ['manager', 'controllers', 'edges']
+
+
+def syslog_spec(module):
+    if module.params['state'] == 'absent':
+        return None
+    return {'server': module.params['syslog_server'], 'port': str(module.params['syslog_port']),
+            'protocol': module.params['syslog_protocol'].lower()}
+
+
+def get_manager_syslog(session, component_id):
+    syslog = session.read('systemSyslogServer')['body']
+    if not syslog or not syslog.get('syslogserver') or not syslog['syslogserver'].get('syslogServer'):
+        return None
+    return {'server': syslog['syslogserver']['syslogServer'], 'port': str(syslog['syslogserver'].get('port')),
+            'protocol': str(syslog['syslogserver'].get('protocol')).lower()}
+
+
+def set_manager_syslog(session, component_id, spec, current):
+    if spec:
+        session.update('systemSyslogServer', request_body_dict={'syslogserver': {'syslogServer': spec['server'],
+                                                                                 'port': spec['port'],
+                                                                                 'protocol': spec['protocol']}})
+    else:
+        session.delete('systemSyslogServer')
+
+
+def get_controller_syslog(session, controller_id):
+    from nsxramlclient.exceptions import NsxError
+
+    try:
+        syslog = session.read('nsxControllerSyslog', uri_parameters={'controllerId': controller_id})['body']
+        syslog = syslog['controllerSyslogServer']
+    except (NsxError, TypeError, KeyError):
+        return None
+    if not syslog or not syslog.get('syslogServer'):
+        return None
+    return {'server': syslog['syslogServer'], 'port': str(syslog.get('port')),
+            'protocol': str(syslog.get('protocol')).lower()}
+
+
+def set_controller_syslog(session, controller_id, spec, current):
+    if current:
+        session.delete('nsxControllerSyslog', uri_parameters={'controllerId': controller_id})
+    if spec:
+        syslog_body = session.extract_resource_body_example('nsxControllerSyslog', 'create')
+        syslog_body['controllerSyslogServer']['syslogServer'] = spec['server']
+        syslog_body['controllerSyslogServer']['port'] = spec['port']
+        syslog_body['controllerSyslogServer']['protocol'] = spec['protocol'].upper()
+        syslog_body['controllerSyslogServer']['level'] = 'INFO'
+        session.create('nsxControllerSyslog', uri_parameters={'controllerId': controller_id},
+                       request_body_dict=syslog_body)
+
+
+def get_edge_syslog(session, edge_id):
+    """
+    Edges don't have a configurable syslog port, so the desired port is assumed when the server matches
+    """
+    syslog = session.read('syslog', uri_parameters={'edgeId': edge_id})['body']
+    if not syslog or not syslog.get('syslog') or syslog['syslog'].get('enabled') == 'false':
+        return None
+    server_addresses = syslog['syslog'].get('serverAddresses') or {}
+    servers = session.normalize_list_return(server_addresses.get('ipAddress'))
+    if not servers:
+        return None
+    return {'server': ','.join(servers), 'port': None, 'protocol': str(syslog['syslog'].get('protocol')).lower()}
+
+
+def set_edge_syslog(session, edge_id, spec, current):
+    if spec:
+        session.update('syslog', uri_parameters={'edgeId': edge_id},
+                       request_body_dict={'syslog': {'enabled': 'true', 'protocol': spec['protocol'],
+                                                     'serverAddresses': {'ipAddress': spec['server']}}})
+    else:
+        session.delete('syslog', uri_parameters={'edgeId': edge_id})
+
+
+SYSLOG_HANDLERS = {'manager': (get_manager_syslog, set_manager_syslog),
+                   'controllers': (get_controller_syslog, set_controller_syslog),
+                   'edges': (get_edge_syslog, set_edge_syslog)}
+
+
+def syslog_differs(component_type, current, spec):
+    if current is None or spec is None:
+        return current != spec
+    if component_type == 'edges':
+        return (current['server'], current['protocol']) != (spec['server'], spec['protocol'])
+    return current != spec
+
+
+def get_components(session, targets, edge_names):
+    """
+    :return: A list of (component type, component id, name) tuples for all the components in the target set
+    """
+    components = []
+    if 'manager' in targets:
+        components.append(('manager', None, 'NSX Manager'))
+    if 'controllers' in targets:
+        controllers = session.read('nsxControllers')['body']
+        if controllers and controllers.get('controllers'):
+            for controller in session.normalize_list_return(controllers['controllers']['controller']):
+                components.append(('controllers', controller['id'], controller.get('name') or controller['id']))
+    if 'edges' in targets:
+        for edge in session.read_all_pages('nsxEdges', 'read'):
+            if not edge_names or edge['name'] in edge_names:
+                components.append(('edges', edge['objectId'], edge['name']))
+    return components
+
+
+def sync_component_syslog(session, component, spec, check_mode):
+    """
+    Reads the syslog configuration of one component and pushes the desired one if it differs
+    :return: A dictionary with the outcome and the read and push durations in seconds
+    """
+    component_type, component_id, name = component
+    get_syslog, set_syslog = SYSLOG_HANDLERS[component_type]
+    result = {'type': component_type, 'id': component_id, 'name': name, 'changed': False,
+              'read_seconds': None, 'push_seconds': None, 'error': None}
+    try:
+        read_start = time.time()
+        current = get_syslog(session, component_id)
+        result['read_seconds'] = round(time.time() - read_start, 3)
+        if syslog_differs(component_type, current, spec):
+            result['changed'] = True
+            if not check_mode:
+                push_start = time.time()
+                set_syslog(session, component_id, spec, current)
+                result['push_seconds'] = round(time.time() - push_start, 3)
+    except Exception as error:
+        result['error'] = str(error)
+    return result
+
+
+def sync_syslog(session, components, spec, concurrency, check_mode=False):
+    pool = ThreadPool(concurrency)
+    try:
+        return pool.map(lambda component: sync_component_syslog(session, component, spec, check_mode), components)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state=dict(default='present', choices=['present', 'absent']),
+            nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            targets=dict(default=SYSLOG_TARGETS, type='list'),
+            edges=dict(type='list'),
+            syslog_server=dict(),
+            syslog_port=dict(default=514),
+            syslog_protocol=dict(default='udp', choices=['udp', 'tcp']),
+            concurrency=dict(default=10, type='int')
+        ),
+        required_if=[['state', 'present', ['syslog_server']]],
+        supports_check_mode=True
+    )
+
+    from ansible.module_utils.nsx_client import get_nsx_client
+
+    invalid_targets = set(module.params['targets']) - set(SYSLOG_TARGETS)
+    if invalid_targets:
+        module.fail_json(msg='Invalid targets {}, valid targets are {}'.format(sorted(invalid_targets),
+                                                                               SYSLOG_TARGETS))
+
+    # errors are raised instead of exiting, so a failing component doesn't end the other worker threads
+    s = get_nsx_client(module, fail_mode='raise')
+
+    start = time.time()
+    components = get_components(s, module.params['targets'], module.params['edges'])
+    syslog_results = sync_syslog(s, components, syslog_spec(module), module.params['concurrency'],
+                                 module.check_mode)
+    total_seconds = round(time.time() - start, 3)
+
+    changed_components = [result['name'] for result in syslog_results if result['changed']]
+    failed_components = [result for result in syslog_results if result['error']]
+    if failed_components:
+        module.fail_json(msg='Failed to configure syslog on {}'.format(
+            ', '.join([result['name'] for result in failed_components])), syslog_results=syslog_results,
+            total_seconds=total_seconds)
+
+    module.exit_json(changed=len(changed_components) > 0, changed_components=changed_components,
+                     syslog_results=syslog_results, total_seconds=total_seconds)
+
+
+from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
+
+if __name__ == '__main__':
+    profiled(main)()
@@ -0,0 +1,546 @@
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright © 2015 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+EDGE_TYPES = {'dlr': 'distributedRouter', 'esg': 'gatewayServices'}
+
+EDGE_KINDS = dict((edge_type, kind) for kind, edge_type in EDGE_TYPES.items())
+
+EDGE_DEFAULTS = {'description': None, 'routes': [], 'default_gateway': None, 'default_gateway_adminDistance': '1',
+                 'username': None, 'password': None, 'remote_access': 'false', 'ha_enabled': 'false',
+                 'ha_deadtime': '15', 'firewall': 'true', 'appliance_size': 'large', 'ospf': None, 'requires': []}
+
+EDGE_REQUIRED = {'dlr': ['name', 'resourcepool_moid', 'datastore_moid', 'datacenter_moid', 'mgmt_portgroup_moid',
+                         'interfaces'],
+                 'esg': ['name', 'resourcepool_moid', 'datastore_moid', 'datacenter_moid', 'interfaces']}
+
+
+def step_name(kind, name, phase=None):
+    if phase:
+        return '{}:{}:{}'.format(kind, name, phase)
+    return '{}:{}'.format(kind, name)
+
+
+def edge_interfaces(kind, edge):
+    """
+    :return: A list of (interface key, interface) tuples. DLR interfaces are a list keyed by name, ESG interfaces a
+             dictionary keyed by vnic
+    """
+    if kind == 'dlr':
+        return [(iface.get('name') if isinstance(iface, dict) else None, iface) for iface in edge['interfaces']]
+    return sorted(edge['interfaces'].items())
+
+
+def check_topology(params):
+    """
+    :return: A list of the problems found in the topology spec, empty if the spec is valid
+    """
+    errors = []
+    switch_names = []
+    for switch in params['logical_switches']:
+        if not isinstance(switch, dict) or not switch.get('name'):
+            errors.append('Every logical switch needs at least a name: {}'.format(switch))
+            continue
+        if not (switch.get('transport_zone') or params['transport_zone']):
+            errors.append('The logical switch {} has no transport_zone and no default transport_zone '
+                          'is set'.format(switch['name']))
+        switch_names.append(switch['name'])
+
+    edge_names = []
+    for kind in ('dlr', 'esg'):
+        for edge in params[kind + 's']:
+            if not isinstance(edge, dict):
+                errors.append('Malformed {} Dictionary: {}'.format(kind.upper(), edge))
+                continue
+            missing = [key for key in EDGE_REQUIRED[kind] if not edge.get(key)]
+            if missing:
+                errors.append('The {} {} is missing {}'.format(kind.upper(), edge.get('name'), ', '.join(missing)))
+                continue
+            edge_names.append(edge['name'])
+            if kind == 'dlr' and not isinstance(edge['interfaces'], list):
+                errors.append('The interfaces of the DLR {} are not a list'.format(edge['name']))
+                continue
+            if kind == 'esg' and not isinstance(edge['interfaces'], dict):
+                errors.append('The interfaces of the ESG {} are not a dictionary'.format(edge['name']))
+                continue
+            for iface_key, iface in edge_interfaces(kind, edge):
+                if not isinstance(iface, dict):
+                    errors.append('Malformed Interface Dictionary on {}: {}'.format(edge['name'], iface))
+                elif not (iface.get('ip') and iface.get('prefix_len') and iface.get('iftype') and iface_key):
+                    errors.append('The interface {} of {} is missing one of: name, ip, prefix_len or '
+                                  'iftype'.format(iface_key, edge['name']))
+                elif bool(iface.get('logical_switch')) == bool(iface.get('portgroup_id')):
+                    errors.append('The interface {} of {} needs either a logical_switch or a portgroup_id, but not '
+                                  'both'.format(iface_key, edge['name']))
+            if edge.get('remote_access') == 'true' and not (edge.get('username') and edge.get('password')):
+                errors.append('if remote access is enabled on {}, username and password must be '
+                              'set'.format(edge['name']))
+            if edge.get('ospf') and not (isinstance(edge['ospf'], dict) and edge['ospf'].get('router_id')):
+                errors.append('The ospf settings of {} need at least a router_id'.format(edge['name']))
+
+    for names, kind in ((switch_names, 'logical switch'), (edge_names, 'edge')):
+        duplicates = sorted(set(name for name in names if names.count(name) > 1))
+        if duplicates:
+            errors.append('Duplicate {} names: {}'.format(kind, ', '.join(duplicates)))
+    return errors
+
+
+def get_scopes(session):
+    vdn_scopes = session.read('vdnScopes', 'read')['body']['vdnScopes']
+    if not vdn_scopes:
+        return {}
+    return dict((scope['name'], scope['objectId'])
+                for scope in session.normalize_list_return(vdn_scopes['vdnScope']))
+
+
+def ensure_logical_switch(session, scope_id, switch_index, switch):
+    def action(outputs):
+        existing = switch_index.by_name(switch['name'])
+        if existing:
+            return False, existing.object_id
+
+        lswitch_create_dict = session.extract_resource_body_example('logicalSwitches', 'create')
+        lswitch_create_dict['virtualWireCreateSpec']['controlPlaneMode'] = switch.get('control_plane_mode',
+                                                                                      'UNICAST_MODE')
+        lswitch_create_dict['virtualWireCreateSpec']['name'] = switch['name']
+        lswitch_create_dict['virtualWireCreateSpec']['description'] = switch.get('description')
+        lswitch_create_dict['virtualWireCreateSpec']['tenantId'] = 'Unused'
+        response = session.create('logicalSwitches', uri_parameters={'scopeId': scope_id},
+                                  request_body_dict=lswitch_create_dict)
+        return True, response['objectId'] or response['body']
+    return action
+
+
+def connected_to(outputs, switch_index, iface):
+    """
+    :return: The portgroup id or the id of the logical switch an interface connects to. Logical switches of the
+             topology are taken from the output of their step, others are looked up in the inventory
+    """
+    if iface.get('portgroup_id'):
+        return iface['portgroup_id']
+    switch_step = step_name('logical_switch', iface['logical_switch'])
+    if switch_step in outputs:
+        return outputs[switch_step]
+    existing = switch_index.by_name(iface['logical_switch'])
+    if not existing:
+        raise ValueError('The logical switch {} could not be found in NSX'.format(iface['logical_switch']))
+    return existing.object_id
+
+
+def address_groups(iface):
+    return {'addressGroup': {'primaryAddress': iface['ip'], 'subnetPrefixLength': iface['prefix_len']}}
+
+
+def edge_create_body(session, kind, edge, outputs, switch_index):
+    edge_body = session.extract_resource_body_example('nsxEdges', 'create')
+    edge_body['edge']['name'] = edge['name']
+    edge_body['edge']['description'] = edge['description']
+    edge_body['edge']['type'] = EDGE_TYPES[kind]
+    edge_body['edge']['datacenterMoid'] = edge['datacenter_moid']
+    edge_body['edge']['appliances']['appliance']['resourcePoolId'] = edge['resourcepool_moid']
+    edge_body['edge']['appliances']['appliance']['datastoreId'] = edge['datastore_moid']
+    if edge['username'] and edge['password']:
+        edge_body['edge']['cliSettings'] = {'password': edge['password'], 'remoteAccess': edge['remote_access'],
+                                            'userName': edge['username']}
+
+    if kind == 'dlr':
+        edge_body['edge']['mgmtInterface'] = {'connectedToId': edge['mgmt_portgroup_moid']}
+        edge_body['edge']['interfaces'] = {'interface': [
+            {'name': iface_key, 'type': iface['iftype'], 'isConnected': 'True',
+             'connectedToId': connected_to(outputs, switch_index, iface), 'addressGroups': address_groups(iface)}
+            for iface_key, iface in edge_interfaces(kind, edge)]}
+        del edge_body['edge']['vnics']
+        del edge_body['edge']['appliances']['appliance']['hostId']
+        del edge_body['edge']['appliances']['appliance']['customField']
+    else:
+        edge_body['edge']['appliances']['applianceSize'] = edge['appliance_size']
+        edge_body['edge']['appliances']['appliance']['customField']['key'] = 'system.service.vmware.vsla.main01'
+        edge_body['edge']['appliances']['appliance']['customField']['value'] = 'string'
+        vnics = []
+        for iface_key, iface in edge_interfaces(kind, edge):
+            fence_param = None
+            if 'fence_param' in iface:
+                fence_key, fence_val = iface['fence_param'].split('=')
+                fence_param = {'key': fence_key, 'value': fence_val}
+            vnics.append({'name': iface.get('name', iface_key), 'index': iface_key[-1:], 'isConnected': 'true',
+                          'type': iface['iftype'], 'portgroupId': connected_to(outputs, switch_index, iface),
+                          'fenceParameter': fence_param, 'addressGroups': address_groups(iface)})
+        edge_body['edge']['vnics']['vnic'] = vnics
+    return edge_body
+
+
+def ensure_edge(session, kind, edge, edge_index, switch_index):
+    """
+    Deploys the edge if no edge with its name exists. The interfaces of existing edges are left as they are,
+    nsx_dlr and nsx_edge_router reconcile them
+    """
+    def action(outputs):
+        existing = edge_index.by_name(edge['name'])
+        if existing:
+            if existing.get('edgeType') != EDGE_TYPES[kind]:
+                raise ValueError('The edge {} exists, but is of type {}'.format(edge['name'],
+                                                                              existing.get('edgeType')))
+            return False, existing.object_id
+        response = session.create('nsxEdges', request_body_dict=edge_create_body(session, kind, edge, outputs,
+                                                                                   switch_index))
+        return True, response['objectId']
+    return action
+
+
+def desired_routes(edge):
+    return [{'network': route['network'], 'nextHop': route['next_hop'],
+             'adminDistance': str(route.get('admin_distance', '1')), 'mtu': str(route.get('mtu', '1500')),
+             'description': route.get('description')} for route in edge['routes']]
+
+
+def route_key(route):
+    return tuple(route.get(key) for key in ('network', 'nextHop', 'adminDistance', 'mtu', 'description'))
+
+
+def configure_static_routing(session, edge_id, edge):
+    rtg_cfg = session.read('routingConfigStatic', uri_parameters={'edgeId': edge_id})['body']
+    static_routes = rtg_cfg['staticRouting']['staticRoutes']
+    current_routes = session.normalize_list_return(static_routes['route']) if static_routes else []
+    routes = desired_routes(edge)
+    changed = sorted(map(route_key, current_routes)) != sorted(map(route_key, routes))
+    if changed:
+        rtg_cfg['staticRouting']['staticRoutes'] = {'route': routes} if routes else None
+
+    current_dfgw = rtg_cfg['staticRouting'].get('defaultRoute') or {}
+    if edge['default_gateway']:
+        if current_dfgw.get('gatewayAddress') != edge['default_gateway'] or \
+                current_dfgw.get('adminDistance') != edge['default_gateway_adminDistance']:
+            current_dfgw.update(gatewayAddress=edge['default_gateway'],
+                                adminDistance=edge['default_gateway_adminDistance'])
+            current_dfgw.setdefault('mtu', '1500')
+            rtg_cfg['staticRouting']['defaultRoute'] = current_dfgw
+            changed = True
+    elif current_dfgw.get('gatewayAddress'):
+        rtg_cfg['staticRouting']['defaultRoute'] = None
+        changed = True
+
+    if changed:
+        session.update('routingConfigStatic', uri_parameters={'edgeId': edge_id}, request_body_dict=rtg_cfg)
+    return changed
+
+
+def configure_edge(session, kind, edge):
+    """
+    Applies HA, firewall and static routing one after the other, as NSX publishes the configuration of an edge
+    one change at a time
+    """
+    def action(outputs):
+        edge_id = outputs[step_name(kind, edge['name'])]
+        changed = False
+
+        ha_config = session.read('highAvailability', uri_parameters={'edgeId': edge_id})['body']
+        if ha_config['highAvailability']['enabled'] != edge['ha_enabled']:
+            ha_body = session.extract_resource_body_example('highAvailability', 'update')
+            ha_body['highAvailability']['declareDeadTime'] = edge['ha_deadtime']
+            ha_body['highAvailability']['enabled'] = edge['ha_enabled']
+            session.update('highAvailability', uri_parameters={'edgeId': edge_id}, request_body_dict=ha_body)
+            changed = True
+
+        if kind == 'esg':
+            firewall_body = session.read('nsxEdgeFirewallConfig', uri_parameters={'edgeId': edge_id})['body']
+            if firewall_body['firewall']['enabled'] != edge['firewall']:
+                firewall_body['firewall']['enabled'] = edge['firewall']
+                session.update('nsxEdgeFirewallConfig', uri_parameters={'edgeId': edge_id},
+                               request_body_dict=firewall_body)
+                changed = True
+
+        if configure_static_routing(session, edge_id, edge):
+            changed = True
+        return changed, edge_id
+    return action
+
+
+def desired_ospf_areas(ospf):
+    areas = []
+    for area in ospf.get('areas') or []:
+        new_area = {'areaId': str(area['area_id']), 'type': area.get('type', 'normal'),
+                    'authentication': {'type': area.get('authentication', 'none')}}
+        if new_area['authentication']['type'] in ['password', 'md5']:
+            new_area['authentication']['value'] = area.get('password')
+        areas.append(new_area)
+    return areas
+
+
+def desired_ospf_interfaces(ospf):
+    return [{'vnic': str(area_map['vnic']), 'areaId': str(area_map['area_id']),
+             'helloInterval': str(area_map.get('hello', '10')), 'deadInterval': str(area_map.get('dead', '40')),
+             'cost': str(area_map.get('cost', '1')), 'priority': str(area_map.get('priority', '128')),
+             'mtuIgnore': str(area_map.get('ignore_mtu', 'false')).lower()}
+            for area_map in ospf.get('area_map') or []]
+
+
+OSPF_INTERFACE_KEYS = ('vnic', 'areaId', 'helloInterval', 'deadInterval', 'cost', 'priority', 'mtuIgnore')
+
+
+def ospf_area_key(area):
+    authentication = area.get('authentication') or {}
+    return area.get('areaId'), area.get('type'), authentication.get('type'), authentication.get('value')
+
+
+def ospf_interface_key(interface):
+    return tuple(interface.get(key) for key in OSPF_INTERFACE_KEYS)
+
+
+def ospf_keys(session, container, key, item_key):
+    return sorted(map(item_key, session.normalize_list_return(container[key] if container else None)))
+
+
+def configure_ospf(session, kind, edge):
+    def action(outputs):
+        edge_id = outputs[step_name(kind, edge['name'], 'config')]
+        ospf = edge['ospf']
+        current_config = session.read('routingConfig', uri_parameters={'edgeId': edge_id})['body']
+        routing = current_config['routing']
+        global_config = routing['routingGlobalConfig']
+        current_ospf = routing['ospf'] or {}
+
+        desired = {'enabled': 'true',
+                   'gracefulRestart': str(ospf.get('graceful_restart', True)).lower(),
+                   'defaultOriginate': str(ospf.get('default_originate', False)).lower(),
+                   'protocolAddress': ospf.get('protocol_address'),
+                   'forwardingAddress': ospf.get('forwarding_address')}
+        areas = desired_ospf_areas(ospf)
+        interfaces = desired_ospf_interfaces(ospf)
+
+        changed = global_config.get('routerId') != ospf['router_id'] or \
+            global_config.get('ecmp') != ospf.get('ecmp', 'false') or \
+            [current_ospf.get(key) for key in desired] != list(desired.values()) or \
+            ospf_keys(session, current_ospf.get('ospfAreas'), 'ospfArea', ospf_area_key) != \
+            sorted(map(ospf_area_key, areas)) or \
+            ospf_keys(session, current_ospf.get('ospfInterfaces'), 'ospfInterface', ospf_interface_key) != \
+            sorted(map(ospf_interface_key, interfaces))
+        if not changed:
+            return False, edge_id
+
+        global_config['routerId'] = ospf['router_id']
+        global_config['ecmp'] = ospf.get('ecmp', 'false')
+        current_ospf.update(desired)
+        current_ospf['ospfAreas'] = {'ospfArea': areas} if areas else None
+        current_ospf['ospfInterfaces'] = {'ospfInterface': interfaces} if interfaces else None
+        routing['ospf'] = current_ospf
+        session.update('routingConfig', uri_parameters={'edgeId': edge_id}, request_body_dict=current_config)
+        return True, edge_id
+    return action
+
+
+def topology_steps(session, params):
+    """
+    Builds the steps creating the topology. Logical switches have no requirements, an edge requires the logical
+    switches of the topology its interfaces connect to, its configuration requires the edge and OSPF requires the
+    configuration. Extra requirements can be added with 'requires' on an edge
+    """
+    from ansible.module_utils.nsx_dag import Step
+    from ansible.module_utils.nsx_inventory import build_index, inventory_index
+
+    switch_index = inventory_index(session, 'logicalSwitchesGlobal')
+    edge_index = build_index(session, 'nsxEdges', fields=('edgeType',))
+    scopes = get_scopes(session) if params['logical_switches'] else {}
+
+    steps = []
+    for switch in params['logical_switches']:
+        transport_zone = switch.get('transport_zone') or params['transport_zone']
+        if transport_zone not in scopes:
+            raise ValueError('The transport zone with the name {} could not be found in NSX'.format(transport_zone))
+        steps.append(Step(step_name('logical_switch', switch['name']),
+                          ensure_logical_switch(session, scopes[transport_zone], switch_index, switch)))
+
+    switch_steps = set(step.name for step in steps)
+    for kind in ('dlr', 'esg'):
+        for edge in params[kind + 's']:
+            edge = dict(EDGE_DEFAULTS, **edge)
+            requires = [step_name('logical_switch', iface['logical_switch'])
+                        for _, iface in edge_interfaces(kind, edge) if iface.get('logical_switch')]
+            requires = sorted(set(name for name in requires if name in switch_steps)) + list(edge['requires'])
+            steps.append(Step(step_name(kind, edge['name']),
+                              ensure_edge(session, kind, edge, edge_index, switch_index), requires))
+            steps.append(Step(step_name(kind, edge['name'], 'config'), configure_edge(session, kind, edge),
+                              [step_name(kind, edge['name'])]))
+            if edge['ospf']:
+                steps.append(Step(step_name(kind, edge['name'], 'ospf'), configure_ospf(session, kind, edge),
+                                  [step_name(kind, edge['name'], 'config')]))
+    return steps
+
+
+def topology_ids(params, results):
+    """
+    :return: The ids of the logical switches, DLRs and ESGs of the topology that exist, by name
+    """
+    object_ids = {}
+    for kind, key in (('logical_switch', 'logical_switches'), ('dlr', 'dlrs'), ('esg', 'esgs')):
+        object_ids[key] = {}
+        for item in params[key]:
+            result = results[step_name(kind, item['name'])]
+            if result['state'] in ('ok', 'changed'):
+                object_ids[key][item['name']] = result['output']
+    return object_ids
+
+
+def check_teardown(params):
+    """
+    :return: A list of the problems found in the spec of a teardown, empty if the spec is valid
+    """
+    errors = []
+    for key in ('logical_switches', 'dlrs', 'esgs'):
+        for item in params[key]:
+            if not isinstance(item, dict) or not item.get('name'):
+                errors.append('Every entry of {} needs at least a name: {}'.format(key, item))
+    if params['name_prefix'] is not None and not params['name_prefix'].strip():
+        errors.append('name_prefix must not be empty, it would match every logical switch and edge')
+    if not (params['logical_switches'] or params['dlrs'] or params['esgs'] or params['name_prefix']):
+        errors.append('Nothing to tear down, pass logical_switches, dlrs, esgs or a name_prefix')
+    return errors
+
+
+def connected_switches(edge):
+    """
+    :return: The names of the logical switches the interfaces in the spec of an edge connect to, or None if the
+             spec has no usable interfaces
+    """
+    interfaces = edge.get('interfaces')
+    if isinstance(interfaces, dict):
+        interfaces = list(interfaces.values())
+    if not interfaces or not isinstance(interfaces, list) or \
+            not all(isinstance(iface, dict) for iface in interfaces):
+        return None
+    return [iface.get('logical_switch') for iface in interfaces if iface.get('logical_switch')]
+
+
+def delete_object(session, resource, uri_parameter, object_id):
+    def action(outputs):
+        session.delete(resource, uri_parameters={uri_parameter: object_id})
+        return True, object_id
+    return action
+
+
+def teardown_steps(session, params):
+    """
+    Builds the steps deleting the topology, from a single read of the logical switch and edge inventory. The
+    objects deleted are the ones named in the spec, plus every logical switch and edge whose name starts with
+    name_prefix. Edges are deleted first, in parallel. A logical switch is deleted once the edges of the teardown
+    connected to it are gone. The interfaces of edges only found by their name prefix are not read, so every
+    logical switch waits for them
+    :return: A tuple of the steps and a list of (spec key, name, step name) tuples of the objects found
+    """
+    from ansible.module_utils.nsx_dag import Step
+    from ansible.module_utils.nsx_inventory import build_index
+
+    prefix = params['name_prefix']
+    switch_index = build_index(session, 'logicalSwitchesGlobal')
+    edge_index = build_index(session, 'nsxEdges', fields=('edgeType',))
+
+    # name, kind, record and the names of the logical switches connected, None if not known
+    edges = []
+    for kind in ('dlr', 'esg'):
+        for edge in params[kind + 's']:
+            record = edge_index.by_name(edge['name'])
+            if record:
+                edges.append((edge['name'], kind, record, connected_switches(edge)))
+    if prefix:
+        spec_edges = set(edge[0] for edge in edges)
+        for record in sorted(edge_index, key=lambda record: record.name):
+            if record.name.startswith(prefix) and record.name not in spec_edges:
+                edges.append((record.name, EDGE_KINDS.get(record.get('edgeType'), 'edge'), record, None))
+
+    switches = [(switch['name'], switch_index.by_name(switch['name'])) for switch in params['logical_switches']]
+    switches = [(name, record) for name, record in switches if record]
+    if prefix:
+        spec_switches = set(name for name, _ in switches)
+        switches.extend((record.name, record) for record in sorted(switch_index, key=lambda record: record.name)
+                        if record.name.startswith(prefix) and record.name not in spec_switches)
+
+    steps = []
+    targets = []
+    for name, kind, record, _ in edges:
+        steps.append(Step(step_name(kind, name, 'delete'),
+                          delete_object(session, 'nsxEdge', 'edgeId', record.object_id)))
+        targets.append((kind + 's', name, steps[-1].name))
+    for name, record in switches:
+        requires = [step_name(kind, edge_name, 'delete') for edge_name, kind, _, edge_switches in edges
+                    if edge_switches is None or name in edge_switches]
+        steps.append(Step(step_name('logical_switch', name, 'delete'),
+                          delete_object(session, 'logicalSwitch', 'virtualWireID', record.object_id), requires))
+        targets.append(('logical_switches', name, steps[-1].name))
+    return steps, targets
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state=dict(default='present', choices=['present', 'absent']),
+            nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            name_prefix=dict(),
+            transport_zone=dict(),
+            logical_switches=dict(default=[], type='list'),
+            dlrs=dict(default=[], type='list'),
+            esgs=dict(default=[], type='list'),
+            concurrency=dict(default=10, type='int')
+        ),
+        supports_check_mode=False
+    )
+
+    if module.params['state'] == 'absent':
+        errors = check_teardown(module.params)
+    else:
+        errors = check_topology(module.params)
+    if errors:
+        module.fail_json(msg='Invalid topology: {}'.format('; '.join(errors)))
+
+    from ansible.module_utils.nsx_client import get_nsx_client
+    from ansible.module_utils.nsx_dag import DagError, dag_report, run_steps
+    from nsxramlclient.exceptions import NsxError
+
+    # errors are raised instead of exiting, so a failing step only stops the steps depending on it
+    session = get_nsx_client(module, fail_mode='raise')
+
+    try:
+        if module.params['state'] == 'absent':
+            steps, targets = teardown_steps(session, module.params)
+        else:
+            steps = topology_steps(session, module.params)
+        results = run_steps(steps, module.params['concurrency'])
+    except (DagError, ValueError) as error:
+        module.fail_json(msg=str(error))
+    except NsxError as error:
+        module.fail_json(msg='Reading the NSX inventory failed: {}'.format(error))
+
+    report = dag_report(steps, results)
+    if module.params['state'] == 'absent':
+        object_ids = dict((key, {}) for key in ('logical_switches', 'dlrs', 'esgs', 'edges'))
+        for key, name, step in targets:
+            if results[step]['state'] == 'changed':
+                object_ids[key][name] = results[step]['output']
+    else:
+        object_ids = topology_ids(module.params, results)
+    failed = [name for name, result in results.items() if result['state'] == 'failed']
+    if failed:
+        module.fail_json(msg='{} of {} steps failed: {}'.format(len(failed), len(steps), ', '.join(sorted(failed))),
+                         object_ids=object_ids, **report)
+
+    module.exit_json(changed=any(result['state'] == 'changed' for result in results.values()),
+                     object_ids=object_ids, **report)
+
+
+from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
+if __name__ == '__main__':
+    profiled(main)()
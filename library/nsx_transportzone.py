@@ -20,7 +20,11 @@
 __author__ = 'yfauser'
 
 
-def retrieve_scope(session, tz_name):
+def retrieve_scope(session, tz_name, nsx_facts=None):
+    scope_facts = fact_record(session, nsx_facts, 'transport_zones', tz_name)
+    if scope_facts:
+        return scope_facts['id']
+
     vdn_scopes = session.read('vdnScopes', 'read')['body']
     try:
         vdn_scope_dict_list = vdn_scopes['vdnScopes']['vdnScope']
@@ -51,15 +55,15 @@ def get_vdnscope_properties(session, vdn_scope):
     return vdnscope_properties
 
 
-def check_scope_states(session, tz_name):
-    if not retrieve_scope(session, tz_name):
+def check_scope_states(session, tz_name, nsx_facts=None):
+    if not retrieve_scope(session, tz_name, nsx_facts):
         return 'absent'
     else:
         return 'present'
 
 
 def state_delete_scope(session, module):
-    vdn_scope = retrieve_scope(session, module.params['name'])
+    vdn_scope = retrieve_scope(session, module.params['name'], module.params['nsx_facts'])
     if not module.check_mode:
         session.delete('vdnScope', uri_parameters={'scopeId': vdn_scope})
     module.exit_json(changed=True)
@@ -115,7 +119,7 @@ def scope_cluster_change(session, vdn_scope_id, module, cluster_list):
 
 
 def state_check_scope_update(session, module):
-    vdn_scope_id = retrieve_scope(session, module.params['name'])
+    vdn_scope_id = retrieve_scope(session, module.params['name'], module.params['nsx_facts'])
     vdn_props = get_vdnscope_properties(session, vdn_scope_id)
     changed_property = False
     changed_cluster_list = False
@@ -149,6 +153,7 @@ def main():
         argument_spec=dict(
             state=dict(default='present', choices=['present', 'absent']),
             nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            nsx_facts=dict(type='dict'),
             name=dict(required=True, type='str'),
             description=dict(type='str'),
             controlplanemode=dict(default='UNICAST_MODE',
@@ -159,10 +164,9 @@ def main():
         supports_check_mode=True
     )
 
-    from nsxramlclient.client import NsxClient
+    from ansible.module_utils.nsx_client import get_nsx_client
 
-    s = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                  module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    s = get_nsx_client(module)
 
     scope_state = {'absent':
                        {'absent': state_exit_unchanged,
@@ -171,13 +175,16 @@ def main():
                        {'absent': state_create_scope,
                         'present': state_check_scope_update}
                    }
-    scope_state[module.params['state']][check_scope_states(s, module.params['name'])](s, module)
+    current_state = check_scope_states(s, module.params['name'], module.params['nsx_facts'])
+    scope_state[module.params['state']][current_state](s, module)
 
     module.exit_json(changed=False)
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_inventory import fact_record
+from ansible.module_utils.nsx_profile import profiled
 
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
@@ -115,16 +115,16 @@ def main():
                                                             'LOADBALANCE_SRCID',
                                                             'LOADBALANCE_SRCMAC'
                                                             'LACP_V2']),
-            mtu=dict(default=1600)
+            mtu=dict(default=1600),
+            async_job=dict(default=False, type='bool')
         ),
         mutually_exclusive=['ippool_id', 'ippool_name'],
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
+    from ansible.module_utils.nsx_client import get_nsx_client
 
-    s = NsxClient(module.params['nsxmanager_spec']['raml_file'], module.params['nsxmanager_spec']['host'],
-                  module.params['nsxmanager_spec']['user'], module.params['nsxmanager_spec']['password'])
+    s = get_nsx_client(module)
 
     vxlan_status = get_cluster_status(s, module.params['cluster_moid'])
 
@@ -144,13 +144,17 @@ def main():
         vxlan_prep_response = vxlan_prep(s, module.params['cluster_moid'], module.params['dvs_moid'],
                                          module.params['ippool_id'], module.params['vlan_id'],
                                          module.params['vmknic_count'], module.params['teaming'], module.params['mtu'])
+        if module.params['async_job']:
+            module.exit_json(changed=True, vxlan_prep_response=vxlan_prep_response,
+                             jobs=[{'type': 'task_framework', 'id': vxlan_prep_response, 'status': 'COMPLETED'}])
         wait_for_job_completion(s, vxlan_prep_response, completion_status='COMPLETED')
         module.exit_json(changed=True, vxlan_prep_response=vxlan_prep_response)
 
     module.exit_json(changed=False, vxlan_status=vxlan_status)
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    profiled(main)()
\ No newline at end of file
@@ -1,340 +1,382 @@
-#!/usr/bin/env python
-# coding=utf-8
-#
-# Copyright ï¿½ 2015 VMware, Inc. All Rights Reserved.
-#
-# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
-# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
-# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
-# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
-#
-# The above copyright notice and this permission notice shall be included in all copies or substantial portions
-# of the Software.
-#
-# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
-# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
-# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
-# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
-# IN THE SOFTWARE.
-
-import paramiko
-
-
-def get_certificate_id(client_session, edge_id):
-    '''Get certificate id of edge router require for application profile in load balancer'''
-    certificate_res = client_session.read('certificateScope',
-                            uri_parameters={'scopeId': edge_id})['body']['certificates']['certificate']
-    certificate_id = certificate_res['objectId']
-    return certificate_id
-
-def lb_config(client_session, module, edge_id):
-    lb_config_body = client_session.extract_resource_body_schema('loadBalancer', 'update')
-    lb_config_body['loadBalancer']['enabled']='true'
-
-    certificate_id = get_certificate_id(client_session, edge_id)
-    app_profiles=[{'applicationProfileId': 'applicationProfile-1',
-                   'name': module.params['app_profile_name_https'],
-                   'insertXForwardedFor': 'false',
-                   'sslPassthrough':'false', 'template':'HTTPS',
-                   'serverSslEnabled': 'true', 'clientSsl': 
-                            {'clientAuth': 'ignore',
-                        'serviceCertificate': certificate_id}},
-                  {'applicationProfileId': 'applicationProfile-2',
-                   'name': module.params['app_profile_name_tcp'],
-                   'insertXForwardedFor': 'false',
-                   'sslPassthrough':'false','template':'TCP',
-                   'serverSslEnabled':'false'}]
-
-    lb_config_body['loadBalancer']['applicationProfile'] = app_profiles
-
-    lb_config_body['loadBalancer']['monitor'] = {'name': module.params['monitor_name'],
-                                'type': module.params['monitor_type'],
-                                'interval': module.params['monitor_interval'],
-                                 'timeout': module.params['monitor_time_out'],
-                                 'maxRetries': module.params['monitor_retries'],
-                                 'method': module.params['monitor_url_method'],
-                                 'url': module.params['monitor_url']}
-    http_script = 'acl {}_down nbsrv({}) eq 0 \n use_backend {} if {}_down'.format(module.params['psc_1_http_pool_name'],
-                                        module.params['psc_1_http_pool_name'],
-                                        module.params['psc_2_http_pool_name'],
-                                        module.params['psc_1_http_pool_name'],
-                                        )
-
-    tcp_script = 'acl {}_down nbsrv({}) eq 0 \n use_backend {} if {}_down'.format(module.params['psc_1_tcp_pool_name'],
-                                        module.params['psc_1_tcp_pool_name'],
-                                        module.params['psc_2_tcp_pool_name'],
-                                        module.params['psc_1_tcp_pool_name'],
-                                        )
-
-    app_rules = [{'name': module.params['app_rule_name_http'],
-                  'script': http_script},
-                 {'name': module.params['app_rule_name_tcp'],
-                  'script': tcp_script}]
-
-    lb_config_body['loadBalancer']['applicationRule']=app_rules
-    del lb_config_body['loadBalancer']['virtualServer']
-    del lb_config_body['loadBalancer']['pool']
-    return client_session.update('loadBalancer',
-                         uri_parameters={'edgeId': edge_id},
-                         request_body_dict=lb_config_body)
-
-def get_monitor_id(client_session, monitor_name, edge_id):
-    monitor_res = client_session.read('lbMonitors',
-        uri_parameters={'edgeId': edge_id})['body']['loadBalancer']['monitor']
-    if isinstance(monitor_res, list):
-        try:
-            monitor_id = [monitor_info['monitorId'] for monitor_info in monitor_res if monitor_info['name'] == 'tcp_monitor']
-        except IndexError:
-            return None
-    else:
-        if monitor_res['name'] == monitor_name:
-            monitor_id = monitor_res['monitorId']
-    return monitor_id
-
-def get_application_rule_id(client_session, app_rule_name, edge_id):
-    app_rules_res = client_session.read('appRules',
-    uri_parameters={'edgeId': edge_id})['body']['loadBalancer']['applicationRule']
-    try:
-        app_rule_id = [app_rule_info['applicationRuleId'] for app_rule_info in app_rules_res if app_rule_info['name'] == app_rule_name][0]
-    except IndexError:
-        return None
-
-    return app_rule_id
-
-def get_application_profile_id(client_session, profile_type, edge_id):
-    app_profiles_res = client_session.read('applicationProfiles',
-        uri_parameters={'edgeId': edge_id})['body']['loadBalancer']['applicationProfile']
-    try:
-        app_profile_id = [app_profile_info['applicationProfileId'] for app_profile_info in app_profiles_res if app_profile_info['template'] == profile_type][0]
-    except IndexError:
-        return None
-    return app_profile_id
-
-def get_pool_id(client_session, pool_name, edge_id):
-    pools_res = client_session.read('pools',
-        uri_parameters={'edgeId': edge_id})['body']['loadBalancer']['pool']
-
-    try:
-        pool_id = [pool_info['poolId'] for pool_info in pools_res if pool_info['name'] == pool_name][0]
-    except IndexError:
-        return None
-    return pool_id
-
-def add_virtual_servers(client_session, module, edge_id):
-    virtual_server_config_body = client_session.extract_resource_body_schema(
-                                                'virtualServers', 'create')
-
-    https_app_profile_id= get_application_profile_id(client_session,
-                                                     'HTTPS', edge_id)
-    tcp_app_profile_id= get_application_profile_id(client_session,
-                                                   'TCP', edge_id)
-
-    https_pool_id = get_pool_id(client_session,
-                               module.params['psc_1_http_pool_name'], edge_id)
-    http_pool_id = get_pool_id(client_session,
-                              module.params['psc_1_tcp_pool_name'], edge_id)
-
-    http_app_rule_id = get_application_rule_id(client_session,
-                                module.params['app_rule_name_http'], edge_id)
-    tcp_app_rule_id = get_application_rule_id(client_session,
-                                module.params['app_rule_name_tcp'], edge_id)
-
-    virtual_servers=[{'applicationProfileId': https_app_profile_id,
-                      'name': module.params['https_virtual_server_name'],
-            'enabled':'true', 'ipAddress': module.params['virtual_ip_address'],
-            'protocol':'https', 'port': module.params['https_virtual_server_port'],
-            'defaultPoolId': https_pool_id, 'applicationRuleId': http_app_rule_id
-            },
-            {'applicationProfileId': tcp_app_profile_id,
-            'name': module.params['tcp_virtual_server_name'],
-            'enabled':'true', 'ipAddress': module.params['virtual_ip_address'],
-            'protocol':'tcp',
-            'port': module.params['tcp_virtual_server_port'],
-            'defaultPoolId': http_pool_id, 'applicationRuleId': tcp_app_rule_id}]
-
-    for virtual_server_info in virtual_servers:
-        virtual_server_config_body['virtualServer'] = virtual_server_info
-        virtual_servers_res = client_session.create('virtualServers',
-                                uri_parameters={'edgeId': edge_id},
-                         request_body_dict=virtual_server_config_body)
-    return virtual_servers_res
-
-def add_pools(client_session, module, edge_id):
-    '''Function to add pools for load balancer
-    inputs:
-        client_session: client session of NSX
-            type: object
-        edge_id: NSX edge id
-            type: string
-    '''
-    pool_config_body = client_session.extract_resource_body_schema('pools',
-                                                                'create')
-    # Get monitor id
-    monitor_id = get_monitor_id(client_session, module.params['monitor_name'],
-                                                    edge_id)
-    pools_dict = [{'name': module.params['psc_1_http_pool_name'],
-        'algorithm':'round-robin', 'transparent':'false', 'monitorId':monitor_id,
-        'member': {'name': module.params['psc_1_http_pool_member_name'],
-                   'ipAddress': module.params['psc_1_http_pool_member_ip'],
-                   'monitorPort': module.params['psc_1_http_pool_monitor_port']}},
-             {'name': module.params['psc_1_tcp_pool_name'],
-              'algorithm':'round-robin', 'transparent':'false',
-              'monitorId': monitor_id,
-              'member': {'name': module.params['psc_1_tcp_pool_member_name'],
-                'ipAddress': module.params['psc_1_tcp_pool_member_ip'],
-                'monitorPort': module.params['psc_1_tcp_pool_monitor_port']}},
-
-             {'name':module.params['psc_2_http_pool_name'],
-              'algorithm':'round-robin', 'transparent':'false',
-              'monitorId':monitor_id,
-              'member': {'name': module.params['psc_2_http_pool_member_name'],
-                    'ipAddress':module.params['psc_2_http_pool_member_ip'],
-                'monitorPort':module.params['psc_2_http_pool_monitor_port']}},
-
-             {'name':module.params['psc_2_tcp_pool_name'], 'algorithm':'round-robin',
-              'transparent':'false', 'monitorId':monitor_id,
-              'member': {'name': module.params['psc_2_tcp_pool_member_name'],
-                        'ipAddress':module.params['psc_2_tcp_pool_member_ip'],
-                  'monitorPort':module.params['psc_2_tcp_pool_monitor_port']}}]
-
-    for pool_info in pools_dict:
-        pool_config_body['pool'] = pool_info
-        add_pools_res = client_session.create('pools',
-                                    uri_parameters={'edgeId': edge_id},
-                         request_body_dict=pool_config_body)
-    return add_pools_res
-
-def get_edge_id(session, edge_name):
-    router_res = session.read('nsxEdges', 'read')['body']
-    edge_summary_list = router_res['pagedEdgeList']['edgePage']['edgeSummary']
-    if isinstance(edge_summary_list, list):
-        for edge_summary in edge_summary_list:
-            if edge_name.lower() in edge_summary['name'].lower():
-                edge_id = edge_summary['objectId']
-                return edge_id
-    else:
-        edge_id = router_res['pagedEdgeList']['edgePage']['edgeSummary']['objectId']
-        return edge_id
-
-
-def disable_firewall(session, edge_id):
-    '''Disable firewall'''
-    disable_firewall_body = session.extract_resource_body_schema(
-                                            'nsxEdgeFirewallConfig', 'update')
-    disable_firewall_body['firewall']['enabled']='false'
-
-    del disable_firewall_body['firewall']['defaultPolicy']
-    del disable_firewall_body['firewall']['globalConfig']
-    del disable_firewall_body['firewall']['rules']
-
-    return session.update('nsxEdgeFirewallConfig',
-                          uri_parameters={'edgeId': edge_id},
-                          request_body_dict=disable_firewall_body)
-
-def psc_session(module):
-    try:
-        transport = paramiko.Transport(module.params['psc_1_http_pool_member_ip'],
-                                                        22)
-        transport.connect(username='root', password=module.params['psc_password'])
-        sftp = paramiko.SFTPClient.from_transport(transport)
-    except:
-        module.fail_json(msg='Transport connection to the PSC failed.')
-
-    return sftp
-
-def get_certificate(module, path):
-    sftp = psc_session(module)
-    file_obj = sftp.open(path, 'r')
-    certificate = file_obj.read()
-    return certificate
-
-
-def add_certificates(module, client_session, edge_id):
-    '''Add certificates to the Edge Services Gateway'''
-
-    pemEncoding = get_certificate(module, '/ha/lb.crt')
-    private_key = get_certificate(module, '/ha/lb_rsa.key')
-    certificate_body = client_session.extract_resource_body_schema(
-                                            'certificateSelfSigned', 'create')
-    certificate_body['trustObject']['pemEncoding']=pemEncoding
-    certificate_body['trustObject']['privateKey']=private_key
-    certificate_body['trustObject']['passphrase']=module.params['psc_password']
-    return client_session.create('certificateSelfSigned',
-                          uri_parameters={'scopeId': edge_id},
-                          request_body_dict=certificate_body)
-
-
-def main():
-    module = AnsibleModule(
-        argument_spec=dict(
-            state=dict(default='present', choices=['present', 'absent']),
-            nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
-            nsx_edge_gateway_name=dict(required=True),
-
-            app_profile_name_https=dict(required=True),
-            app_profile_name_tcp=dict(required=True),
-
-            monitor_name=dict(required=True),
-            monitor_type=dict(required=True),
-            monitor_interval=dict(required=True),
-            monitor_time_out=dict(required=True),
-            monitor_retries=dict(required=True),
-            monitor_url_method=dict(required=True),
-            monitor_url=dict(required=True),
-
-            psc_1_http_pool_name=dict(required=True),
-            psc_1_http_pool_member_name=dict(required=True),
-            psc_1_http_pool_member_ip=dict(required=True),
-            psc_1_http_pool_monitor_port=dict(required=True),
-
-            psc_2_http_pool_name=dict(required=True),
-            psc_2_http_pool_member_name=dict(required=True),
-            psc_2_http_pool_member_ip=dict(required=True),
-            psc_2_http_pool_monitor_port=dict(required=True),
-
-            psc_1_tcp_pool_name=dict(required=True),
-            psc_1_tcp_pool_member_name=dict(required=True),
-            psc_1_tcp_pool_member_ip=dict(required=True),
-            psc_1_tcp_pool_monitor_port=dict(required=True),
-
-            psc_2_tcp_pool_name=dict(required=True),
-            psc_2_tcp_pool_member_name=dict(required=True),
-            psc_2_tcp_pool_member_ip=dict(required=True),
-            psc_2_tcp_pool_monitor_port=dict(required=True),
-
-            https_virtual_server_name=dict(required=True),
-            virtual_ip_address=dict(required=True),
-            https_virtual_server_port=dict(required=True),
-
-            tcp_virtual_server_name=dict(required=True),
-            tcp_virtual_server_port=dict(required=True),
-
-            app_rule_name_http=dict(required=True),
-            app_rule_name_tcp=dict(required=True),
-
-            psc_password=dict(required=True),
-            ),
-        supports_check_mode=False
-    )
-
-    from nsxramlclient.client import NsxClient
-    client_session=NsxClient(module.params['nsxmanager_spec']['raml_file'],
-                             module.params['nsxmanager_spec']['host'],
-                             module.params['nsxmanager_spec']['user'],
-                             module.params['nsxmanager_spec']['password'])
-
-    edge_id = get_edge_id(client_session, module.params['nsx_edge_gateway_name'])
-    disable=disable_firewall(client_session, edge_id)
-
-    cert_status = add_certificates(module, client_session, edge_id)
-
-    loadBalancer_config = lb_config(client_session, module, edge_id)
-    update_pool_res = add_pools(client_session, module, edge_id)
-    virtual_servers = add_virtual_servers(client_session, module, edge_id)
-    module.exit_json(changed=True, argument_spec=module.params['state'],
-                     virtual_servers=virtual_servers)
-
-
-from ansible.module_utils.basic import *
-if __name__ == '__main__':
-    main()
+#!/usr/bin/env python
+# coding=utf-8
+#
+# Copyright ï¿½ 2015 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import base64
+import copy
+import hashlib
+
+import paramiko
+
+
+PSC_CERTIFICATE_PATH = '/ha/lb.crt'
+PSC_PRIVATE_KEY_PATH = '/ha/lb_rsa.key'
+
+
+def certificate_fingerprint(pem_encoding):
+    """
+    :param pem_encoding: A PEM encoded certificate
+    :return: The SHA1 fingerprint of the first DER encoded certificate as lower case hex string
+    """
+    if not isinstance(pem_encoding, str):
+        pem_encoding = pem_encoding.decode('ascii')
+    base64_lines = []
+    for line in pem_encoding.strip().splitlines():
+        line = line.strip()
+        if line.startswith('-----END'):
+            break
+        elif line and not line.startswith('-----'):
+            base64_lines.append(line)
+    return hashlib.sha1(base64.b64decode(''.join(base64_lines))).hexdigest()
+
+
+def get_certificate_id(client_session, edge_id, fingerprint):
+    """
+    Get certificate id of edge router require for application profile in load balancer
+    :param fingerprint: The SHA1 fingerprint of the certificate searched on the edge scope
+    :return: The certificate id, or None if no certificate on the edge scope has the given fingerprint
+    """
+    certificates_res = client_session.read('certificateScope', uri_parameters={'scopeId': edge_id})['body']
+    if not certificates_res or not certificates_res.get('certificates'):
+        return None
+    for certificate in client_session.normalize_list_return(certificates_res['certificates'].get('certificate')):
+        sha1_hash = (certificate.get('x509Certificate') or {}).get('sha1Hash')
+        if sha1_hash and sha1_hash.replace(':', '').lower() == fingerprint:
+            return certificate['objectId']
+        if certificate.get('pemEncoding') and certificate_fingerprint(certificate['pemEncoding']) == fingerprint:
+            return certificate['objectId']
+    return None
+
+
+LB_SECTIONS = [('applicationProfile', 'applicationProfileId'), ('monitor', 'monitorId'), ('pool', 'poolId'),
+               ('applicationRule', 'applicationRuleId'), ('virtualServer', 'virtualServerId')]
+
+
+def get_lb_config(client_session, edge_id):
+    return client_session.read('loadBalancer', uri_parameters={'edgeId': edge_id})['body']
+
+
+def assign_ids(desired_objects, current_objects, id_key):
+    """
+    Sets the object id on every desired object. Objects already present in the LB config keep their id, new objects
+    get the next free client generated id (e.g. pool-3)
+    :param desired_objects: The list of objects to be configured, identified by name
+    :param current_objects: The list of objects of the same type as read from the LB config
+    :param id_key: The id attribute of the object type, e.g. 'poolId'
+    """
+    id_prefix = id_key[:-2]
+    current_ids = dict((current['name'], current[id_key]) for current in current_objects if id_key in current)
+    used_ids = set(current_ids.values())
+    next_id = 1
+    for desired in desired_objects:
+        if desired['name'] in current_ids:
+            desired[id_key] = current_ids[desired['name']]
+            continue
+        while '{}-{}'.format(id_prefix, next_id) in used_ids:
+            next_id += 1
+        desired[id_key] = '{}-{}'.format(id_prefix, next_id)
+        used_ids.add(desired[id_key])
+
+
+def build_lb_config(client_session, module, current_lb, certificate_id):
+    """
+    Builds the complete loadBalancer document locally, so the whole configuration can be applied in a single PUT
+    :param current_lb: The loadBalancer document as read from the edge, used to resolve existing object ids
+    :return: The desired loadBalancer document
+    """
+    current_sections = dict((section, client_session.normalize_list_return(current_lb['loadBalancer'].get(section)))
+                            for section, _ in LB_SECTIONS)
+
+    app_profiles = [{'name': module.params['app_profile_name_https'],
+                     'insertXForwardedFor': 'false',
+                     'sslPassthrough': 'false', 'template': 'HTTPS',
+                     'serverSslEnabled': 'true', 'clientSsl':
+                         {'clientAuth': 'ignore',
+                          'serviceCertificate': certificate_id}},
+                    {'name': module.params['app_profile_name_tcp'],
+                     'insertXForwardedFor': 'false',
+                     'sslPassthrough': 'false', 'template': 'TCP',
+                     'serverSslEnabled': 'false'}]
+    assign_ids(app_profiles, current_sections['applicationProfile'], 'applicationProfileId')
+
+    monitors = [{'name': module.params['monitor_name'],
+                 'type': module.params['monitor_type'],
+                 'interval': module.params['monitor_interval'],
+                 'timeout': module.params['monitor_time_out'],
+                 'maxRetries': module.params['monitor_retries'],
+                 'method': module.params['monitor_url_method'],
+                 'url': module.params['monitor_url']}]
+    assign_ids(monitors, current_sections['monitor'], 'monitorId')
+    monitor_id = monitors[0]['monitorId']
+
+    pools = []
+    for pool_prefix in ['psc_1_http', 'psc_1_tcp', 'psc_2_http', 'psc_2_tcp']:
+        pools.append({'name': module.params['{}_pool_name'.format(pool_prefix)],
+                      'algorithm': 'round-robin', 'transparent': 'false', 'monitorId': monitor_id,
+                      'member': {'name': module.params['{}_pool_member_name'.format(pool_prefix)],
+                                 'ipAddress': module.params['{}_pool_member_ip'.format(pool_prefix)],
+                                 'monitorPort': module.params['{}_pool_monitor_port'.format(pool_prefix)]}})
+    assign_ids(pools, current_sections['pool'], 'poolId')
+
+    http_script = 'acl {}_down nbsrv({}) eq 0 \n use_backend {} if {}_down'.format(module.params['psc_1_http_pool_name'],
+                                        module.params['psc_1_http_pool_name'],
+                                        module.params['psc_2_http_pool_name'],
+                                        module.params['psc_1_http_pool_name'],
+                                        )
+
+    tcp_script = 'acl {}_down nbsrv({}) eq 0 \n use_backend {} if {}_down'.format(module.params['psc_1_tcp_pool_name'],
+                                        module.params['psc_1_tcp_pool_name'],
+                                        module.params['psc_2_tcp_pool_name'],
+                                        module.params['psc_1_tcp_pool_name'],
+                                        )
+
+    app_rules = [{'name': module.params['app_rule_name_http'],
+                  'script': http_script},
+                 {'name': module.params['app_rule_name_tcp'],
+                  'script': tcp_script}]
+    assign_ids(app_rules, current_sections['applicationRule'], 'applicationRuleId')
+
+    virtual_servers = [{'applicationProfileId': app_profiles[0]['applicationProfileId'],
+                        'name': module.params['https_virtual_server_name'],
+                        'enabled': 'true', 'ipAddress': module.params['virtual_ip_address'],
+                        'protocol': 'https', 'port': module.params['https_virtual_server_port'],
+                        'defaultPoolId': pools[0]['poolId'],
+                        'applicationRuleId': app_rules[0]['applicationRuleId']},
+                       {'applicationProfileId': app_profiles[1]['applicationProfileId'],
+                        'name': module.params['tcp_virtual_server_name'],
+                        'enabled': 'true', 'ipAddress': module.params['virtual_ip_address'],
+                        'protocol': 'tcp',
+                        'port': module.params['tcp_virtual_server_port'],
+                        'defaultPoolId': pools[1]['poolId'],
+                        'applicationRuleId': app_rules[1]['applicationRuleId']}]
+    assign_ids(virtual_servers, current_sections['virtualServer'], 'virtualServerId')
+
+    desired_lb = copy.deepcopy(current_lb)
+    desired_lb['loadBalancer']['enabled'] = 'true'
+    desired_lb['loadBalancer']['applicationProfile'] = app_profiles
+    desired_lb['loadBalancer']['monitor'] = monitors
+    desired_lb['loadBalancer']['pool'] = pools
+    desired_lb['loadBalancer']['applicationRule'] = app_rules
+    desired_lb['loadBalancer']['virtualServer'] = virtual_servers
+    return desired_lb
+
+
+def config_matches(current, desired):
+    """
+    Compares the desired configuration to the read back configuration. Only the attributes set in the desired
+    configuration are compared, as NSX adds defaults for everything else
+    """
+    if isinstance(desired, dict):
+        if not isinstance(current, dict):
+            return False
+        return all(config_matches(current.get(key), value) for key, value in desired.items())
+    elif isinstance(desired, list):
+        if isinstance(current, dict):
+            current = [current]
+        if not isinstance(current, list) or len(current) != len(desired):
+            return False
+        return all(config_matches(current_item, desired_item) for current_item, desired_item in zip(current, desired))
+    elif desired is None:
+        return not current
+    return str(current) == str(desired)
+
+
+def lb_config_changed(client_session, current_lb, desired_lb):
+    current = current_lb['loadBalancer']
+    desired = desired_lb['loadBalancer']
+    if current.get('enabled') != desired['enabled']:
+        return True
+    for section, id_key in LB_SECTIONS:
+        current_objects = sorted(client_session.normalize_list_return(current.get(section)),
+                                 key=lambda lb_object: lb_object.get(id_key))
+        desired_objects = sorted(desired[section], key=lambda lb_object: lb_object[id_key])
+        if not config_matches(current_objects, desired_objects):
+            return True
+    return False
+
+
+def apply_lb_config(client_session, edge_id, desired_lb):
+    return client_session.update('loadBalancer', uri_parameters={'edgeId': edge_id}, request_body_dict=desired_lb)
+
+
+def get_edge_id(session, edge_name):
+    router_res = session.read('nsxEdges', 'read')['body']
+    edge_summary_list = router_res['pagedEdgeList']['edgePage']['edgeSummary']
+    if isinstance(edge_summary_list, list):
+        for edge_summary in edge_summary_list:
+            if edge_name.lower() in edge_summary['name'].lower():
+                edge_id = edge_summary['objectId']
+                return edge_id
+    else:
+        edge_id = router_res['pagedEdgeList']['edgePage']['edgeSummary']['objectId']
+        return edge_id
+
+
+def firewall_enabled(session, edge_id):
+    firewall_state = session.read('nsxEdgeFirewallConfig', uri_parameters={'edgeId': edge_id})['body']
+    return firewall_state['firewall']['enabled'] == 'true'
+
+
+def disable_firewall(session, edge_id):
+    '''Disable firewall'''
+    disable_firewall_body = session.extract_resource_body_schema(
+                                            'nsxEdgeFirewallConfig', 'update')
+    disable_firewall_body['firewall']['enabled']='false'
+
+    del disable_firewall_body['firewall']['defaultPolicy']
+    del disable_firewall_body['firewall']['globalConfig']
+    del disable_firewall_body['firewall']['rules']
+
+    return session.update('nsxEdgeFirewallConfig',
+                          uri_parameters={'edgeId': edge_id},
+                          request_body_dict=disable_firewall_body)
+
+def psc_session(module):
+    try:
+        transport = paramiko.Transport((module.params['psc_1_http_pool_member_ip'], 22))
+        transport.connect(username='root', password=module.params['psc_password'])
+        sftp = paramiko.SFTPClient.from_transport(transport)
+    except Exception:
+        module.fail_json(msg='Transport connection to the PSC failed.')
+
+    return transport, sftp
+
+
+def get_certificates(module, paths):
+    """
+    Fetches all requested files from the PSC through a single SFTP session, which is closed afterwards
+    :param paths: The list of file paths to read from the PSC
+    :return: A dictionary with the file contents keyed by path
+    """
+    transport, sftp = psc_session(module)
+    certificates = {}
+    try:
+        for path in paths:
+            file_obj = sftp.open(path, 'r')
+            try:
+                certificates[path] = file_obj.read()
+            finally:
+                file_obj.close()
+    finally:
+        sftp.close()
+        transport.close()
+    return certificates
+
+
+def add_certificates(module, client_session, edge_id, certificates):
+    '''Add certificates to the Edge Services Gateway'''
+
+    certificate_body = client_session.extract_resource_body_schema(
+                                            'certificateSelfSigned', 'create')
+    certificate_body['trustObject']['pemEncoding'] = certificates[PSC_CERTIFICATE_PATH]
+    certificate_body['trustObject']['privateKey'] = certificates[PSC_PRIVATE_KEY_PATH]
+    certificate_body['trustObject']['passphrase']=module.params['psc_password']
+    return client_session.create('certificateSelfSigned',
+                          uri_parameters={'scopeId': edge_id},
+                          request_body_dict=certificate_body)
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            state=dict(default='present', choices=['present', 'absent']),
+            nsxmanager_spec=dict(required=True, no_log=True, type='dict'),
+            nsx_edge_gateway_name=dict(required=True),
+
+            app_profile_name_https=dict(required=True),
+            app_profile_name_tcp=dict(required=True),
+
+            monitor_name=dict(required=True),
+            monitor_type=dict(required=True),
+            monitor_interval=dict(required=True),
+            monitor_time_out=dict(required=True),
+            monitor_retries=dict(required=True),
+            monitor_url_method=dict(required=True),
+            monitor_url=dict(required=True),
+
+            psc_1_http_pool_name=dict(required=True),
+            psc_1_http_pool_member_name=dict(required=True),
+            psc_1_http_pool_member_ip=dict(required=True),
+            psc_1_http_pool_monitor_port=dict(required=True),
+
+            psc_2_http_pool_name=dict(required=True),
+            psc_2_http_pool_member_name=dict(required=True),
+            psc_2_http_pool_member_ip=dict(required=True),
+            psc_2_http_pool_monitor_port=dict(required=True),
+
+            psc_1_tcp_pool_name=dict(required=True),
+            psc_1_tcp_pool_member_name=dict(required=True),
+            psc_1_tcp_pool_member_ip=dict(required=True),
+            psc_1_tcp_pool_monitor_port=dict(required=True),
+
+            psc_2_tcp_pool_name=dict(required=True),
+            psc_2_tcp_pool_member_name=dict(required=True),
+            psc_2_tcp_pool_member_ip=dict(required=True),
+            psc_2_tcp_pool_monitor_port=dict(required=True),
+
+            https_virtual_server_name=dict(required=True),
+            virtual_ip_address=dict(required=True),
+            https_virtual_server_port=dict(required=True),
+
+            tcp_virtual_server_name=dict(required=True),
+            tcp_virtual_server_port=dict(required=True),
+
+            app_rule_name_http=dict(required=True),
+            app_rule_name_tcp=dict(required=True),
+
+            psc_password=dict(required=True),
+            ),
+        supports_check_mode=False
+    )
+
+    from ansible.module_utils.nsx_client import get_nsx_client
+    client_session=get_nsx_client(module)
+
+    edge_id = get_edge_id(client_session, module.params['nsx_edge_gateway_name'])
+    firewall_disabled = False
+    if firewall_enabled(client_session, edge_id):
+        disable_firewall(client_session, edge_id)
+        firewall_disabled = True
+
+    certificates = get_certificates(module, [PSC_CERTIFICATE_PATH, PSC_PRIVATE_KEY_PATH])
+    fingerprint = certificate_fingerprint(certificates[PSC_CERTIFICATE_PATH])
+    certificate_id = get_certificate_id(client_session, edge_id, fingerprint)
+    certificate_uploaded = False
+    if not certificate_id:
+        add_certificates(module, client_session, edge_id, certificates)
+        certificate_id = get_certificate_id(client_session, edge_id, fingerprint)
+        certificate_uploaded = True
+
+    current_lb = get_lb_config(client_session, edge_id)
+    desired_lb = build_lb_config(client_session, module, current_lb, certificate_id)
+
+    lb_update_response = None
+    if lb_config_changed(client_session, current_lb, desired_lb):
+        lb_update_response = apply_lb_config(client_session, edge_id, desired_lb)
+
+    module.exit_json(changed=lb_update_response is not None or certificate_uploaded or firewall_disabled,
+                     argument_spec=module.params['state'], firewall_disabled=firewall_disabled,
+                     virtual_servers=desired_lb['loadBalancer']['virtualServer'],
+                     lb_config_changed=lb_update_response is not None, lb_update_response=lb_update_response,
+                     certificate_id=certificate_id, certificate_uploaded=certificate_uploaded)
+
+
+from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
+if __name__ == '__main__':
+    profiled(main)()
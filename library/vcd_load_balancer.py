@@ -174,6 +174,192 @@ def add_pools(client_session, module, edge_id):
                          request_body_dict=pool_config_body)
     return add_pools_res
 
+LEGACY_POOL_PARAMS = ['{}_{}'.format(pool, attribute) for pool in ['http_pool', 'https_pool', 'vmrc_pool']
+                      for attribute in ['name', 'first_member_name', 'first_member_ip', 'first_member_port',
+                                        'first_member_monitor_port', 'second_member_name', 'second_member_ip',
+                                        'second_member_port', 'second_member_monitor_port']] + \
+                     ['http_virtual_server_name', 'http_virtual_server_port',
+                      'https_virtual_server_name', 'https_virtual_server_port']
+
+
+def get_lb_config(client_session, edge_id):
+    return client_session.read('loadBalancer', uri_parameters={'edgeId': edge_id})['body']['loadBalancer']
+
+
+def params_check_pools(module):
+    for pool in module.params['pools']:
+        if not isinstance(pool, dict) or not pool.get('name'):
+            module.fail_json(msg='Malformed Pool Dictionary: every pool needs at least a name: {}'.format(pool))
+        for member in pool.get('members', []):
+            if not isinstance(member, dict) or not ((member.get('ip') or member.get('grouping_object_id')) and
+                                                    member.get('port')):
+                module.fail_json(msg='Malformed Pool Member Dictionary: the member {} in pool {} needs at least '
+                                     'ip or grouping_object_id, and port'.format(member, pool['name']))
+    for virtual_server in module.params['virtual_servers']:
+        if not isinstance(virtual_server, dict) or not (virtual_server.get('name') and virtual_server.get('pool') and
+                                                        virtual_server.get('port')):
+            module.fail_json(msg='Malformed Virtual Server Dictionary: every virtual server needs at least name, pool '
+                                 'and port: {}'.format(virtual_server))
+
+
+def member_key(address, port):
+    return address, str(port or '')
+
+
+def diff_pool_members(current_members, desired_members):
+    """
+    Diffs the members of a pool by ip address or grouping object id, and port
+    :param current_members: The list of member dictionaries as returned by the NSX API
+    :param desired_members: The list of member dictionaries as passed to the module
+    :return: A tuple with the new member list, the list of added member keys and the list of removed member keys.
+             Members that are kept retain their memberId and any attribute not managed by this module
+    """
+    current = dict((member_key(member.get('ipAddress') or member.get('groupingObjectId'), member.get('port')), member)
+                   for member in current_members)
+    desired = dict((member_key(member.get('ip') or member.get('grouping_object_id'), member['port']), member)
+                   for member in desired_members)
+
+    added = set(desired) - set(current)
+    removed = set(current) - set(desired)
+    changed = False
+
+    new_members = []
+    for key in sorted(set(current) & set(desired)):
+        member = current[key]
+        desired_member = desired[key]
+        monitor_port = str(desired_member.get('monitor_port', desired_member['port']))
+        name = desired_member.get('name', member.get('name'))
+        if member.get('monitorPort') != monitor_port or member.get('name') != name:
+            member['monitorPort'] = monitor_port
+            member['name'] = name
+            changed = True
+        new_members.append(member)
+
+    for key in sorted(added):
+        desired_member = desired[key]
+        new_member = {'name': desired_member.get('name', '{}_{}'.format(*key)), 'port': str(desired_member['port']),
+                      'monitorPort': str(desired_member.get('monitor_port', desired_member['port']))}
+        if desired_member.get('ip'):
+            new_member['ipAddress'] = desired_member['ip']
+        else:
+            new_member['groupingObjectId'] = desired_member['grouping_object_id']
+        new_members.append(new_member)
+
+    return new_members, sorted(added), sorted(removed), changed
+
+
+def sync_pools(client_session, edge_id, lb_cfg, desired_pools, monitor_id):
+    """
+    Creates missing pools and applies member adds and removes to existing pools. All member changes of a pool are
+    applied with a single update of that pool, the pool itself is never recreated
+    :return: A tuple with a dictionary mapping the pool names to their ids, and a list of the changes done
+    """
+    current_pools = dict((pool['name'], pool) for pool in client_session.normalize_list_return(lb_cfg.get('pool')))
+    pool_ids = dict((name, pool['poolId']) for name, pool in current_pools.items())
+    changes = []
+
+    for desired_pool in desired_pools:
+        algorithm = desired_pool.get('algorithm', 'round-robin')
+        if desired_pool['name'] not in current_pools:
+            members, _, _, _ = diff_pool_members([], desired_pool.get('members', []))
+            pool_body = {'pool': {'name': desired_pool['name'], 'algorithm': algorithm, 'transparent': 'false',
+                                  'monitorId': monitor_id, 'member': members}}
+            response = client_session.create('pools', uri_parameters={'edgeId': edge_id}, request_body_dict=pool_body)
+            pool_ids[desired_pool['name']] = response['objectId']
+            changes.append({'pool': desired_pool['name'], 'action': 'create', 'members_added': len(members)})
+            continue
+
+        current_pool = current_pools[desired_pool['name']]
+        current_members = client_session.normalize_list_return(current_pool.get('member'))
+        members, added, removed, members_changed = diff_pool_members(current_members,
+                                                                     desired_pool.get('members', []))
+        if not (added or removed or members_changed or current_pool.get('algorithm') != algorithm):
+            continue
+
+        current_pool['algorithm'] = algorithm
+        current_pool['member'] = members
+        client_session.update('pool', uri_parameters={'edgeId': edge_id, 'poolID': current_pool['poolId']},
+                              request_body_dict={'pool': current_pool})
+        changes.append({'pool': desired_pool['name'], 'action': 'update',
+                        'members_added': ['{}:{}'.format(*key) for key in added],
+                        'members_removed': ['{}:{}'.format(*key) for key in removed]})
+
+    return pool_ids, changes
+
+
+def sync_virtual_servers(client_session, module, edge_id, lb_cfg, pool_ids):
+    """
+    Creates missing virtual servers and updates the ones which differ from the desired state
+    :return: A list of the changes done
+    """
+    current_vss = dict((vs['name'], vs) for vs in client_session.normalize_list_return(lb_cfg.get('virtualServer')))
+    app_profile_ids = dict((profile['template'], profile['applicationProfileId']) for profile in
+                           client_session.normalize_list_return(lb_cfg.get('applicationProfile')))
+    changes = []
+
+    for desired_vs in module.params['virtual_servers']:
+        protocol = desired_vs.get('protocol', 'https')
+        if desired_vs['pool'] not in pool_ids:
+            module.fail_json(msg='The pool {} used by virtual server {} does not exist'.format(desired_vs['pool'],
+                                                                                           desired_vs['name']))
+        profile_type = desired_vs.get('application_profile', protocol.upper())
+        if profile_type not in app_profile_ids:
+            module.fail_json(msg='No application profile with the template {} exists for virtual server {}, '
+                                 'the templates available are: {}'.format(profile_type, desired_vs['name'],
+                                                                         ', '.join(sorted(app_profile_ids))))
+        vs_config = {'name': desired_vs['name'], 'enabled': 'true',
+                     'ipAddress': desired_vs.get('ip_address', module.params['virtual_ip_address']),
+                     'protocol': protocol, 'port': str(desired_vs['port']),
+                     'defaultPoolId': pool_ids[desired_vs['pool']],
+                     'applicationProfileId': app_profile_ids[profile_type]}
+
+        current_vs = current_vss.get(desired_vs['name'])
+        if not current_vs:
+            client_session.create('virtualServers', uri_parameters={'edgeId': edge_id},
+                                  request_body_dict={'virtualServer': vs_config})
+            changes.append({'virtual_server': desired_vs['name'], 'action': 'create'})
+        elif any(current_vs.get(key) != value for key, value in vs_config.items()):
+            current_vs.update(vs_config)
+            client_session.update('virtualServer',
+                                  uri_parameters={'edgeId': edge_id, 'virtualserverID': current_vs['virtualServerId']},
+                                  request_body_dict={'virtualServer': current_vs})
+            changes.append({'virtual_server': desired_vs['name'], 'action': 'update'})
+
+    return changes
+
+
+def lb_base_config_present(client_session, module, lb_cfg):
+    profile_names = [profile['name'] for profile in
+                     client_session.normalize_list_return(lb_cfg.get('applicationProfile'))]
+    monitor_names = [monitor['name'] for monitor in client_session.normalize_list_return(lb_cfg.get('monitor'))]
+    return lb_cfg.get('enabled') == 'true' and module.params['monitor_name'] in monitor_names and \
+        all(module.params[profile] in profile_names for profile in
+            ['app_profile_name_https', 'app_profile_name_http', 'app_profile_name_tcp'])
+
+
+def declarative_lb_config(client_session, module, edge_id):
+    """
+    Reads the LB config once, and only applies the differences to the declared pools and virtual servers.
+    The base config (application profiles and monitor) is only applied if it is missing
+    """
+    params_check_pools(module)
+    changed = False
+
+    lb_cfg = get_lb_config(client_session, edge_id)
+    if not lb_base_config_present(client_session, module, lb_cfg):
+        lb_config(client_session, module, edge_id)
+        lb_cfg = get_lb_config(client_session, edge_id)
+        changed = True
+
+    monitor_id = [monitor['monitorId'] for monitor in client_session.normalize_list_return(lb_cfg.get('monitor'))
+                  if monitor['name'] == module.params['monitor_name']][0]
+
+    pool_ids, pool_changes = sync_pools(client_session, edge_id, lb_cfg, module.params['pools'], monitor_id)
+    vs_changes = sync_virtual_servers(client_session, module, edge_id, lb_cfg, pool_ids)
+
+    return changed or bool(pool_changes or vs_changes), pool_changes, vs_changes
+
+
 def get_edge_id(session, edge_name):
     router_res = session.read('nsxEdges', 'read')['body']
     edge_summary_list = router_res['pagedEdgeList']['edgePage']['edgeSummary']
@@ -187,6 +373,11 @@ def get_edge_id(session, edge_name):
         return edge_id
 
 
+def firewall_enabled(session, edge_id):
+    firewall_state = session.read('nsxEdgeFirewallConfig', uri_parameters={'edgeId': edge_id})['body']
+    return firewall_state['firewall']['enabled'] == 'true'
+
+
 def disable_firewall(session, edge_id):
     '''Disable firewall'''
     disable_firewall_body = session.extract_resource_body_schema('nsxEdgeFirewallConfig', 'update')
@@ -221,57 +412,70 @@ def main():
             monitor_url_method=dict(required=True),
             monitor_url=dict(required=True),
 
-            http_pool_name=dict(required=True),
-            http_pool_first_member_name=dict(required=True),
-            http_pool_first_member_ip=dict(required=True),
-            http_pool_first_member_port=dict(required=True),
-            http_pool_first_member_monitor_port=dict(required=True),
-
-            http_pool_second_member_name=dict(required=True),
-            http_pool_second_member_ip=dict(required=True),
-            http_pool_second_member_port=dict(required=True),
-            http_pool_second_member_monitor_port=dict(required=True),
-
-            https_pool_name=dict(required=True),
-            https_pool_first_member_name=dict(required=True),
-            https_pool_first_member_ip=dict(required=True),
-            https_pool_first_member_port=dict(required=True),
-            https_pool_first_member_monitor_port=dict(required=True),
-
-            https_pool_second_member_name=dict(required=True),
-            https_pool_second_member_ip=dict(required=True),
-            https_pool_second_member_port=dict(required=True),
-            https_pool_second_member_monitor_port=dict(required=True),
-
-            vmrc_pool_name=dict(required=True),
-            vmrc_pool_first_member_name=dict(required=True),
-            vmrc_pool_first_member_ip=dict(required=True),
-            vmrc_pool_first_member_port=dict(required=True),
-            vmrc_pool_first_member_monitor_port=dict(required=True),
-
-            vmrc_pool_second_member_name=dict(required=True),
-            vmrc_pool_second_member_ip=dict(required=True),
-            vmrc_pool_second_member_port=dict(required=True),
-            vmrc_pool_second_member_monitor_port=dict(required=True),
-
-            http_virtual_server_name=dict(required=True),
+            http_pool_name=dict(),
+            http_pool_first_member_name=dict(),
+            http_pool_first_member_ip=dict(),
+            http_pool_first_member_port=dict(),
+            http_pool_first_member_monitor_port=dict(),
+
+            http_pool_second_member_name=dict(),
+            http_pool_second_member_ip=dict(),
+            http_pool_second_member_port=dict(),
+            http_pool_second_member_monitor_port=dict(),
+
+            https_pool_name=dict(),
+            https_pool_first_member_name=dict(),
+            https_pool_first_member_ip=dict(),
+            https_pool_first_member_port=dict(),
+            https_pool_first_member_monitor_port=dict(),
+
+            https_pool_second_member_name=dict(),
+            https_pool_second_member_ip=dict(),
+            https_pool_second_member_port=dict(),
+            https_pool_second_member_monitor_port=dict(),
+
+            vmrc_pool_name=dict(),
+            vmrc_pool_first_member_name=dict(),
+            vmrc_pool_first_member_ip=dict(),
+            vmrc_pool_first_member_port=dict(),
+            vmrc_pool_first_member_monitor_port=dict(),
+
+            vmrc_pool_second_member_name=dict(),
+            vmrc_pool_second_member_ip=dict(),
+            vmrc_pool_second_member_port=dict(),
+            vmrc_pool_second_member_monitor_port=dict(),
+
+            http_virtual_server_name=dict(),
             virtual_ip_address=dict(required=True),
-            http_virtual_server_port=dict(required=True),
+            http_virtual_server_port=dict(),
 
-            https_virtual_server_name=dict(required=True),
-            https_virtual_server_port=dict(required=True),
+            https_virtual_server_name=dict(),
+            https_virtual_server_port=dict(),
+
+            pools=dict(type='list'),
+            virtual_servers=dict(default=[], type='list'),
         ),
         supports_check_mode=False
     )
 
-    from nsxramlclient.client import NsxClient
-    client_session=NsxClient(module.params['nsxmanager_spec']['raml_file'],
-                             module.params['nsxmanager_spec']['host'],
-                             module.params['nsxmanager_spec']['user'],
-                             module.params['nsxmanager_spec']['password'])
+    from ansible.module_utils.nsx_client import get_nsx_client
+    client_session=get_nsx_client(module)
 
     edge_id = get_edge_id(client_session, module.params['nsx_edge_gateway_name'])
-    disable=disable_firewall(client_session, edge_id)
+    firewall_disabled = False
+    if firewall_enabled(client_session, edge_id):
+        disable_firewall(client_session, edge_id)
+        firewall_disabled = True
+
+    if module.params['pools'] is not None:
+        changed, pool_changes, vs_changes = declarative_lb_config(client_session, module, edge_id)
+        module.exit_json(changed=changed or firewall_disabled, pool_changes=pool_changes,
+                         virtual_server_changes=vs_changes, firewall_disabled=firewall_disabled)
+
+    missing_params = [param for param in LEGACY_POOL_PARAMS if not module.params[param]]
+    if missing_params:
+        module.fail_json(msg='missing required arguments: {}'.format(', '.join(missing_params)))
+
     loadBalancer_config = lb_config(client_session, module, edge_id)
     update_pool_res = add_pools(client_session, module, edge_id)
     virtual_servers = add_virtual_servers(client_session, module, edge_id)
@@ -280,5 +484,6 @@ def main():
 
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 if __name__ == '__main__':
-    main()
+    profiled(main)()
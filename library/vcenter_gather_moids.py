@@ -26,11 +26,15 @@ except ImportError:
     HAS_PYVMOMI = False
 
 
-VIM_TYPES = {'datacenter': [vim.Datacenter],
-             'dvs_name': [vim.dvs.VmwareDistributedVirtualSwitch],
-             'datastore_name': [vim.Datastore],
-             'resourcepool_name': [vim.ResourcePool],
-             'portgroup_name': [vim.dvs.DistributedVirtualPortgroup, vim.Network]}
+def vim_types(searched_parameter):
+    """
+    :return: The pyVmomi types searched for the parameter. Resolved on use, pyVmomi loads its types lazily
+    """
+    return {'datacenter': [vim.Datacenter],
+            'dvs_name': [vim.dvs.VmwareDistributedVirtualSwitch],
+            'datastore_name': [vim.Datastore],
+            'resourcepool_name': [vim.ResourcePool],
+            'portgroup_name': [vim.dvs.DistributedVirtualPortgroup, vim.Network]}[searched_parameter]
 
 
 def get_mo(content, searchedname, vim_type_list):
@@ -38,7 +42,7 @@ def get_mo(content, searchedname, vim_type_list):
     for object in mo:
         if object.name == searchedname:
             return object
-	elif re.search( searchedname, object.name ):
+        elif re.search( searchedname, object.name ):
             return object
     return None
 
@@ -80,7 +84,7 @@ def main():
         if searched_parameter == 'cluster_name' and module.params[searched_parameter]:
             object_mo = find_cluster_by_name_datacenter(datacenter_mo, module.params[searched_parameter])
         elif searched_parameter and module.params[searched_parameter]:
-            object_mo = get_mo(content, module.params[searched_parameter], VIM_TYPES[searched_parameter])
+            object_mo = get_mo(content, module.params[searched_parameter], vim_types(searched_parameter))
 
         if not object_mo and module.params[searched_parameter]:
             module.fail_json(msg='Could not find {} in vCenter'.format(module.params[searched_parameter]))
@@ -92,7 +96,8 @@ def main():
 
 from ansible.module_utils.basic import *
 from ansible.module_utils.vmware import *
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
 
@@ -68,7 +68,8 @@ def main():
     module.exit_json(changed=True, result="NSX License Applied!!!")
 
 from ansible.module_utils.basic import *
+from ansible.module_utils.nsx_profile import profiled
 
 if __name__ == '__main__':
-    main()
+    profiled(main)()
 
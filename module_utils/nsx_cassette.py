@@ -0,0 +1,259 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+import atexit
+import base64
+import errno
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+CASSETTE_ENV = 'NSX_CASSETTE'
+CASSETTE_MODE_ENV = 'NSX_CASSETTE_MODE'
+CASSETTE_LATENCY_ENV = 'NSX_CASSETTE_LATENCY'
+
+# response headers nsxramlclient looks at
+RECORDED_HEADERS = ('Content-Type', 'Location', 'ETag')
+
+# cassettes opened in this process, the replay runner reads their call counts
+ACTIVE_CASSETTES = []
+
+# request body elements whose content is never written to a cassette, e.g. the certificate key of psc_load_balancer
+SECRET_NAMES = r'\w*(?:password|privatekey|passphrase|secret)\w*'
+SECRET_ELEMENT = re.compile(r'<({0})(\s[^>]*)?>.*?</\1>'.format(SECRET_NAMES), re.IGNORECASE | re.DOTALL)
+SECRET_JSON_VALUE = re.compile(r'"({0})"\s*:\s*"(?:[^"\\]|\\.)*"'.format(SECRET_NAMES), re.IGNORECASE)
+
+
+class CassetteMiss(Exception):
+    """
+    A replayed module sent a request the cassette has no (more) responses for
+    """
+    pass
+
+
+def mask_secrets(body):
+    """
+    :return: The XML or JSON request body with the content of the password, private key and passphrase elements masked
+    """
+    body = SECRET_ELEMENT.sub(lambda match: '<{0}{1}>********</{0}>'.format(match.group(1), match.group(2) or ''),
+                              body)
+    return SECRET_JSON_VALUE.sub(lambda match: '"{}": "********"'.format(match.group(1)), body)
+
+
+def request_key(request):
+    """
+    :return: The method, path with query and body of a requests.PreparedRequest, with the secrets in the body masked.
+             The NSX Manager host is left out, so a cassette replays against any nsxmanager_spec
+    """
+    url = urlsplit(request.url)
+    body = request.body
+    if isinstance(body, bytes):
+        body = body.decode('utf-8', 'replace')
+    return '{} {}{}\n{}'.format(request.method, url.path, '?' + url.query if url.query else '',
+                                 mask_secrets(body or ''))
+
+
+def encode_content(content):
+    try:
+        return {'text': content.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'base64': base64.b64encode(content).decode('ascii')}
+
+
+def decode_content(interaction):
+    if 'base64' in interaction:
+        return base64.b64decode(interaction['base64'])
+    return interaction['text'].encode('utf-8')
+
+
+def mask_passwords(value):
+    if isinstance(value, dict):
+        return dict((key, '********' if 'password' in key.lower() and item else mask_passwords(item))
+                    for key, item in value.items())
+    if isinstance(value, list):
+        return [mask_passwords(item) for item in value]
+    return value
+
+
+class Cassette(object):
+    """
+    The request and response pairs of one module run, stored as gzip compressed JSON lines. The first line holds the
+    module name and its arguments with the passwords masked
+    """
+    def __init__(self, path, mode='replay', latency=None):
+        """
+        :param mode: 'record' to capture the calls to NSX Manager, 'replay' to answer them from the cassette
+        :param latency: Seconds added to every replayed call, or 'recorded' to wait as long as NSX Manager took
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError('cassette mode must be record or replay, not {}'.format(mode))
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.header = {}
+        self.interactions = []
+        self.calls = {}
+        self.misses = []
+        self._lock = threading.Lock()
+        self._queues = {}
+        if mode == 'replay':
+            self.load()
+
+    def load(self):
+        with gzip.open(self.path, 'rb') as cassette_file:
+            lines = [json.loads(line.decode('utf-8')) for line in cassette_file if line.strip()]
+        self.header = lines[0]
+        self.interactions = lines[1:]
+        for interaction in self.interactions:
+            # cassettes recorded before the secrets were masked still replay
+            self._queues.setdefault(mask_secrets(interaction['request']), []).append(interaction)
+
+    def save(self):
+        buffer_ = io.BytesIO()
+        cassette_file = gzip.GzipFile(fileobj=buffer_, mode='wb')
+        for line in [self.header] + self.interactions:
+            cassette_file.write(json.dumps(line, sort_keys=True).encode('utf-8') + b'\n')
+        cassette_file.close()
+        with open(self.path, 'wb') as output:
+            output.write(buffer_.getvalue())
+
+    def _count(self, method):
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+    def record(self, request, response, content, seconds):
+        interaction = {'request': request_key(request), 'status': response.status_code, 'seconds': round(seconds, 4),
+                       'headers': dict((header, response.headers[header]) for header in RECORDED_HEADERS
+                                       if header in response.headers)}
+        interaction.update(encode_content(content))
+        with self._lock:
+            self._count(request.method)
+            self.interactions.append(interaction)
+        return interaction
+
+    def play(self, request):
+        """
+        :return: The next recorded response of the request. Requests sent more often than recorded get the last
+                 response again
+        :raise CassetteMiss: If the request was never recorded
+        """
+        key = request_key(request)
+        with self._lock:
+            self._count(request.method)
+            queue = self._queues.get(key)
+            if not queue:
+                self.misses.append(key)
+                raise CassetteMiss('no recorded response for {}'.format(key.splitlines()[0]))
+            return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    @property
+    def call_count(self):
+        return sum(self.calls.values())
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    Transport adapter recording the calls sent through the wrapped adapter, or replaying them from the cassette
+    without connecting to NSX Manager
+    """
+    def __init__(self, cassette, adapter=None):
+        self.cassette = cassette
+        self.adapter = adapter
+        super(CassetteAdapter, self).__init__()
+
+    def send(self, request, **kwargs):
+        from requests.packages.urllib3.response import HTTPResponse
+
+        if self.cassette.mode == 'record':
+            start = time.time()
+            response = self.adapter.send(request, **kwargs)
+            content = response.content
+            interaction = self.cassette.record(request, response, content, time.time() - start)
+        else:
+            interaction = self.cassette.play(request)
+            content = decode_content(interaction)
+            latency = interaction['seconds'] if self.cassette.latency == 'recorded' else self.cassette.latency
+            if latency:
+                time.sleep(float(latency))
+
+        # the body is served from memory, so streamed reads get it too
+        raw = HTTPResponse(body=io.BytesIO(content), headers=interaction['headers'], status=interaction['status'],
+                           preload_content=False, decode_content=False)
+        return self.build_response(request, raw)
+
+    def close(self):
+        if self.adapter:
+            self.adapter.close()
+        super(CassetteAdapter, self).close()
+
+
+def next_cassette_path(directory, module_name):
+    """
+    :return: The first free '<module>-<nnn>.json.gz' path in the directory, created empty so that parallel forks
+             recording the same module don't pick it too
+    """
+    index = 1
+    while True:
+        path = os.path.join(directory, '{}-{:03d}.json.gz'.format(module_name, index))
+        try:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+            return path
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+        index += 1
+
+
+def configure_cassette(http_session, module):
+    """
+    Records or replays the calls of the module when the NSX_CASSETTE environment variable names a cassette file.
+    NSX_CASSETTE_MODE is 'replay' (default) or 'record', NSX_CASSETTE_LATENCY the seconds added to replayed calls or
+    'recorded'. A recorded cassette is written when the module exits. When recording into a directory, every module
+    run gets its own cassette named after the module
+    :return: The Cassette, None if no cassette is configured
+    """
+    path = os.environ.get(CASSETTE_ENV)
+    if not path:
+        return None
+    mode = os.environ.get(CASSETTE_MODE_ENV, 'replay')
+    module_name = getattr(module, '_name', None) or os.path.basename(sys.argv[0]).split('.')[0]
+    if mode == 'record' and os.path.isdir(path):
+        path = next_cassette_path(path, module_name)
+    cassette = Cassette(path, mode, os.environ.get(CASSETTE_LATENCY_ENV))
+    if cassette.mode == 'record':
+        cassette.header = {'module': module_name,
+                           'args': mask_passwords(dict((key, value) for key, value in module.params.items()
+                                                       if not key.startswith('_')))}
+        atexit.register(cassette.save)
+        http_session.mount('https://', CassetteAdapter(cassette, http_session.get_adapter('https://')))
+    else:
+        http_session.mount('https://', CassetteAdapter(cassette))
+    ACTIVE_CASSETTES.append(cassette)
+    return cassette
@@ -0,0 +1,230 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import sys
+import threading
+
+try:
+    from ansible.module_utils.nsx_cassette import configure_cassette
+    from ansible.module_utils.nsx_governor import GovernedAdapter, add_throttle_stats, new_governor, \
+        new_throttle_stats
+except ImportError:
+    # loaded from the httpapi plugin in the persistent connection process
+    from nsx_cassette import configure_cassette
+    from nsx_governor import GovernedAdapter, add_throttle_stats, new_governor, new_throttle_stats
+
+NSX_POOL_SIZE = 10
+
+NSX_CLIENT_METHODS = ('read', 'create', 'update', 'delete', 'read_all_pages', 'extract_resource_body_example',
+                      'extract_resource_body_schema')
+
+
+class PersistentNsxClient(object):
+    """
+    Drop-in replacement of NsxClient for modules running on a persistent 'httpapi' connection with
+    ansible_network_os=nsx. The calls are executed by the NsxClient kept by the connection process, so the RAML file
+    is loaded and the HTTPS session to NSX Manager is established once per play instead of once per task
+    """
+    def __init__(self, connection, nsxmanager_spec, fail_mode=None):
+        self._connection = connection
+        self._nsxmanager_spec = nsxmanager_spec
+        self.fail_mode = fail_mode or 'exit'
+        self.throttle_stats = new_throttle_stats()
+        self._throttle_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name not in NSX_CLIENT_METHODS:
+            raise AttributeError(name)
+
+        def nsx_call(*args, **kwargs):
+            response = self._connection.nsx_request(self._nsxmanager_spec, name, args, kwargs)
+            with self._throttle_lock:
+                add_throttle_stats(self.throttle_stats, response.get('throttle', {}))
+            if 'error' not in response:
+                return response['result']
+            return self._handle_error(response['error']['status'], response['error']['msg'])
+
+        return nsx_call
+
+    def _handle_error(self, status, msg):
+        """
+        Applies the fail_mode of the module the same way NsxClient does
+        """
+        if self.fail_mode == 'raise':
+            from nsxramlclient.exceptions import NsxError
+            raise NsxError(status, msg)
+        elif self.fail_mode == 'continue':
+            return {'status': status, 'body': msg, 'location': None, 'objectId': None, 'Etag': None}
+        sys.exit('receive bad status code {}\n{}'.format(status, msg))
+
+    @staticmethod
+    def normalize_list_return(input_object):
+        if not input_object:
+            return []
+        elif isinstance(input_object, dict):
+            return [input_object]
+        elif isinstance(input_object, list):
+            return input_object
+        else:
+            return []
+
+
+def configure_connection_pool(http_session, pool_size=NSX_POOL_SIZE, governor=None):
+    """
+    Mounts a keep-alive HTTPS adapter holding up to pool_size connections on a requests session. When all
+    connections are busy, requests wait for a free one instead of opening a connection that is thrown away
+    afterwards, so the TCP and TLS handshakes of a connection are paid once for the whole session
+    :param http_session: The requests.Session to configure
+    :param pool_size: The maximum number of open connections, should be at least the concurrency of the module
+    :param governor: Optional NsxGovernor limiting and retrying the requests
+    """
+    from requests.adapters import HTTPAdapter
+
+    if governor:
+        adapter = GovernedAdapter(governor, pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    else:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    http_session.mount('https://', adapter)
+    http_session.headers['Connection'] = 'keep-alive'
+    return http_session
+
+
+def spec_flag(nsxmanager_spec, key, default):
+    value = nsxmanager_spec.get(key, default)
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('true', 'yes', 'on', '1')
+
+
+def configure_compression(http_session, nsxmanager_spec):
+    """
+    Asks NSX Manager for gzip compressed responses, unless 'compression' is false in the nsxmanager_spec. requests
+    decompresses the responses transparently
+    """
+    if spec_flag(nsxmanager_spec, 'compression', True):
+        http_session.headers['Accept-Encoding'] = 'gzip, deflate'
+    else:
+        http_session.headers['Accept-Encoding'] = 'identity'
+    return http_session
+
+
+def element_value(element):
+    """
+    Converts an XML element to the value the xml_to_dict function of nsxramlclient stores under the element tag,
+    without building and merging a one-key dictionary for every element
+    """
+    children = list(element)
+    text = element.text
+    if not children and not element.attrib:
+        return text.strip() if text is not None else None
+
+    value = {}
+    for child in children:
+        child_value = element_value(child)
+        if child.tag not in value:
+            value[child.tag] = child_value
+        elif isinstance(value[child.tag], list):
+            value[child.tag].append(child_value)
+        else:
+            value[child.tag] = [value[child.tag], child_value]
+    for attribute, attribute_value in element.attrib.items():
+        value['@' + attribute] = attribute_value
+    if text is not None and text.strip():
+        value['#text'] = text.strip()
+    return value
+
+
+def fast_xml_to_dict(element):
+    return {element.tag: element_value(element)}
+
+
+def configure_xml_parser(nsxmanager_spec):
+    """
+    Replaces the XML to dictionary conversion of nsxramlclient by fast_xml_to_dict, which returns the same
+    dictionaries. Setting 'xml_parser' to 'nsxramlclient' in the nsxmanager_spec keeps the original conversion
+    """
+    from nsxramlclient import xmloperations
+
+    if not hasattr(xmloperations, 'nsxramlclient_xml_to_dict'):
+        xmloperations.nsxramlclient_xml_to_dict = xmloperations.xml_to_dict
+    if nsxmanager_spec.get('xml_parser', 'fast') == 'nsxramlclient':
+        xmloperations.xml_to_dict = xmloperations.nsxramlclient_xml_to_dict
+    else:
+        xmloperations.xml_to_dict = fast_xml_to_dict
+
+
+def new_nsx_client(nsxmanager_spec, fail_mode=None):
+    """
+    :return: A new NsxClient with a keep-alive connection pool, compressed transfers, the fast XML parser and the
+             NsxGovernor as configured in the nsxmanager_spec. The governor is kept as nsx_governor on the client
+    """
+    from nsxramlclient.client import NsxClient
+
+    client = NsxClient(nsxmanager_spec['raml_file'], nsxmanager_spec['host'], nsxmanager_spec['user'],
+                       nsxmanager_spec['password'], fail_mode=fail_mode)
+    # NsxClient doesn't expose its requests session, it is configured on the transport
+    http_session = client._httpsession._session
+    client.nsx_governor = new_governor(nsxmanager_spec)
+    configure_connection_pool(http_session, int(nsxmanager_spec.get('pool_size', NSX_POOL_SIZE)), client.nsx_governor)
+    configure_compression(http_session, nsxmanager_spec)
+    configure_xml_parser(nsxmanager_spec)
+    return client
+
+
+def client_throttle_stats(client):
+    """
+    :return: The throttle statistics of the calls made by the client, for a PersistentNsxClient only of its own calls
+    """
+    if isinstance(client, PersistentNsxClient):
+        with client._throttle_lock:
+            return dict(client.throttle_stats)
+    return client.nsx_governor.stats()
+
+
+def report_throttle_stats(module, client):
+    """
+    Adds the throttle statistics of the client as 'nsx_throttle' to the results of the module
+    """
+    def with_stats(result_method):
+        def report(*args, **kwargs):
+            kwargs.setdefault('nsx_throttle', client_throttle_stats(client))
+            return result_method(*args, **kwargs)
+        return report
+
+    module.exit_json = with_stats(module.exit_json)
+    module.fail_json = with_stats(module.fail_json)
+
+
+def get_nsx_client(module, fail_mode=None):
+    """
+    :param module: The AnsibleModule, with the NSX Manager details in the 'nsxmanager_spec' parameter
+    :param fail_mode: The NsxClient fail_mode, 'exit' if not set
+    :return: A PersistentNsxClient if the module runs on a persistent connection, else a new NsxClient, recording or
+             replaying its calls if a cassette is set in the environment. The throttle statistics of the client are
+             added to the module results
+    """
+    nsxmanager_spec = module.params['nsxmanager_spec']
+    socket_path = getattr(module, '_socket_path', None)
+    if socket_path:
+        from ansible.module_utils.connection import Connection
+        client = PersistentNsxClient(Connection(socket_path), nsxmanager_spec, fail_mode)
+    else:
+        client = new_nsx_client(nsxmanager_spec, fail_mode)
+        configure_cassette(client._httpsession._session, module)
+    report_throttle_stats(module, client)
+    return client
@@ -0,0 +1,176 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+DAG_CONCURRENCY = 10
+
+# states of steps that ran, as opposed to steps skipped because a step they require failed
+RUN_STATES = ('ok', 'changed', 'failed')
+
+
+class DagError(Exception):
+    pass
+
+
+class Step(object):
+    """
+    One node of a dependency graph. The action is called with a dictionary holding the output of every step that
+    succeeded so far and returns a tuple (changed, output)
+    """
+    __slots__ = ('name', 'action', 'requires')
+
+    def __init__(self, name, action, requires=()):
+        self.name = name
+        self.action = action
+        self.requires = list(requires)
+
+
+def topological_layers(steps):
+    """
+    :return: A list of layers, every layer holding the names of the steps that only require steps of the layers
+             before it, in the order the steps were given
+    :raise DagError: If a step requires an unknown step, or the requirements contain a cycle
+    """
+    names = [step.name for step in steps]
+    if len(set(names)) != len(names):
+        raise DagError('Duplicate steps: {}'.format(sorted(set(name for name in names if names.count(name) > 1))))
+    for step in steps:
+        unknown = [name for name in step.requires if name not in names]
+        if unknown:
+            raise DagError('Step {} requires the unknown steps {}'.format(step.name, unknown))
+
+    waiting = dict((step.name, set(step.requires)) for step in steps)
+    layers = []
+    while waiting:
+        layer = [name for name in names if name in waiting and not waiting[name]]
+        if not layer:
+            raise DagError('The requirements of the steps {} contain a cycle'.format(sorted(waiting)))
+        for name in layer:
+            del waiting[name]
+        for requires in waiting.values():
+            requires.difference_update(layer)
+        layers.append(layer)
+    return layers
+
+
+def run_steps(steps, concurrency=DAG_CONCURRENCY):
+    """
+    Runs every step as soon as all the steps it requires succeeded, up to concurrency steps at a time. When a step
+    fails, the steps depending on it are skipped and the independent ones keep running.
+    Actions run in worker threads, so NSX sessions used by them need the fail_mode 'raise'
+    :return: A dictionary of step name to a dictionary with the 'state' ('ok', 'changed', 'failed' or 'skipped'),
+             the 'output' or the error 'msg', and the 'start', 'end' and 'seconds' relative to the start of the run
+    """
+    topological_layers(steps)
+    by_name = dict((step.name, step) for step in steps)
+    dependants = dict((step.name, []) for step in steps)
+    for step in steps:
+        for name in step.requires:
+            dependants[name].append(step.name)
+
+    waiting = dict((step.name, set(step.requires)) for step in steps)
+    outputs = {}
+    results = {}
+    finished = queue.Queue()
+    start = time.time()
+
+    def run(step):
+        began = time.time()
+        try:
+            changed, output = step.action(outputs)
+            result = {'state': 'changed' if changed else 'ok', 'output': output}
+        except (Exception, SystemExit) as error:
+            # SystemExit as well, a module exiting inside a worker thread would otherwise leave the run waiting
+            result = {'state': 'failed', 'msg': str(error) or repr(error)}
+        ended = time.time()
+        result.update(start=round(began - start, 3), end=round(ended - start, 3), seconds=round(ended - began, 3))
+        finished.put((step.name, result))
+
+    pool = ThreadPool(max(1, min(concurrency, len(steps))))
+    try:
+        for step in steps:
+            if not step.requires:
+                pool.apply_async(run, (step,))
+
+        while len(results) < len(steps):
+            name, result = finished.get()
+            results[name] = result
+            if result['state'] != 'failed':
+                outputs[name] = result.get('output')
+
+            blocked = [name]
+            while blocked:
+                blocking = blocked.pop()
+                for dependant in dependants[blocking]:
+                    if dependant in results:
+                        continue
+                    if results[blocking]['state'] in ('failed', 'skipped'):
+                        results[dependant] = {'state': 'skipped',
+                                              'msg': 'requires {}, which {}'.format(blocking,
+                                                                                    results[blocking]['state'])}
+                        blocked.append(dependant)
+                        continue
+                    waiting[dependant].discard(blocking)
+                    if not waiting[dependant]:
+                        pool.apply_async(run, (by_name[dependant],))
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+
+def critical_path(steps, results):
+    """
+    Follows the chain of steps that determined the end of the run: starting with the step that ended last, each
+    step is preceded by the step it required that ended last
+    :return: A list of the step names on the critical path, in the order they ran
+    """
+    by_name = dict((step.name, step) for step in steps)
+    ran = [name for name in results if results[name]['state'] in RUN_STATES]
+    if not ran:
+        return []
+
+    path = [max(ran, key=lambda name: results[name]['end'])]
+    while by_name[path[-1]].requires:
+        path.append(max(by_name[path[-1]].requires, key=lambda name: results[name]['end']))
+    return list(reversed(path))
+
+
+def dag_report(steps, results):
+    """
+    :return: A dictionary with the step results as a list in the order of the steps, the 'elapsed' seconds of the
+             run, the 'serial_seconds' running the same steps one after the other would have taken, and the
+             'critical_path' with its 'critical_path_seconds'
+    """
+    ran = [result for result in results.values() if result['state'] in RUN_STATES]
+    path = critical_path(steps, results)
+    report = {'steps': [dict(results[step.name], name=step.name) for step in steps],
+              'elapsed': max([result['end'] for result in ran] or [0]),
+              'serial_seconds': round(sum(result['seconds'] for result in ran), 3),
+              'critical_path': path,
+              'critical_path_seconds': round(sum(results[name]['seconds'] for name in path), 3)}
+    return report
@@ -0,0 +1,306 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import random
+import stat
+import tempfile
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+NSX_MAX_IN_FLIGHT = 8
+NSX_RETRIES = 5
+NSX_BACKOFF = 0.5
+NSX_MAX_BACKOFF = 30.0
+
+# NSX Manager answers with these while it is overloaded or restarting
+RETRY_STATUSES = (429, 502, 503, 504)
+# these mean the request was turned away before NSX Manager processed it, so non idempotent calls can be resent too
+REJECTED_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# the slot and bucket files are never opened through a symlink planted by another user
+LOCK_FILE_FLAGS = os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0)
+
+THROTTLE_COUNTERS = ('requests', 'retries', 'throttled', 'errors', 'slot_wait_seconds', 'rate_wait_seconds',
+                     'backoff_seconds')
+
+
+def new_throttle_stats():
+    return dict((counter, 0) for counter in THROTTLE_COUNTERS)
+
+
+def add_throttle_stats(stats, other, sign=1):
+    for counter in THROTTLE_COUNTERS:
+        stats[counter] = round(stats[counter] + sign * other.get(counter, 0), 3)
+    return stats
+
+
+def throttle_stats_since(before, after):
+    """
+    :return: The throttle statistics of the calls made between the two stats() snapshots
+    """
+    return add_throttle_stats(dict(after), before, sign=-1)
+
+
+def private_lock_dir():
+    """
+    :return: The directory of the governor files of the current user in the temp directory, created with mode 0700
+    :raise OSError: If the path exists but is not a directory owned by the current user and only accessible by them,
+                    e.g. a symlink planted by another user
+    """
+    lock_dir = os.path.join(tempfile.gettempdir(), 'nsx-governor-{}'.format(os.getuid()))
+    try:
+        os.mkdir(lock_dir, 0o700)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+    lock_dir_stat = os.lstat(lock_dir)
+    if not stat.S_ISDIR(lock_dir_stat.st_mode) or lock_dir_stat.st_uid != os.getuid() or \
+            stat.S_IMODE(lock_dir_stat.st_mode) & 0o077:
+        raise OSError(errno.EPERM, 'The governor directory is not private to the current user', lock_dir)
+    return lock_dir
+
+
+class NsxGovernor(object):
+    """
+    Limits the calls to one NSX Manager across all processes of the control node, i.e. all Ansible forks, and retries
+    the calls NSX Manager turned away.
+    The in-flight calls are capped by max_in_flight slot files, a call holds an exclusive flock on one of them. The
+    optional rate limit is a token bucket kept in a state file under flock. The locks are released by the kernel
+    when a process dies, so a killed fork never leaks a slot. The files are kept in a directory only the user running
+    Ansible can access. If they can't be used, the governor falls back to limiting the calls of its own process
+    """
+    def __init__(self, host, max_in_flight=NSX_MAX_IN_FLIGHT, rate_limit=0, burst=None, retries=NSX_RETRIES,
+                 backoff=NSX_BACKOFF, max_backoff=NSX_MAX_BACKOFF, lock_dir=None):
+        """
+        :param host: The NSX Manager, all governors of a host share the same slots and bucket
+        :param max_in_flight: Calls sent to NSX Manager at the same time by all processes, 0 for no limit
+        :param rate_limit: Calls per second started by all processes, 0 for no limit
+        :param burst: Calls that can start at once after an idle period, defaults to max_in_flight
+        :param retries: Attempts after the first one for retryable failures
+        :param backoff: Base of the exponential backoff in seconds, the wait is picked at random up to the exponential
+        :param max_backoff: Upper bound of a single backoff wait
+        :param lock_dir: The directory of the slot and bucket files, defaults to a per user directory in the temp
+                         directory
+        """
+        self.max_in_flight = max_in_flight
+        self.rate_limit = float(rate_limit)
+        self.burst = float(burst or max_in_flight or 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._stats = new_throttle_stats()
+        self._stats_lock = threading.Lock()
+        self._local_slots = None
+        self._local_bucket = None
+        host_key = hashlib.sha1(host.encode('utf-8')).hexdigest()[:16]
+        try:
+            self._lock_prefix = os.path.join(lock_dir or private_lock_dir(), 'nsx-governor-' + host_key)
+        except OSError:
+            self._lock_prefix = None
+            self._use_process_limits()
+
+    @property
+    def shared(self):
+        """
+        :return: True if the limits are shared with the other processes, False if they only apply to this process
+        """
+        return self._local_slots is None
+
+    def _use_process_limits(self):
+        with self._stats_lock:
+            if self._local_slots is None:
+                self._local_bucket = {'tokens': self.burst, 'stamp': time.time()}
+                self._local_slots = threading.BoundedSemaphore(self.max_in_flight or 1)
+
+    def _count(self, counter, value=1):
+        with self._stats_lock:
+            self._stats[counter] += value
+
+    def stats(self):
+        """
+        :return: A copy of the throttle statistics of this governor
+        """
+        with self._stats_lock:
+            return dict((counter, round(value, 3)) for counter, value in self._stats.items())
+
+    def _acquire_slot(self):
+        """
+        :return: The descriptor of the locked slot file, None if the calls are not capped
+        """
+        if not self.max_in_flight:
+            return None
+        start = time.time()
+        if not self.shared:
+            self._local_slots.acquire()
+            self._count('slot_wait_seconds', time.time() - start)
+            return self._local_slots
+        delay = 0.005
+        while True:
+            for index in random.sample(range(self.max_in_flight), self.max_in_flight):
+                try:
+                    slot = os.open('{}.slot{}'.format(self._lock_prefix, index), LOCK_FILE_FLAGS, 0o600)
+                except OSError:
+                    self._use_process_limits()
+                    return self._acquire_slot()
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError) as error:
+                    os.close(slot)
+                    if error.errno not in (errno.EAGAIN, errno.EACCES):
+                        raise
+                    continue
+                self._count('slot_wait_seconds', time.time() - start)
+                return slot
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+
+    def _release_slot(self, slot):
+        if slot is None:
+            return
+        if slot is self._local_slots:
+            slot.release()
+            return
+        fcntl.flock(slot, fcntl.LOCK_UN)
+        os.close(slot)
+
+    def _take_token(self):
+        """
+        Takes a token from the shared bucket. Without a token left the next one is reserved, and the caller waits
+        until it is refilled, so waiting callers start in the order they came
+        """
+        if not self.rate_limit:
+            return
+        tokens = self._take_shared_token() if self.shared else None
+        if tokens is None:
+            with self._stats_lock:
+                now = time.time()
+                state = self._local_bucket
+                tokens = min(self.burst, state['tokens'] + (now - state['stamp']) * self.rate_limit) - 1
+                self._local_bucket = {'tokens': tokens, 'stamp': now}
+        if tokens < 0:
+            wait = -tokens / self.rate_limit
+            self._count('rate_wait_seconds', wait)
+            time.sleep(wait)
+
+    def _take_shared_token(self):
+        """
+        :return: The tokens left in the bucket file after taking one, None if the file can't be used
+        """
+        try:
+            bucket = os.open(self._lock_prefix + '.bucket', LOCK_FILE_FLAGS, 0o600)
+        except OSError:
+            self._use_process_limits()
+            return None
+        try:
+            fcntl.flock(bucket, fcntl.LOCK_EX)
+            now = time.time()
+            try:
+                state = json.loads(os.read(bucket, 4096).decode('utf-8'))
+            except ValueError:
+                state = {'tokens': self.burst, 'stamp': now}
+            tokens = min(self.burst, state['tokens'] + (now - state['stamp']) * self.rate_limit) - 1
+            os.lseek(bucket, 0, os.SEEK_SET)
+            os.ftruncate(bucket, 0)
+            os.write(bucket, json.dumps({'tokens': tokens, 'stamp': now}).encode('utf-8'))
+        finally:
+            fcntl.flock(bucket, fcntl.LOCK_UN)
+            os.close(bucket)
+        return tokens
+
+    def _backoff_seconds(self, attempt, response=None):
+        """
+        Full jitter exponential backoff. A Retry-After header sent by NSX Manager is the lower bound of the wait
+        """
+        wait = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if response is not None:
+            try:
+                wait = max(wait, min(self.max_backoff, float(response.headers.get('Retry-After', 0))))
+            except ValueError:
+                pass
+        return wait
+
+    def call(self, method, send):
+        """
+        Runs send() within the limits, retrying it while NSX Manager is overloaded or unreachable
+        :param method: The HTTP method, calls that are not idempotent are only resent if NSX Manager rejected them
+        :param send: A function sending the request and returning the requests.Response
+        """
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+        attempt = 0
+        while True:
+            self._take_token()
+            slot = self._acquire_slot()
+            self._count('requests')
+            try:
+                response = send()
+            except (ConnectionError, Timeout):
+                self._count('errors')
+                if not idempotent or attempt >= self.retries:
+                    raise
+                response = None
+            finally:
+                self._release_slot(slot)
+
+            if response is not None:
+                if response.status_code in REJECTED_STATUSES:
+                    self._count('throttled')
+                if response.status_code not in retry_statuses or attempt >= self.retries:
+                    return response
+                response.close()
+
+            wait = self._backoff_seconds(attempt, response)
+            self._count('retries')
+            self._count('backoff_seconds', wait)
+            time.sleep(wait)
+            attempt += 1
+
+
+class GovernedAdapter(HTTPAdapter):
+    """
+    Keep-alive HTTPS adapter sending every request through an NsxGovernor
+    """
+    def __init__(self, governor, **kwargs):
+        self.governor = governor
+        super(GovernedAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        return self.governor.call(request.method, lambda: super(GovernedAdapter, self).send(request, **kwargs))
+
+
+def new_governor(nsxmanager_spec):
+    """
+    :return: An NsxGovernor for the NSX Manager of the nsxmanager_spec, with the limits set in the spec
+    """
+    return NsxGovernor(nsxmanager_spec['host'],
+                       max_in_flight=int(nsxmanager_spec.get('max_in_flight', NSX_MAX_IN_FLIGHT)),
+                       rate_limit=float(nsxmanager_spec.get('rate_limit', 0)),
+                       burst=nsxmanager_spec.get('burst') and int(nsxmanager_spec['burst']),
+                       retries=int(nsxmanager_spec.get('retries', NSX_RETRIES)),
+                       backoff=float(nsxmanager_spec.get('backoff', NSX_BACKOFF)),
+                       lock_dir=nsxmanager_spec.get('governor_dir'))
@@ -0,0 +1,270 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+import sys
+
+try:
+    from lxml import etree as et
+    HAS_LXML = True
+except ImportError:
+    from xml.etree import ElementTree as et
+    HAS_LXML = False
+
+# list element, page element and object element of the paged list endpoints supported by read_all_pages
+PAGED_LISTS = {'logicalSwitchesGlobal': ('virtualWires', 'dataPage', 'virtualWire'),
+               'logicalSwitches': ('virtualWires', 'dataPage', 'virtualWire'),
+               'nsxEdges': ('pagedEdgeList', 'edgePage', 'edgeSummary')}
+
+STREAM_PAGE_SIZE = 1024
+
+
+def handle_error(client, status, content):
+    """
+    Applies the fail_mode of the client the same way NsxClient does. In 'continue' mode the page is treated as empty
+    """
+    if client.fail_mode == 'raise':
+        from nsxramlclient.exceptions import NsxError
+        raise NsxError(status, content)
+    elif client.fail_mode != 'continue':
+        sys.exit('receive bad status code {}\n{}'.format(status, content))
+
+
+def stream_page(client, url, query_parameters, object_tag, fields):
+    """
+    Parses one page of a paged list incrementally, every object element is discarded once its fields are read
+    :return: A generator yielding a dictionary with the requested fields of every object, and finally a tuple
+             (objects on the page, total count, page size) as last item, with the counts of the pagingInfo or None
+    """
+    response = client._httpsession._session.get(url, params=query_parameters, stream=True)
+    try:
+        if response.status_code != 200:
+            handle_error(client, response.status_code, response.content)
+            yield 0, None, None
+            return
+        response.raw.decode_content = True
+
+        object_count = 0
+        total_count = None
+        page_size = None
+        for _, element in et.iterparse(response.raw, events=('end',)):
+            if element.tag == object_tag:
+                object_count += 1
+                yield dict((field, element.findtext(field)) for field in fields)
+                element.clear()
+                if HAS_LXML:
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+            elif element.tag == 'totalCount':
+                total_count = int(element.text)
+            elif element.tag == 'pageSize':
+                page_size = int(element.text)
+        yield object_count, total_count, page_size
+    finally:
+        response.close()
+
+
+def iter_records(client, resource, fields, uri_parameters=None, page_size=STREAM_PAGE_SIZE):
+    """
+    Reads a paged list endpoint page by page with an incremental parser, instead of building the dictionary
+    tree of every page like read_all_pages. The next page is only requested when the caller consumes the objects
+    of the current one, so a lookup stopping on the first match doesn't read the remaining pages.
+    Clients without a direct transport, like the PersistentNsxClient, fall back to read_all_pages
+    :param client: An instance of an NsxClient session
+    :param resource: The RAML display name of the list, one of PAGED_LISTS
+    :param fields: The names of the child elements of each object to return, e.g. ('objectId', 'name')
+    :return: A generator yielding a dictionary with the requested fields for every object
+    """
+    if not hasattr(client, '_httpsession'):
+        for item in client.read_all_pages(resource, uri_parameters=uri_parameters):
+            yield dict((field, item.get(field)) for field in fields)
+        return
+
+    object_tag = PAGED_LISTS[resource][2]
+    url = client._nsxraml.contruct_resource_url(resource, uri_parameters)
+    start_index = 0
+    while True:
+        page = stream_page(client, url, {'startindex': start_index, 'pagesize': page_size}, object_tag, fields)
+        for item in page:
+            if isinstance(item, tuple):
+                object_count, total_count, server_page_size = item
+            else:
+                yield item
+        start_index += object_count
+        # NSX caps the page size of some lists below the requested one, so a short page only ends the list if the
+        # total count is missing and the page is shorter than the page size NSX reports
+        if object_count == 0 or (total_count is not None and start_index >= total_count) or \
+                (total_count is None and object_count < (server_page_size or page_size)):
+            return
+
+
+def find_record(client, resource, field, value, fields=('objectId', 'name'), uri_parameters=None):
+    """
+    :return: The first record of the paged list with the given value in field, or None. Reading stops at the match
+    """
+    for record in iter_records(client, resource, fields, uri_parameters):
+        if record.get(field) == value:
+            return record
+    return None
+
+
+# RAML display name and uri parameter of the single object read of the nsx_facts inventories
+FACT_READS = {'edges': ('nsxEdge', 'edgeId'),
+              'logical_switches': ('logicalSwitch', 'virtualWireID'),
+              'transport_zones': ('vdnScope', 'scopeId')}
+
+
+def object_exists(client, resource, uri_parameters):
+    """
+    :return: False if NSX Manager answers the read of the object with 404, True otherwise. Other errors are left to
+             the calls that use the object
+    """
+    if not hasattr(client, '_httpsession'):
+        fail_mode = client.fail_mode
+        client.fail_mode = 'continue'
+        try:
+            return client.read(resource, uri_parameters=uri_parameters)['status'] != 404
+        finally:
+            client.fail_mode = fail_mode
+
+    url = client._nsxraml.contruct_resource_url(resource, uri_parameters)
+    response = client._httpsession._session.get(url)
+    response.close()
+    return response.status_code != 404
+
+
+def fact_record(client, nsx_facts, inventory, name):
+    """
+    :param nsx_facts: The facts gathered by the nsx_facts module, or None
+    :param inventory: The inventory of the facts holding the object, one of FACT_READS
+    :return: The record of the named object in the facts, or None if the facts don't hold the name or NSX Manager
+             no longer knows its id, because the object was deleted or recreated after the facts were gathered.
+             Callers look the name up in NSX when None is returned
+    """
+    if not nsx_facts or name not in nsx_facts.get(inventory, {}):
+        return None
+    record = nsx_facts[inventory][name]
+    resource, uri_parameter = FACT_READS[inventory]
+    if not object_exists(client, resource, {uri_parameter: record['id']}):
+        return None
+    return record
+
+
+try:
+    intern_string = sys.intern
+except AttributeError:
+    intern_string = intern
+
+# RAML display name and uri parameter of the detail read of the objects in a paged list
+DETAIL_READS = {'logicalSwitchesGlobal': ('logicalSwitch', 'virtualWireID'),
+                'logicalSwitches': ('logicalSwitch', 'virtualWireID'),
+                'nsxEdges': ('nsxEdge', 'edgeId')}
+
+
+def compact_string(value):
+    """
+    Interns names and ids, so the same string held by several records and indexes is stored once
+    """
+    try:
+        return intern_string(value)
+    except TypeError:
+        return value
+
+
+class InventoryRecord(object):
+    """
+    Compact inventory entry holding the interned id and name of an NSX object and a few extra fields. The full
+    object is only read from NSX when 'details' is accessed
+    """
+    __slots__ = ('object_id', 'name', 'fields', '_details', '_load_details')
+
+    def __init__(self, object_id, name, fields=None, load_details=None):
+        self.object_id = compact_string(object_id)
+        self.name = compact_string(name)
+        self.fields = fields
+        self._details = None
+        self._load_details = load_details
+
+    @property
+    def details(self):
+        if self._details is None and self._load_details:
+            self._details = self._load_details(self.object_id)
+        return self._details
+
+    def get(self, field, default=None):
+        if field == 'objectId':
+            return self.object_id
+        if field == 'name':
+            return self.name
+        if self.fields:
+            return self.fields.get(field, default)
+        return default
+
+
+class InventoryIndex(object):
+    """
+    Name and id index of InventoryRecords. Like the lookups in the modules, the first object found with a name wins
+    """
+    __slots__ = ('_by_name', '_by_id')
+
+    def __init__(self, records):
+        self._by_name = {}
+        self._by_id = {}
+        for record in records:
+            self._by_name.setdefault(record.name, record)
+            self._by_id[record.object_id] = record
+
+    def by_name(self, name):
+        return self._by_name.get(name)
+
+    def by_id(self, object_id):
+        return self._by_id.get(object_id)
+
+    def __iter__(self):
+        return iter(self._by_id.values())
+
+    def __len__(self):
+        return len(self._by_id)
+
+
+def detail_loader(client, resource):
+    detail_resource, uri_parameter = DETAIL_READS[resource]
+    return lambda object_id: client.read(detail_resource, uri_parameters={uri_parameter: object_id})['body']
+
+
+def build_index(client, resource, fields=(), uri_parameters=None):
+    """
+    Streams a paged list into an InventoryIndex of compact records
+    :param fields: Extra fields to keep per record besides objectId and name
+    """
+    load_details = detail_loader(client, resource)
+    records = (InventoryRecord(item['objectId'], item['name'],
+                               dict((field, compact_string(item.get(field))) for field in fields) if fields else None,
+                               load_details)
+               for item in iter_records(client, resource, ('objectId', 'name') + tuple(fields), uri_parameters))
+    return InventoryIndex(records)
+
+
+def inventory_index(client, resource):
+    """
+    :return: The InventoryIndex of the resource, built on the first call and kept on the client for the later
+             lookups of the same module run
+    """
+    cache = client.__dict__.setdefault('_nsx_inventory_indexes', {})
+    if resource not in cache:
+        cache[resource] = build_index(client, resource)
+    return cache[resource]
@@ -0,0 +1,40 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+import socket
+import struct
+
+
+def ip_to_int(ip_address):
+    return struct.unpack('!I', socket.inet_aton(ip_address))[0]
+
+
+def int_to_ip(address_int):
+    return socket.inet_ntoa(struct.pack('!I', address_int))
+
+
+def get_ippool_inventory(session):
+    """
+    :return: A dictionary of all IP pools under globalroot-0, indexed by name
+    """
+    ip_pools = session.read('ipPools', uri_parameters={'scopeId': 'globalroot-0'})['body']
+    if not ip_pools or not ip_pools.get('ipamAddressPools'):
+        return {}
+    return dict((ip_pool['name'], ip_pool) for ip_pool in
+                session.normalize_list_return(ip_pools['ipamAddressPools'].get('ipamAddressPool')))
@@ -0,0 +1,151 @@
+# coding=utf-8
+#
+# Copyright © 2018 VMware, Inc. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated
+# documentation files (the "Software"), to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of the Software, and
+# to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions
+# of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED
+# TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF
+# CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# IN THE SOFTWARE.
+
+
+import os
+import sys
+
+PROFILE_ENV = 'NSX_PROFILE'
+PROFILE_INTERVAL_ENV = 'NSX_PROFILE_INTERVAL'
+
+
+def profiled(main):
+    """
+    Returns main unchanged, unless NSX_PROFILE names a directory. Then every run of main writes into it:
+    <module>-<time>-<pid>.prof, the cProfile stats to be read with pstats or snakeviz,
+    <module>-<time>-<pid>.collapsed, wall clock stack samples of all threads in the collapsed format of
+    flamegraph.pl and speedscope, and <module>-<time>-<pid>.spans, one JSON line per HTTP call with its timing.
+    The profiling modules are only imported when profiling is turned on
+    """
+    profile_dir = os.environ.get(PROFILE_ENV)
+    if not profile_dir:
+        return main
+
+    def profiled_main():
+        module_file = main.__globals__.get('__file__') or sys.argv[0]
+        module_name = os.path.splitext(os.path.basename(module_file))[0].replace('AnsiballZ_', '')
+        profiler = ModuleProfiler(profile_dir, module_name, float(os.environ.get(PROFILE_INTERVAL_ENV, 0.005)))
+        profiler.start()
+        try:
+            return main()
+        finally:
+            profiler.stop()
+
+    return profiled_main
+
+
+class ModuleProfiler(object):
+    """
+    Runs cProfile on the calling thread, samples the stacks of all threads, which also covers the worker threads of
+    the bulk modes, and records a span for every HTTP request sent by requests
+    """
+    def __init__(self, profile_dir, module_name, interval):
+        import time
+
+        self.prefix = os.path.join(profile_dir, '{}-{}-{}'.format(module_name, time.strftime('%Y%m%dT%H%M%S'),
+                                                                  os.getpid()))
+        self.interval = interval
+        self.stacks = {}
+        self.spans = []
+
+    def start(self):
+        import cProfile
+        import threading
+        import time
+
+        self._started = time.time()
+        self._stopped = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name='nsx-profile-sampler')
+        self._sampler.daemon = True
+        self._patch_http()
+        self._profile = cProfile.Profile()
+        self._sampler.start()
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self._stopped.set()
+        self._sampler.join()
+        self._unpatch_http()
+        self._profile.dump_stats(self.prefix + '.prof')
+        self._write_collapsed()
+        self._write_spans()
+
+    def _sample(self):
+        import threading
+
+        sampler_id = threading.current_thread().ident
+        while not self._stopped.wait(self.interval):
+            thread_names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append('{}:{}'.format(os.path.basename(frame.f_code.co_filename), frame.f_code.co_name))
+                    frame = frame.f_back
+                stack.append(thread_names.get(thread_id, 'thread-{}'.format(thread_id)))
+                stack = ';'.join(reversed(stack))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def _patch_http(self):
+        """
+        Wraps HTTPAdapter.send, every adapter of the NSX clients ends up there for each request it sends
+        """
+        try:
+            from requests.adapters import HTTPAdapter
+        except ImportError:
+            self._send = None
+            return
+        import threading
+        import time
+
+        self._send = send = HTTPAdapter.send
+        profiler = self
+
+        def timed_send(adapter, request, **kwargs):
+            start = time.time()
+            status = None
+            try:
+                response = send(adapter, request, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                profiler.spans.append({'method': request.method, 'url': request.path_url, 'status': status,
+                                       'start': round(start - profiler._started, 4),
+                                       'seconds': round(time.time() - start, 4),
+                                       'thread': threading.current_thread().name})
+
+        HTTPAdapter.send = timed_send
+
+    def _unpatch_http(self):
+        if self._send:
+            from requests.adapters import HTTPAdapter
+            HTTPAdapter.send = self._send
+
+    def _write_collapsed(self):
+        with open(self.prefix + '.collapsed', 'w') as collapsed_file:
+            for stack, count in sorted(self.stacks.items()):
+                collapsed_file.write('{} {}\n'.format(stack, count))
+
+    def _write_spans(self):
+        import json
+
+        with open(self.prefix + '.spans', 'w') as spans_file:
+            for span in sorted(self.spans, key=lambda span: span['start']):
+                spans_file.write(json.dumps(span, sort_keys=True) + '\n')